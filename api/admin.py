@@ -1,21 +1,87 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User  # Import your custom User model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+from django.utils.text import smart_split, unescape_string_literal
+from .models import User, School, ClassYear, Quiz, Question, GameSession, QuizResult, ProgressTracking  # Import your custom User model
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Counting millions of rows on every page view is what makes large changelists slow, the count
+    of each filtered queryset is cached for ADMIN_COUNT_CACHE_SECONDS instead.
+    """
+    @cached_property
+    def count(self):
+        sql, params = self.object_list.query.sql_with_params()
+        key = 'admin_count:%s' % hashlib.sha1(repr((sql, params)).encode()).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.ADMIN_COUNT_CACHE_SECONDS)
+        return count
+
+
+class PrefixSearchMixin:
+    """
+    '^' search fields are searched as a range on the lower cased column, lower(field) >= term and
+    lower(field) < the next prefix, which the Lower() indexes of the models serve. Django's own
+    '^' search is a case insensitive LIKE, and SQLite never uses an index of a BINARY column for it.
+    Other search fields are left to ModelAdmin.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        prefix_fields = [field[1:] for field in search_fields if field.startswith('^')]
+        if not search_term or not prefix_fields or len(prefix_fields) != len(search_fields):
+            return super().get_search_results(request, queryset, search_term)
 
-class CustomUserAdmin(UserAdmin):
+        aliases = {f'_search_{number}': Lower(field) for number, field in enumerate(prefix_fields)}
+        queryset = queryset.alias(**aliases)
+        for term in smart_split(search_term):
+            if term.startswith(('"', "'")) and term[0] == term[-1]:
+                term = unescape_string_literal(term)
+            term = term.lower()
+            if not term:
+                continue
+            upper = term[:-1] + chr(ord(term[-1]) + 1)
+            matches = Q()
+            for alias in aliases:
+                matches |= Q(**{f'{alias}__gte': term, f'{alias}__lt': upper})
+            queryset = queryset.filter(matches)
+        # Only forward foreign keys are searched, a row can't match twice
+        return queryset, False
+
+
+class LargeTableAdmin(PrefixSearchMixin, admin.ModelAdmin):
+    """
+    Defaults for tables that grow with gameplay: no full table count next to the filters,
+    cached page counts and prefix only searches (no LIKE with a leading wildcard).
+    """
+    show_full_result_count = False
+    paginator = CachedCountPaginator
+    list_per_page = 50
+
+class CustomUserAdmin(PrefixSearchMixin, UserAdmin):
     # Define which fields will be displayed in the admin
-    list_display = ('username', 'email', 'role', 'is_staff', 'is_active')
-    list_filter = ('role', 'is_staff', 'is_active')
+    list_display = ('username', 'email', 'role', 'school', 'is_staff', 'is_active')
+    list_filter = ('school', 'role', 'is_staff', 'is_active')
     fieldsets = (
         (None, {'fields': ('username', 'email', 'password')}),
-        ('Personal info',{'fields':('first_name','last_name', 'role', 'class_year')}),
+        ('Personal info',{'fields':('first_name','last_name', 'role', 'school', 'class_year')}),
         ('Permissions', {'fields': ('is_staff', 'is_active', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
     add_fieldsets = (
         (None, {
             'classes': ('wide',),
-            'fields': ('username', 'email', 'password1', 'password2', 'role', 'is_staff', 'is_active')}
+            'fields': ('username', 'email', 'password1', 'password2', 'role', 'school', 'is_staff', 'is_active')}
         ),
     )
 
@@ -36,9 +102,91 @@ class CustomUserAdmin(UserAdmin):
             fields.remove('class_year') 
         return fields
     
-    search_fields = ('username', 'email')
+    # Prefix searches, a LIKE with a leading wildcard always scans the whole table
+    search_fields = ('^username', '^email')
     ordering = ('username',)
+    list_select_related = ('school', 'class_year')
+    show_full_result_count = False
+    paginator = CachedCountPaginator
 
 # Register the custom User model with the custom UserAdmin
 admin.site.register(User, CustomUserAdmin)
 
+
+@admin.register(School)
+class SchoolAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'created_at')
+    search_fields = ('^name', '^slug')
+    prepopulated_fields = {'slug': ('name',)}
+
+
+@admin.register(ClassYear)
+class ClassYearAdmin(admin.ModelAdmin):
+    list_display = ('name', 'school', 'description')
+    list_select_related = ('school',)
+    list_filter = ('school',)
+    search_fields = ('^name',)
+
+
+@admin.register(Quiz)
+class QuizAdmin(LargeTableAdmin):
+    list_display = ('title', 'teacher', 'class_year', 'created_at', 'updated_at')
+    list_select_related = ('teacher', 'class_year')
+    list_filter = ('school', 'class_year')
+    search_fields = ('^title',)
+    # Taken from the teacher when saved
+    readonly_fields = ('school',)
+    autocomplete_fields = ('teacher', 'class_year')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+
+
+@admin.register(Question)
+class QuestionAdmin(LargeTableAdmin):
+    list_display = ('question_text', 'quiz', 'teacher', 'question_type', 'points', 'created_at')
+    list_select_related = ('quiz', 'teacher')
+    list_filter = ('school', 'question_type')
+    search_fields = ('^quiz__title',)
+    # Taken from the quiz when saved
+    readonly_fields = ('school',)
+    autocomplete_fields = ('quiz', 'teacher')
+    ordering = ('-id',)
+
+
+@admin.register(GameSession)
+class GameSessionAdmin(LargeTableAdmin):
+    list_display = ('id', 'student', 'quiz', 'status', 'score', 'correct_answers_count', 'date_played', 'last_updated')
+    list_select_related = ('student', 'quiz')
+    list_filter = ('school', 'status')
+    search_fields = ('^student__username',)
+    autocomplete_fields = ('student', 'quiz')
+    readonly_fields = ('school', 'quiz_version', 'client_id', 'date_played', 'last_updated')
+    date_hierarchy = 'date_played'
+    ordering = ('-date_played',)
+
+
+@admin.register(QuizResult)
+class QuizResultAdmin(LargeTableAdmin):
+    list_display = ('id', 'student', 'quiz', 'score', 'completed_at', 'updated_at')
+    list_select_related = ('student', 'quiz')
+    list_filter = ('school',)
+    search_fields = ('^student__username',)
+    # Taken from the student when saved
+    readonly_fields = ('school',)
+    autocomplete_fields = ('student', 'quiz')
+    date_hierarchy = 'completed_at'
+    ordering = ('-completed_at',)
+
+
+@admin.register(ProgressTracking)
+class ProgressTrackingAdmin(LargeTableAdmin):
+    list_display = ('id', 'student', 'quiz', 'status', 'score', 'started_at', 'completed_at')
+    list_select_related = ('student', 'quiz')
+    list_filter = ('school', 'status')
+    search_fields = ('^student__username',)
+    # Taken from the student when saved
+    readonly_fields = ('school',)
+    autocomplete_fields = ('student', 'quiz')
+    date_hierarchy = 'started_at'
+    ordering = ('-started_at',)
+
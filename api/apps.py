@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Register the background job handlers
+        from . import tasks  # noqa: F401
+        # Slow query log, also when LOGGING doesn't load api.logs
+        from . import logs  # noqa: F401
@@ -0,0 +1,83 @@
+'''
+Moves old rows out of the hot gameplay tables into their history tables.
+
+GameSession and QuizResult only keep the current term, everything last updated before the
+archive cutoff lives in GameSessionHistory/QuizResultHistory. The viewsets read the history
+tables only when a request asks for `?include_archived=true`.
+'''
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import GameSession, GameSessionHistory, QuizResult, QuizResultHistory
+
+# Statuses a session can no longer leave
+FINISHED_STATUSES = ('completed', 'abandoned')
+
+SESSION_HISTORY_FIELDS = (
+    'id', 'school_id', 'student_id', 'quiz_id', 'quiz_version_id', 'duration', 'status', 'score',
+    'correct_answers_count', 'date_played', 'last_updated', 'client_id', 'seed', 'started_at', 'deadline',
+)
+RESULT_HISTORY_FIELDS = (
+    'id', 'school_id', 'student_id', 'quiz_id', 'score', 'feedback', 'completed_at', 'updated_at',
+)
+
+
+def default_cutoff():
+    """
+    Rows last updated before this moment are archived.
+    """
+    return timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+
+
+def _move(queryset, history_model, fields, batch_size):
+    """
+    Copy the rows of `queryset` into `history_model` and delete them, one batch per transaction.
+    Returns the number of rows moved.
+    """
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(queryset.order_by('id').values(*fields)[:batch_size])
+            if not rows:
+                break
+            # ignore_conflicts makes a retried batch harmless if a previous run died after the insert
+            history_model.objects.bulk_create(
+                [history_model(**row) for row in rows], ignore_conflicts=True
+            )
+            queryset.model.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+    return moved
+
+
+def archive_sessions(cutoff, batch_size=500):
+    """
+    Move finished game sessions last updated before `cutoff` into GameSessionHistory.
+    """
+    return _move(
+        GameSession.objects.filter(status__in=FINISHED_STATUSES, last_updated__lt=cutoff),
+        GameSessionHistory, SESSION_HISTORY_FIELDS, batch_size,
+    )
+
+
+def archive_results(cutoff, batch_size=500):
+    """
+    Move quiz results last updated before `cutoff` into QuizResultHistory.
+    """
+    return _move(
+        QuizResult.objects.filter(updated_at__lt=cutoff),
+        QuizResultHistory, RESULT_HISTORY_FIELDS, batch_size,
+    )
+
+
+def archive_history(cutoff=None, batch_size=500):
+    """
+    Archive both tables and return a dict with the number of rows moved from each.
+    """
+    cutoff = cutoff or default_cutoff()
+    return {
+        'sessions': archive_sessions(cutoff, batch_size),
+        'results': archive_results(cutoff, batch_size),
+    }
@@ -0,0 +1,183 @@
+'''
+Content addressed storage for question assets.
+
+Files are stored once under ASSET_ROOT/<sha[:2]>/<sha[2:4]>/<sha>, however many questions use them.
+Image thumbnails are generated next to the file when Pillow is installed. The content type is taken
+from the first bytes of the file, never from the upload, and only types in ASSET_CONTENT_TYPES are
+accepted and served inline.
+'''
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional, assets are served without thumbnails
+    Image = None
+
+THUMBNAIL_SIZE = (256, 256)
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+# (offset, signature, content type), checked in order against the first bytes of a file
+SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (8, b'WEBP', 'image/webp'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'\xff\xfb', 'audio/mpeg'),
+    (0, b'\xff\xf3', 'audio/mpeg'),
+    (0, b'\xff\xf2', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (8, b'WAVE', 'audio/wav'),
+    (0, b'fLaC', 'audio/flac'),
+    (4, b'ftypM4A', 'audio/mp4'),
+)
+SNIFF_BYTES = 16
+
+
+class AssetTooLarge(Exception):
+    pass
+
+
+class AssetRejected(Exception):
+    pass
+
+
+def sniff_content_type(head):
+    """
+    Content type of a file from its first SNIFF_BYTES bytes, None unless it is one of ASSET_CONTENT_TYPES.
+    """
+    for offset, signature, content_type in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            # WebP and WAV are both RIFF containers
+            if offset == 8 and not head.startswith(b'RIFF'):
+                continue
+            return content_type if content_type in settings.ASSET_CONTENT_TYPES else None
+    return None
+
+
+def is_inline(content_type):
+    """
+    Whether a stored content type may be shown by the browser, anything else is served as a download.
+    """
+    return content_type in settings.ASSET_CONTENT_TYPES
+
+
+def blob_path(sha256):
+    return os.path.join(settings.ASSET_ROOT, sha256[:2], sha256[2:4], sha256)
+
+
+def thumbnail_path(sha256):
+    return blob_path(sha256) + '.thumb.png'
+
+
+def store(upload):
+    """
+    Write an uploaded file into the store and return (sha256, size).
+    The file is hashed while it is copied to a temporary file, which is then renamed into place,
+    or thrown away if the same content is already stored.
+    """
+    os.makedirs(settings.ASSET_ROOT, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=settings.ASSET_ROOT, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            for chunk in upload.chunks(CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.ASSET_MAX_UPLOAD_SIZE:
+                    raise AssetTooLarge()
+                digest.update(chunk)
+                temp.write(chunk)
+
+        sha256 = digest.hexdigest()
+        path = blob_path(sha256)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        return sha256, size
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def make_thumbnail(sha256, content_type):
+    """
+    Create the thumbnail of a stored image if it does not exist yet. Returns True if a thumbnail is available.
+    Raises AssetRejected for images with more pixels than Pillow agrees to decode.
+    """
+    if Image is None or not content_type.startswith('image/'):
+        return False
+    path = thumbnail_path(sha256)
+    if os.path.exists(path):
+        return True
+    try:
+        with Image.open(blob_path(sha256)) as image:
+            image.thumbnail(THUMBNAIL_SIZE)
+            temp_path = path + '.tmp'
+            image.save(temp_path, format='PNG')
+        os.replace(temp_path, path)
+    except Image.DecompressionBombError:
+        raise AssetRejected("The image has too many pixels.")
+    except (OSError, ValueError):
+        # Not an image Pillow can read (e.g. SVG), serve the original only
+        return False
+    return True
+
+
+def remove(sha256):
+    """
+    Delete a stored file and its thumbnail, used once no asset references the content any more.
+    """
+    for path in (blob_path(sha256), thumbnail_path(sha256)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=start-end" Range header. Returns (start, end) inclusive, None to send
+    the whole file, or raises ValueError when the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if start == '' and end == '':
+        return None
+    if start == '':
+        # Suffix range: the last `end` bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError()
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError()
+    return start, end
+
+
+def read_range(path, start, end):
+    """
+    Yield the bytes start..end (inclusive) of a file in chunks.
+    """
+    remaining = end - start + 1
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
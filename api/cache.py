@@ -0,0 +1,45 @@
+'''
+Helpers for cache entries that belong to a school or a class year.
+
+Every key starts with the school, so schools never share cache entries. Class year keys also include
+a per class year version number, bumping the version invalidates every entry of that class year at
+once without having to know the individual keys. The version numbers are kept in the 'shared' cache,
+which all worker processes use, so a bump made by one worker invalidates the entries of every worker.
+'''
+from django.core.cache import caches
+
+
+def _versions():
+    return caches['shared']
+
+
+def school_key(school_id, name):
+    """
+    Cache key for `name` within a school.
+    """
+    return f'school:{school_id}:{name}'
+
+
+def _version_key(school_id, class_year_id):
+    return school_key(school_id, f'class_year:{class_year_id}:version')
+
+
+def class_year_key(school_id, class_year_id, name):
+    """
+    Cache key for `name` scoped to the current version of a class year.
+    """
+    version = _versions().get_or_set(_version_key(school_id, class_year_id), 1, timeout=None)
+    return school_key(school_id, f'class_year:{class_year_id}:v{version}:{name}')
+
+
+def invalidate_class_years(school_id, class_year_ids):
+    """
+    Drop every cached entry of the given class years of a school.
+    """
+    for class_year_id in class_year_ids:
+        key = _version_key(school_id, class_year_id)
+        try:
+            _versions().incr(key)
+        except ValueError:
+            # No version stored yet, so nothing has been cached for this class year
+            pass
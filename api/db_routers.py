@@ -0,0 +1,51 @@
+'''
+Read replica routing.
+
+Replicas are listed in settings.DATABASE_REPLICAS and registered as extra DATABASES entries,
+copying the data to them is left to the replication setup (e.g. litestream for SQLite files).
+Reads only go to a replica inside `read_from_replica()`, which ReplicaRoutingMiddleware enters for
+safe-method API requests, everything else (writes, migrations, admin, sticky users) uses `default`.
+'''
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """
+    Route ORM reads made inside the block to a replica (analytics jobs, exports, safe requests).
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get():
+            replicas = replica_aliases()
+            if replicas:
+                return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db == 'default'
@@ -0,0 +1,256 @@
+'''
+Append-only gameplay event log.
+
+Recording an event only appends it to an in-process buffer once the surrounding transaction has
+committed, the buffer is written with one bulk insert when it holds EVENT_LOG_FLUSH_SIZE events or
+when the request has finished. Events of a failed insert stay buffered for the next flush, the buffer
+never holds more than EVENT_LOG_MAX_BUFFER events (the oldest are dropped while the database is down). Compaction folds old events into one snapshot per stream, replay folds snapshot plus
+newer events back into the state of GameSession, QuizResult and ProgressTracking.
+'''
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import metrics
+from .models import (
+    GameEvent, GameEventSnapshot, GameSession, GameSessionHistory, ProgressTracking, QuizResult,
+)
+
+logger = logging.getLogger(__name__)
+
+_buffer = []
+_lock = threading.Lock()
+# Held while writing, so events of a failed insert are back at the front before the next flush starts
+_flush_lock = threading.Lock()
+
+
+def session_stream(session_id):
+    return f'session:{session_id}'
+
+
+def result_stream(student_id, quiz_id):
+    return f'result:{student_id}:{quiz_id}'
+
+
+def _seconds(duration):
+    return duration.total_seconds() if duration is not None else None
+
+
+def record(kind, stream, student_id, quiz_id, **data):
+    """
+    Append an event. It is dropped if the surrounding transaction rolls back.
+    """
+    event = GameEvent(stream=stream, kind=kind, student_id=student_id, quiz_id=quiz_id,
+                      data=data, created_at=timezone.now())
+    transaction.on_commit(lambda: _append([event]))
+
+
+def _append(events):
+    # Counted here rather than in model signals: sessions are also completed and abandoned with .update()
+    for event in events:
+        metrics.GAME_EVENTS.inc(kind=event.kind)
+    with _lock:
+        _buffer.extend(events)
+        dropped = len(_buffer) - settings.EVENT_LOG_MAX_BUFFER
+        if dropped > 0:
+            del _buffer[:dropped]
+        full = len(_buffer) >= settings.EVENT_LOG_FLUSH_SIZE
+    if dropped > 0:
+        logger.error('event buffer full, oldest events dropped', extra={'dropped': dropped})
+    if full:
+        flush()
+
+
+def flush(**kwargs):
+    """
+    Write the buffered events with a single insert. Returns the number of events written.
+    If the insert fails the events are put back in front of the buffer and 0 is returned.
+    """
+    with _flush_lock:
+        with _lock:
+            events = _buffer[:]
+            del _buffer[:]
+        if not events:
+            return 0
+        try:
+            GameEvent.objects.bulk_create(events)
+        except DatabaseError:
+            with _lock:
+                _buffer[:0] = events
+            logger.exception('writing buffered events failed', extra={'events': len(events)})
+            return 0
+    return len(events)
+
+
+# Write what is left once the response has been sent, and before a command exits
+request_finished.connect(flush, dispatch_uid='api.events.flush')
+atexit.register(flush)
+
+
+def session_started(session):
+    record('session_started', session_stream(session.pk), session.student_id, session.quiz_id,
+           quiz_version=session.quiz_version_id, score=session.score)
+
+
+def session_changed(session, previous_status):
+    """
+    A game session was saved: completed if it just moved to completed, otherwise updated.
+    """
+    kind = 'session_completed' if session.status == 'completed' and previous_status != 'completed' \
+        else 'session_updated'
+    record(kind, session_stream(session.pk), session.student_id, session.quiz_id,
+           status=session.status, score=session.score,
+           correct_answers_count=session.correct_answers_count, duration=_seconds(session.duration))
+
+
+def answered(session, question_id, correct, points):
+    record('answer', session_stream(session.pk), session.student_id, session.quiz_id,
+           question=question_id, correct=correct, points=points)
+
+
+def sessions_abandoned(rows):
+    """
+    Bulk version for the sweeper, `rows` are (session id, student id, quiz id).
+    """
+    now = timezone.now()
+    events = [
+        GameEvent(stream=session_stream(pk), kind='session_abandoned', student_id=student_id,
+                  quiz_id=quiz_id, data={}, created_at=now)
+        for pk, student_id, quiz_id in rows
+    ]
+    transaction.on_commit(lambda: _append(events))
+
+
+def result_recorded(result, override):
+    record('result_override' if override else 'result_recorded',
+           result_stream(result.student_id, result.quiz_id), result.student_id, result.quiz_id,
+           score=result.score, feedback=result.feedback,
+           completed_at=result.completed_at.isoformat() if result.completed_at else None)
+
+
+def fold(state, event):
+    """
+    Apply one event to the state of its stream and return the new state.
+    """
+    state = dict(state or {})
+    data = event.data
+    if event.kind == 'session_started':
+        state.update(status='in_progress', score=data.get('score') or 0, correct_answers_count=0,
+                     quiz_version=data.get('quiz_version'), date_played=event.created_at.isoformat(),
+                     answers={})
+    elif event.kind == 'answer':
+        answers = dict(state.get('answers', {}))
+        answers[str(data['question'])] = data['correct']
+        state['answers'] = answers
+        if data['correct']:
+            state['score'] = state.get('score', 0) + data['points']
+            state['correct_answers_count'] = state.get('correct_answers_count', 0) + 1
+    elif event.kind in ('session_updated', 'session_completed'):
+        state.update(data)
+    elif event.kind == 'session_abandoned':
+        state['status'] = 'abandoned'
+    elif event.kind in ('result_recorded', 'result_override'):
+        state.update(data)
+    state['last_updated'] = event.created_at.isoformat()
+    return state
+
+
+def replay(student_id):
+    """
+    Rebuild the state of every stream of a student from snapshots and events.
+    Returns {stream: (quiz id, state)}.
+    """
+    flush()
+    states, folded_up_to = {}, {}
+    for snapshot in GameEventSnapshot.objects.filter(student_id=student_id):
+        states[snapshot.stream] = (snapshot.quiz_id, snapshot.state)
+        folded_up_to[snapshot.stream] = snapshot.last_event_id
+
+    for event in GameEvent.objects.filter(student_id=student_id).order_by('id').iterator():
+        if event.id <= folded_up_to.get(event.stream, 0):
+            continue
+        states[event.stream] = (event.quiz_id, fold(states.get(event.stream, (None, None))[1], event))
+    return states
+
+
+def restore(student_id, states):
+    """
+    Write replayed states back to GameSession (or its history table), QuizResult and ProgressTracking.
+    Returns the number of rows written per model.
+    """
+    written = {'sessions': 0, 'results': 0, 'progress': 0}
+    best_scores = {}
+
+    with transaction.atomic():
+        for stream, (quiz_id, state) in states.items():
+            kind, _, key = stream.partition(':')
+            if kind == 'session':
+                fields = {
+                    'status': state.get('status', 'in_progress'),
+                    'score': state.get('score', 0),
+                    'correct_answers_count': state.get('correct_answers_count', 0),
+                    'duration': timedelta(seconds=state['duration']) if state.get('duration') is not None else None,
+                }
+                if not GameSession.objects.filter(pk=key).update(**fields) \
+                        and not GameSessionHistory.objects.filter(pk=key).update(**fields):
+                    GameSession.objects.create(pk=key, student_id=student_id, quiz_id=quiz_id,
+                                               quiz_version_id=state.get('quiz_version'), **fields)
+                written['sessions'] += 1
+                if fields['status'] == 'completed':
+                    best_scores[quiz_id] = max(best_scores.get(quiz_id, 0), fields['score'])
+            elif kind == 'result':
+                fields = {'score': state.get('score', 0), 'feedback': state.get('feedback'),
+                          'completed_at': state.get('completed_at')}
+                if not QuizResult.objects.filter(student_id=student_id, quiz_id=quiz_id).update(**fields):
+                    QuizResult.objects.create(student_id=student_id, quiz_id=quiz_id, **fields)
+                written['results'] += 1
+
+        # Same rule as the update_progress job: completed with the best score
+        for quiz_id, score in best_scores.items():
+            updated = ProgressTracking.objects.filter(student_id=student_id, quiz_id=quiz_id).update(
+                status='completed', score=score)
+            if not updated:
+                ProgressTracking.objects.create(student_id=student_id, quiz_id=quiz_id,
+                                                status='completed', score=score, completed_at=timezone.now())
+            written['progress'] += 1
+    return written
+
+
+def compact(before, batch_size=500):
+    """
+    Fold events created before `before` into their stream's snapshot and delete them.
+    Returns the number of events compacted.
+    """
+    flush()
+    last_id = GameEvent.objects.filter(created_at__lt=before).aggregate(last=Max('id'))['last']
+    if last_id is None:
+        return 0
+
+    compacted = 0
+    streams = list(GameEvent.objects.filter(id__lte=last_id).values_list('stream', flat=True).distinct())
+    for start in range(0, len(streams), batch_size):
+        chunk = streams[start:start + batch_size]
+        with transaction.atomic():
+            snapshots = {snapshot.stream: snapshot for snapshot in GameEventSnapshot.objects.filter(stream__in=chunk)}
+            new_snapshots, event_ids = {}, []
+            for event in GameEvent.objects.filter(stream__in=chunk, id__lte=last_id).order_by('id'):
+                snapshot = snapshots.get(event.stream) or new_snapshots.get(event.stream)
+                if snapshot is None:
+                    snapshot = new_snapshots[event.stream] = GameEventSnapshot(
+                        stream=event.stream, student_id=event.student_id, quiz_id=event.quiz_id, state={})
+                snapshot.state = fold(snapshot.state, event)
+                snapshot.last_event_id = event.id
+                event_ids.append(event.id)
+
+            GameEventSnapshot.objects.bulk_create(new_snapshots.values())
+            GameEventSnapshot.objects.bulk_update(snapshots.values(), ['state', 'last_event_id', 'updated_at'])
+            GameEvent.objects.filter(id__in=event_ids).delete()
+        compacted += len(event_ids)
+    return compacted
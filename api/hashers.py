@@ -0,0 +1,27 @@
+'''
+Password hashing policy.
+
+Each role can use its own hasher (PASSWORD_HASHER_BY_ROLE). Students log in together at the start
+of a lesson, so their accounts use a cheaper PBKDF2 work factor than staff accounts. Hashes are
+upgraded or downgraded to the role's hasher transparently on the next successful login.
+'''
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class StudentPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the work factor from STUDENT_PASSWORD_ITERATIONS.
+    """
+    algorithm = 'pbkdf2_sha256_student'
+
+    @property
+    def iterations(self):
+        return settings.STUDENT_PASSWORD_ITERATIONS
+
+
+def hasher_for_role(role):
+    """
+    Algorithm name of the hasher used for new passwords of `role`, 'default' is the first PASSWORD_HASHERS entry.
+    """
+    return settings.PASSWORD_HASHER_BY_ROLE.get(role, 'default')
@@ -0,0 +1,115 @@
+'''
+Item analysis of questions over their recorded answers (AnswerAttempt).
+
+Everything is computed by the database in grouped queries over a batch of questions, never answer
+by answer in Python: one query for the counts and score sums the p-value and point-biserial
+correlation are derived from, one for how often each multiple choice answer was given. The session
+score of an answer is the share of the session's answers that are correct.
+'''
+from math import sqrt
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Cast
+
+from .models import AnswerAttempt, Question, QuestionStats
+
+
+def _point_biserial(n, correct, total, total_sq, total_correct):
+    """
+    r = (M1 - M0) / s * sqrt(p * q) from sums of the session scores.
+    None when every answer is right, every answer is wrong or all sessions scored the same.
+    """
+    if correct in (0, n):
+        return None
+    mean = total / n
+    variance = total_sq / n - mean * mean
+    if variance <= 1e-12:
+        return None
+    p = correct / n
+    mean_correct = total_correct / correct
+    mean_wrong = (total - total_correct) / (n - correct)
+    return (mean_correct - mean_wrong) / sqrt(variance) * sqrt(p * (1 - p))
+
+
+def _chosen_labels(answer):
+    if isinstance(answer, dict):
+        return list(answer)
+    if isinstance(answer, list):
+        return [str(label) for label in answer]
+    return [] if answer is None else [str(answer)]
+
+
+def _choice_counts(question_ids, options):
+    """
+    {question id: {option label: times picked}} for multiple choice questions.
+    Grouped by distinct answer in the database, so Python only sees one row per different answer.
+    """
+    counts = {question_id: dict.fromkeys(options[question_id] or {}, 0) for question_id in question_ids}
+    rows = AnswerAttempt.objects.filter(question_id__in=question_ids, answer__isnull=False) \
+        .values('question_id', 'answer').annotate(times=Count('id')).order_by()
+    for row in rows:
+        question_counts = counts[row['question_id']]
+        for label in _chosen_labels(row['answer']):
+            if label in question_counts:
+                question_counts[label] += row['times']
+    return counts
+
+
+def compute(question_ids):
+    """
+    Item statistics of the given questions, as unsaved QuestionStats. Questions without answers are left out.
+    """
+    session_score = AnswerAttempt.objects.filter(session_id=OuterRef('session_id')).order_by() \
+        .values('session_id').annotate(score=Avg(Cast('is_correct', FloatField()))).values('score')
+    rows = AnswerAttempt.objects.filter(question_id__in=question_ids) \
+        .annotate(session_score=Subquery(session_score, output_field=FloatField())) \
+        .values('question_id').order_by() \
+        .annotate(
+            n=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+            total=Sum('session_score'),
+            total_sq=Sum(F('session_score') * F('session_score')),
+            total_correct=Sum('session_score', filter=Q(is_correct=True)),
+        )
+    rows = list(rows)
+
+    options = dict(Question.objects.filter(pk__in=[row['question_id'] for row in rows],
+                                           question_type='multiple_choice').values_list('id', 'options'))
+    choices = _choice_counts(list(options), options) if options else {}
+
+    return [
+        QuestionStats(
+            question_id=row['question_id'],
+            attempts=row['n'],
+            p_value=row['correct'] / row['n'],
+            point_biserial=_point_biserial(row['n'], row['correct'], row['total'] or 0.0,
+                                           row['total_sq'] or 0.0, row['total_correct'] or 0.0),
+            choices=choices.get(row['question_id'], {}),
+        )
+        for row in rows
+    ]
+
+
+def refresh(quiz_id=None, batch_size=None):
+    """
+    Recompute the statistics of every answered question (of one quiz), in batches of questions.
+    Returns the number of questions analysed.
+    """
+    batch_size = batch_size or settings.ITEM_STATS_BATCH_SIZE
+    answered = AnswerAttempt.objects.order_by()
+    if quiz_id is not None:
+        answered = answered.filter(question__quiz_id=quiz_id)
+    question_ids = sorted(answered.values_list('question_id', flat=True).distinct())
+
+    analysed = 0
+    for start in range(0, len(question_ids), batch_size):
+        stats = compute(question_ids[start:start + batch_size])
+        with transaction.atomic():
+            QuestionStats.objects.bulk_create(
+                stats, update_conflicts=True, unique_fields=['question'],
+                update_fields=['attempts', 'p_value', 'point_biserial', 'choices', 'computed_at'],
+            )
+        analysed += len(stats)
+    return analysed
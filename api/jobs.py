@@ -0,0 +1,165 @@
+'''
+Database backed job queue.
+
+Viewsets call `enqueue` and return straight away, the `runjobs` management command
+claims due jobs and runs the registered handlers in a thread pool. Finished and failed jobs are
+deleted by `purge_jobs` once they are older than JOBS_RETENTION_DAYS (run by `archivehistory`).
+'''
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# name -> callable(**payload)
+_handlers = {}
+
+
+def register(name):
+    """
+    Decorator that registers a function as the handler for jobs called `name`.
+    Handlers receive the job payload as keyword arguments and must be safe to run more than once.
+    """
+    def decorator(func):
+        _handlers[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, key=None, delay=None, max_attempts=None):
+    """
+    Queue a job and return it.
+    - key: optional idempotency key, an existing job with the same key is returned unchanged.
+    - delay: optional timedelta before the job becomes due.
+    """
+    if name not in _handlers:
+        raise ValueError(f"No job handler registered for '{name}'.")
+
+    fields = {
+        'name': name,
+        'payload': payload or {},
+        'run_after': timezone.now() + (delay or timedelta()),
+        'max_attempts': max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    }
+
+    if key is not None:
+        try:
+            with transaction.atomic():
+                job, _ = Job.objects.get_or_create(idempotency_key=key, defaults=fields)
+        except IntegrityError:
+            # Another request created the same job between our lookup and insert
+            job = Job.objects.get(idempotency_key=key)
+    else:
+        job = Job.objects.create(**fields)
+
+    if settings.JOBS_RUN_EAGERLY and job.status == 'queued':
+        # Development/test mode: run once the surrounding transaction has committed
+        transaction.on_commit(lambda: _run_now(job.pk))
+    return job
+
+
+def _run_now(pk):
+    if _claim(pk):
+        _run_claimed(pk)
+
+
+def _claim(pk):
+    """
+    Atomically move a job from queued to running. Returns False if another worker got it first.
+    """
+    return Job.objects.filter(pk=pk, status='queued').update(
+        status='running', locked_at=timezone.now()
+    ) == 1
+
+
+def claim_due(limit):
+    """
+    Claim up to `limit` due jobs and return their ids.
+    Jobs stuck in running for longer than JOBS_LOCK_TIMEOUT (crashed worker) are requeued first, the
+    run that never finished counts as an attempt, so a job that keeps crashing its worker ends up failed.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT))
+    stale.filter(attempts__gte=F('max_attempts') - 1).update(
+        status='failed', attempts=F('attempts') + 1, locked_at=None,
+        last_error="The worker running the job stopped before it finished.")
+    stale.update(status='queued', attempts=F('attempts') + 1, locked_at=None)
+
+    candidates = Job.objects.filter(status='queued', run_after__lte=now) \
+        .order_by('run_after', 'id').values_list('id', flat=True)[:limit]
+    return [pk for pk in candidates if _claim(pk)]
+
+
+def _run_claimed(pk):
+    """
+    Run one claimed job and record the outcome, retrying with a linear backoff on failure.
+    """
+    job = Job.objects.get(pk=pk)
+    handler = _handlers.get(job.name)
+    job.attempts += 1
+    try:
+        if handler is None:
+            raise LookupError(f"No job handler registered for '{job.name}'.")
+        # A failing handler leaves nothing half written behind for the retry
+        with transaction.atomic():
+            handler(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            logger.error("Job %s (%s) failed after %s attempts", job.pk, job.name, job.attempts)
+        else:
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=settings.JOBS_RETRY_DELAY * job.attempts)
+    else:
+        job.status = 'done'
+        job.last_error = None
+    job.locked_at = None
+    job.save(update_fields=['status', 'attempts', 'run_after', 'locked_at', 'last_error', 'updated_at'])
+    return job.status
+
+
+def _run_in_thread(pk):
+    # Pool threads open their own connections, close them when the job is finished
+    try:
+        return _run_claimed(pk)
+    finally:
+        connection.close()
+
+
+def run_pending(limit=50, workers=4):
+    """
+    Claim and run a batch of due jobs. Returns the number of jobs processed.
+    """
+    pks = claim_due(limit)
+    if not pks:
+        return 0
+    if workers <= 1:
+        for pk in pks:
+            _run_claimed(pk)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_run_in_thread, pks))
+    return len(pks)
+
+
+def purge_jobs(cutoff, batch_size=1000):
+    """
+    Delete done and failed jobs last updated before `cutoff`, one batch per query.
+    Returns the number of jobs deleted.
+    """
+    deleted = 0
+    finished = Job.objects.filter(status__in=('done', 'failed'), updated_at__lt=cutoff)
+    while True:
+        pks = list(finished.order_by('updated_at').values_list('id', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += Job.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,54 @@
+'''
+Game session lifecycle housekeeping, run periodically by the `sweepsessions` command.
+'''
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import events
+from .archive import archive_history
+from .models import GameSession
+from .timer import expire_due_sessions
+
+
+def abandon_stale_sessions(cutoff, batch_size=500):
+    """
+    Mark in progress sessions that have not been updated since `cutoff` as abandoned.
+    Runs as batched UPDATE statements so a large backlog never holds the write lock for long.
+    Returns the number of sessions marked.
+    """
+    marked = 0
+    stale = GameSession.objects.filter(status='in_progress', last_updated__lt=cutoff)
+    while True:
+        rows = list(stale.order_by('id').values_list('id', 'student_id', 'quiz_id')[:batch_size])
+        if not rows:
+            break
+        # .update() skips auto_now, so last_updated still records the student's last activity
+        marked += GameSession.objects.filter(id__in=[row[0] for row in rows], status='in_progress').update(status='abandoned')
+        events.sessions_abandoned(rows)
+    return marked
+
+
+def sweep_sessions(abandon_after=None, archive_after=None, batch_size=None):
+    """
+    Run one sweep and return a dict with the number of expired and abandoned sessions and archived rows.
+    Defaults come from the SESSION_* and ARCHIVE_AFTER_DAYS settings.
+    """
+    now = timezone.now()
+    if abandon_after is None:
+        abandon_after = timedelta(minutes=settings.SESSION_ABANDON_AFTER_MINUTES)
+    if archive_after is None:
+        archive_after = timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    batch_size = batch_size or settings.SESSION_SWEEP_BATCH_SIZE
+
+    # Sessions with a deadline are completed first, through the (status, deadline) index
+    expired = expire_due_sessions(now, batch_size)
+    abandoned = abandon_stale_sessions(now - abandon_after, batch_size)
+    archived = archive_history(now - archive_after, batch_size)
+    return {
+        'expired': expired,
+        'abandoned': abandoned,
+        'archived_sessions': archived['sessions'],
+        'archived_results': archived['results'],
+    }
@@ -0,0 +1,56 @@
+'''
+Short lived cache of successful logins.
+
+Children tend to press "Log in" several times, each press would otherwise hash the password again.
+Entries are keyed by an HMAC of username and password (the password itself is never stored),
+expire after LOGIN_CACHE_TTL seconds and are dropped as soon as the stored password hash changes.
+'''
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+_entries = OrderedDict()  # key -> (user id, encoded password, expires at)
+_lock = threading.Lock()
+
+
+def _key(username, password):
+    message = f'{username}\0{password}'.encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).digest()
+
+
+def get(username, password):
+    """
+    Return (user id, encoded password) of a recent successful login with these credentials, or None.
+    """
+    if not settings.LOGIN_CACHE_TTL:
+        return None
+    key = _key(username, password)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] < time.monotonic():
+            del _entries[key]
+            return None
+        return entry[0], entry[1]
+
+
+def remember(username, password, user):
+    if not settings.LOGIN_CACHE_TTL:
+        return
+    key = _key(username, password)
+    with _lock:
+        _entries[key] = (user.pk, user.password, time.monotonic() + settings.LOGIN_CACHE_TTL)
+        _entries.move_to_end(key)
+        # Bounded: drop the oldest entries first
+        while len(_entries) > settings.LOGIN_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def clear():
+    with _lock:
+        _entries.clear()
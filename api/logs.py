@@ -0,0 +1,142 @@
+'''
+Structured logging.
+
+Records are written as one JSON object per line. The handler only puts records on a bounded in-memory
+queue, a listener thread formats and writes them, so logging never waits on I/O in the request path.
+- RequestLogMiddleware (api/middleware.py) logs one line per request to `api.requests`, sampled
+  with REQUEST_LOG_SAMPLE_RATE. Server errors and requests slower than REQUEST_LOG_SLOW_MS are always logged.
+- Queries slower than SLOW_QUERY_MS are logged to `api.slow_queries` with their SQL and the stack
+  that ran them, in requests, jobs and commands alike.
+'''
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import time
+import traceback
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+# Attributes every LogRecord has, everything else was passed with `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self):
+        # Waits for room, the queue may be full when the listener is stopped
+        self.queue.put(self._sentinel)
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    Hands records to a listener thread that formats and writes them to `stream` (stderr by default).
+    The listener is started by the first record a process logs, so workers forked after logging was
+    configured start their own. Records logged while `queue_size` records are waiting are dropped,
+    the next record that gets through carries how many in `dropped_records`.
+    """
+
+    def __init__(self, stream=None, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream)
+        self.listener = None
+        self._pid = None
+        self.dropped = 0
+        atexit.register(self.stop_listener)
+
+    def _ensure_listener(self):
+        # Called under the handler lock, which logging re-creates in a forked child
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        if self._pid is not None:
+            # Forked: the parent's listener thread doesn't exist here and its queue may hold its records
+            self.queue = queue.Queue(self.queue.maxsize)
+            self.dropped = 0
+        self.listener = _Listener(self.queue, self.target)
+        self.listener.start()
+        self._pid = pid
+
+    def stop_listener(self):
+        """
+        Write out what is still queued and stop the listener of this process.
+        """
+        with self.lock:
+            if self._pid != os.getpid():
+                return
+            listener, self.listener, self._pid = self.listener, None, None
+        listener.stop()
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+    def enqueue(self, record):
+        if self.dropped:
+            record.dropped_records = self.dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        else:
+            self.dropped = 0
+
+    def close(self):
+        self.stop_listener()
+        super().close()
+
+    def setFormatter(self, fmt):
+        # Formatting happens in the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Freeze the message now, its arguments may change once the caller carries on
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+slow_query_logger = logging.getLogger('api.slow_queries')
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+            # Parameters are left out, they can hold personal data
+            slow_query_logger.warning('slow query', extra={
+                'sql': sql,
+                'duration_ms': round(elapsed * 1000, 1),
+                'database': context['connection'].alias,
+                'stack': ''.join(traceback.format_stack(limit=settings.SLOW_QUERY_STACK_DEPTH)[:-1]),
+            })
+
+
+def _install_slow_query_log(sender, connection, **kwargs):
+    # First in the list: execute_wrapper() context managers pop the last wrapper when they exit
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+connection_created.connect(_install_slow_query_log, dispatch_uid='api.logs.slow_queries')
@@ -0,0 +1,35 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.archive import archive_history, default_cutoff
+from api.jobs import purge_jobs
+
+
+class Command(BaseCommand):
+    help = "Move game sessions and quiz results older than the cutoff into the history tables, " \
+           "and delete finished jobs older than JOBS_RETENTION_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="Archive rows last updated before this date (YYYY-MM-DD), "
+                                             "defaults to ARCHIVE_AFTER_DAYS ago.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                day = datetime.strptime(options['before'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("--before must be a date in the format YYYY-MM-DD.")
+            cutoff = timezone.make_aware(datetime.combine(day, time.min))
+        else:
+            cutoff = default_cutoff()
+
+        result = archive_history(cutoff, options['batch_size'])
+        self.stdout.write(f"Archived {result['sessions']} session(s) and {result['results']} result(s) "
+                          f"last updated before {cutoff:%Y-%m-%d %H:%M}")
+        purged = purge_jobs(timezone.now() - timedelta(days=settings.JOBS_RETENTION_DAYS))
+        self.stdout.write(f"Deleted {purged} finished job(s) older than {settings.JOBS_RETENTION_DAYS} day(s)")
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.events import compact
+
+
+class Command(BaseCommand):
+    help = "Fold old gameplay events into per stream snapshots and delete them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.EVENT_COMPACT_AFTER_DAYS,
+                            help="Compact events older than this many days (default EVENT_COMPACT_AFTER_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=500, help="Streams folded per transaction.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        compacted = compact(cutoff, options['batch_size'])
+        self.stdout.write(f"Compacted {compacted} event(s) created before {cutoff:%Y-%m-%d %H:%M}")
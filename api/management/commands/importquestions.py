@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Quiz, User
+from api.question_import import IMPORT_FORMATS, import_questions, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Create questions from a CSV, JSON or JSON Lines question bank. Invalid rows are reported and skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Question file, columns: quiz,question_text,question_type,options,"
+                                         "correct_answer,points (options and correct_answer as JSON)")
+        parser.add_argument('--teacher', required=True, help="Username of the teacher the questions belong to.")
+        parser.add_argument('--quiz', type=int, help="Quiz for rows without a quiz column.")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help="Defaults to the file extension.")
+
+    def handle(self, *args, **options):
+        teacher = User.objects.filter(username=options['teacher'], role='teacher').first()
+        if teacher is None:
+            raise CommandError(f"Unknown teacher '{options['teacher']}'.")
+        default_quiz = None
+        if options['quiz']:
+            default_quiz = Quiz.objects.filter(pk=options['quiz'], teacher=teacher).first()
+            if default_quiz is None:
+                raise CommandError(f"Quiz {options['quiz']} does not belong to {teacher.username}.")
+
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(f"Unsupported question file format '{file_format}'.")
+        try:
+            with open(path, 'rb') as f:
+                report = import_questions(iter_rows(f, file_format), teacher, default_quiz)
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(f"Created {report['created']} question(s), {len(report['errors'])} row(s) skipped")
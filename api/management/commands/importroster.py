@@ -0,0 +1,31 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.roster import import_roster, parse_roster
+from api.tenancy import resolve_school
+
+
+class Command(BaseCommand):
+    help = "Create users from a CSV or JSON roster file. Invalid rows are reported and skipped."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Roster file, columns: "
+                                         "username,password,role,email,first_name,last_name,class_year")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file extension.")
+        parser.add_argument('--school', help="Slug or id of the school, required when there is more than one.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        try:
+            with open(path, encoding='utf-8-sig') as f:
+                rows = parse_roster(f.read(), file_format)
+            school = resolve_school(options['school'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        report = import_roster(rows, school)
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']} ({error['username'] or '-'}): {json.dumps(error['errors'])}")
+        self.stdout.write(f"Created {report['created']} user(s), {len(report['errors'])} row(s) skipped")
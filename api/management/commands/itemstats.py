@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.item_stats import refresh
+
+
+class Command(BaseCommand):
+    help = "Recompute item statistics (p-value, point-biserial, option counts) of answered questions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help="Only the questions of this quiz.")
+        parser.add_argument('--batch-size', type=int, help="Questions analysed per batch (default ITEM_STATS_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        analysed = refresh(quiz_id=options['quiz'], batch_size=options['batch_size'])
+        self.stdout.write(f"Analysed {analysed} question(s)")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.promotion import promote_students
+from api.tenancy import resolve_school
+
+
+class Command(BaseCommand):
+    help = "Move students between class years, e.g. promotestudents \"Year 1=Year 2\" \"Year 2=Year 3\" \"Year 6=\""
+
+    def add_arguments(self, parser):
+        parser.add_argument('moves', nargs='+', help="SOURCE=TARGET pairs, an empty TARGET removes the class year.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many students would move.")
+        parser.add_argument('--school', help="Slug or id of the school, required when there is more than one.")
+
+    def handle(self, *args, **options):
+        mapping = {}
+        for move in options['moves']:
+            if '=' not in move:
+                raise CommandError(f"'{move}' is not a SOURCE=TARGET pair.")
+            source, target = (part.strip() for part in move.split('=', 1))
+            mapping[source] = target or None
+
+        try:
+            report = promote_students(mapping, resolve_school(options['school']), dry_run=options['dry_run'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for move in report['moves']:
+            self.stdout.write(f"{move['from']} -> {move['to'] or '(none)'}: {move['students']} student(s)")
+        verb = "Would move" if report['dry_run'] else "Moved"
+        self.stdout.write(f"{verb} {report['total']} student(s)")
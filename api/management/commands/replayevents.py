@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.events import replay, restore
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = "Rebuild a student's game sessions, results and progress from the event log."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', required=True, help="Id or username of the student.")
+        parser.add_argument('--apply', action='store_true',
+                            help="Write the rebuilt state to the database, by default it is only printed.")
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['student']} if options['student'].isdigit() else {'username': options['student']}
+        student = User.objects.filter(role='student', **lookup).first()
+        if student is None:
+            raise CommandError(f"Unknown student '{options['student']}'.")
+
+        states = replay(student.pk)
+        for stream, (quiz_id, state) in sorted(states.items()):
+            self.stdout.write(f"{stream} quiz={quiz_id} status={state.get('status', '-')} score={state.get('score')}")
+
+        if options['apply']:
+            written = restore(student.pk, states)
+            self.stdout.write(f"Restored {written['sessions']} session(s), {written['results']} result(s) "
+                              f"and {written['progress']} progress row(s)")
@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from api.jobs import purge_jobs, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs. Keeps polling unless --once is given, which drains the due jobs and exits. " \
+           "Finished jobs older than JOBS_RETENTION_DAYS are deleted every JOBS_PURGE_INTERVAL seconds."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of worker threads.")
+        parser.add_argument('--batch', type=int, default=50, help="Maximum jobs claimed per poll.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once no due jobs are left.")
+
+    def handle(self, *args, **options):
+        next_purge = 0
+        while True:
+            close_old_connections()
+            if time.monotonic() >= next_purge:
+                purged = purge_jobs(timezone.now() - timedelta(days=settings.JOBS_RETENTION_DAYS))
+                if purged:
+                    self.stdout.write(f"Deleted {purged} finished job(s) older than {settings.JOBS_RETENTION_DAYS} day(s)")
+                next_purge = time.monotonic() + settings.JOBS_PURGE_INTERVAL
+            processed = run_pending(limit=options['batch'], workers=options['workers'])
+            if processed:
+                self.stdout.write(f"Processed {processed} job(s)")
+            if not processed:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
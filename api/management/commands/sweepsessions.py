@@ -0,0 +1,38 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.lifecycle import sweep_sessions
+
+
+class Command(BaseCommand):
+    help = "Complete game sessions past their deadline, mark stale ones as abandoned and archive old finished sessions and quiz results."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--abandon-after', type=int, default=settings.SESSION_ABANDON_AFTER_MINUTES,
+                            help="Minutes without an update before an in progress session is abandoned.")
+        parser.add_argument('--archive-after', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Days after which finished sessions and results move to the history tables.")
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_SWEEP_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep running, sweeping every --interval seconds.")
+        parser.add_argument('--interval', type=int, default=settings.SESSION_SWEEP_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            result = sweep_sessions(
+                abandon_after=timedelta(minutes=options['abandon_after']),
+                archive_after=timedelta(days=options['archive_after']),
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(
+                f"Expired {result['expired']} session(s), abandoned {result['abandoned']} session(s), "
+                f"archived {result['archived_sessions']} session(s) "
+                f"and {result['archived_results']} result(s)"
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,330 @@
+'''
+Operational metrics in the Prometheus text format, scraped from /api/metrics/.
+
+Updates never take a lock: every thread counts into its own shard of each metric and the shards are
+only added up when the metrics are scraped, the shards of exited threads are folded into one retired
+total. With several worker processes, set METRICS_MULTIPROC_DIR to a directory shared by the
+workers: each process writes its totals there (at most every METRICS_WRITE_INTERVAL seconds, after a
+request) and a scrape adds up the files of the processes still running. A worker deletes its file
+when it exits, the file of a worker that was killed is deleted by the next scrape, so counts of
+stopped workers (e.g. requests in progress) never stay in the totals. Gauges computed from the
+database at scrape time are not written to the files.
+'''
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+from .models import GameSession
+
+_registry = []
+_registry_lock = threading.Lock()
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, shard)
+        self._retired = {}  # summed shards of threads that have exited
+        self._shards_lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            # Only taken once per thread, to register the thread's shard
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _prune(self):
+        # Called with _shards_lock held. The shard of an exited thread no longer changes, its counts
+        # move to the retired totals so the shards don't pile up with every thread a server starts.
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+                continue
+            for key, value in shard.items():
+                self._retired[key] = self._add(self._retired.get(key), value)
+        self._shards = alive
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    @staticmethod
+    def _add(total, value):
+        return value if total is None else total + value
+
+    def collect(self):
+        """
+        {label values: value} of this process, summed over all threads.
+        """
+        with self._shards_lock:
+            self._prune()
+            totals = dict(self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # dict.copy() is atomic, the owning thread may keep counting meanwhile
+            for key, value in shard.copy().items():
+                totals[key] = self._add(totals.get(key), value)
+        return totals
+
+    @property
+    def shared(self):
+        """
+        Whether the values are added up across processes in multi-process mode.
+        """
+        return True
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Either moved up and down with inc()/dec(), or computed when scraped by a function set with
+    set_function(), returning a number or {label values: number}.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        self._function = function
+        return function
+
+    def collect(self):
+        if self._function is None:
+            return super().collect()
+        value = self._function()
+        return value if isinstance(value, dict) else {(): value}
+
+    @property
+    def shared(self):
+        return self._function is None
+
+
+class Histogram(Metric):
+    """
+    Values are [count per bucket..., count above the last bucket, sum].
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @staticmethod
+    def _add(total, value):
+        return list(value) if total is None else [a + b for a, b in zip(total, value)]
+
+
+def _path(pid):
+    return os.path.join(settings.METRICS_MULTIPROC_DIR, f'metrics_{pid}.json')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, run by another user
+        return True
+    return True
+
+
+def _local_values():
+    return {metric.name: [[list(key), value] for key, value in metric.collect().items()]
+            for metric in _registry if metric.shared}
+
+
+_last_write = 0.0
+_write_lock = threading.Lock()
+
+
+def write_process_file(**kwargs):
+    """
+    Write this process's totals to METRICS_MULTIPROC_DIR, replacing its previous file atomically.
+    """
+    global _last_write
+    if not settings.METRICS_MULTIPROC_DIR or not _write_lock.acquire(blocking=False):
+        return
+    try:
+        directory = settings.METRICS_MULTIPROC_DIR
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(_local_values(), f)
+        os.replace(tmp, _path(os.getpid()))
+        _last_write = time.monotonic()
+    finally:
+        _write_lock.release()
+
+
+def _maybe_write(**kwargs):
+    if settings.METRICS_MULTIPROC_DIR and time.monotonic() - _last_write >= settings.METRICS_WRITE_INTERVAL:
+        write_process_file()
+
+
+def remove_process_file():
+    """
+    Delete this process's file, its values stop counting towards the totals.
+    """
+    if not settings.METRICS_MULTIPROC_DIR:
+        return
+    with _write_lock:
+        try:
+            os.remove(_path(os.getpid()))
+        except FileNotFoundError:
+            pass
+
+
+request_finished.connect(_maybe_write, dispatch_uid='api.metrics.write')
+atexit.register(remove_process_file)
+
+
+def _collect_all():
+    """
+    {metric name: {label values: value}}, of every process in multi-process mode.
+    """
+    if not settings.METRICS_MULTIPROC_DIR:
+        return {metric.name: metric.collect() for metric in _registry}
+
+    write_process_file()
+    by_name = {metric.name: metric for metric in _registry}
+    totals = {metric.name: {} for metric in _registry}
+    directory = settings.METRICS_MULTIPROC_DIR
+    for filename in os.listdir(directory):
+        if not (filename.startswith('metrics_') and filename.endswith('.json')):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            pid = int(filename[len('metrics_'):-len('.json')])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            # Left behind by a worker that was killed
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                values = json.load(f)
+        except (OSError, ValueError):
+            # Being replaced right now, or left half written by a killed worker
+            continue
+        for name, samples in values.items():
+            metric = by_name.get(name)
+            if metric is None:
+                continue
+            for key, value in samples:
+                key = tuple(key)
+                totals[name][key] = metric._add(totals[name].get(key), value)
+    for metric in _registry:
+        if not metric.shared:
+            totals[metric.name] = metric.collect()
+    return totals
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    totals = _collect_all()
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for key, value in sorted(totals[metric.name].items()):
+            if metric.kind != 'histogram':
+                lines.append(f'{metric.name}{_labels(metric.labelnames, key)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                cumulative += count
+                le = (('le', _number(bound)),)
+                lines.append(f'{metric.name}_bucket{_labels(metric.labelnames, key, le)} {cumulative}')
+            lines.append(f'{metric.name}_sum{_labels(metric.labelnames, key)} {_number(value[-1])}')
+            lines.append(f'{metric.name}_count{_labels(metric.labelnames, key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# Metrics of the app
+
+REQUESTS = Counter('quizora_http_requests_total', "API requests by view, action, method and status.",
+                   ('view', 'action', 'method', 'status'))
+REQUEST_DURATION = Histogram('quizora_http_request_duration_seconds', "Request latency by view and action.",
+                             ('view', 'action'))
+REQUESTS_IN_PROGRESS = Gauge('quizora_http_requests_in_progress', "Requests being handled right now.")
+DB_QUERIES = Counter('quizora_db_queries_total', "Database queries run by requests, by view.", ('view',))
+DB_DURATION = Histogram('quizora_db_duration_seconds', "Database time per request, by view.", ('view',))
+GAME_EVENTS = Counter('quizora_game_events_total',
+                      "Gameplay events by kind: session_started, answer, session_completed, ...", ('kind',))
+SESSIONS_IN_PROGRESS = Gauge('quizora_game_sessions_in_progress', "Game sessions currently in progress.")
+
+
+@SESSIONS_IN_PROGRESS.set_function
+def _sessions_in_progress():
+    return GameSession.objects.filter(status='in_progress').count()
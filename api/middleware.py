@@ -0,0 +1,141 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .db_routers import read_from_replica, replica_aliases
+
+# Cookie holding the time until which the client reads from the primary database
+STICKY_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Send reads of safe-method API requests to a read replica.
+    After a successful write the client sticks to the primary for REPLICA_STICKY_SECONDS,
+    so a student always sees their own GameSession PATCH on the next GET.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases() or not request.path.startswith(settings.REPLICA_ROUTED_PATH):
+            return self.get_response(request)
+
+        if request.method in SAFE_METHODS and not self.is_sticky(request):
+            with read_from_replica():
+                return self.get_response(request)
+
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            until = int(time.time()) + settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(STICKY_COOKIE, str(until), max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def is_sticky(self, request):
+        try:
+            return int(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+
+def view_labels(request):
+    """
+    (view, action) of a resolved request: the viewset or view class and the viewset action.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', ''
+    func = match.func
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    view = view_class.__name__ if view_class else getattr(func, '__name__', 'unknown')
+    actions = getattr(func, 'actions', None) or {}
+    return view, actions.get(request.method.lower(), '')
+
+
+class MetricsMiddleware:
+    """
+    Count requests, their latency and the database queries they run (api/metrics.py).
+    Queries are timed with an execute wrapper on every database connection, so replica reads count too.
+    The totals are left on the request as `query_stats` for RequestLogMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        db = request.query_stats = {'queries': 0, 'seconds': 0.0}
+
+        def timed(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db['queries'] += 1
+                db['seconds'] += time.perf_counter() - start
+
+        metrics.REQUESTS_IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timed))
+                response = self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_PROGRESS.dec()
+        elapsed = time.perf_counter() - start
+
+        view, action = view_labels(request)
+        metrics.REQUESTS.inc(view=view, action=action, method=request.method, status=response.status_code)
+        metrics.REQUEST_DURATION.observe(elapsed, view=view, action=action)
+        metrics.DB_QUERIES.inc(db['queries'], view=view)
+        metrics.DB_DURATION.observe(db['seconds'], view=view)
+        return response
+
+
+request_logger = logging.getLogger('api.requests')
+
+
+class RequestLogMiddleware:
+    """
+    One structured log line per request (api/logs.py), for a REQUEST_LOG_SAMPLE_RATE share of requests.
+    Server errors and requests slower than REQUEST_LOG_SLOW_MS are always logged.
+    Comes after MetricsMiddleware, whose query totals it reports.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        always = response.status_code >= 500 or elapsed_ms >= settings.REQUEST_LOG_SLOW_MS
+        if not always and random.random() >= settings.REQUEST_LOG_SAMPLE_RATE:
+            return response
+
+        user = getattr(request, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        view, action = view_labels(request)
+        query_stats = getattr(request, 'query_stats', {})
+        request_logger.log(logging.WARNING if response.status_code >= 500 else logging.INFO, 'request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'latency_ms': round(elapsed_ms, 1),
+            'view': view,
+            'action': action,
+            'user_id': user.pk if authenticated else None,
+            'role': getattr(user, 'role', None) if authenticated else None,
+            'queries': query_stats.get('queries'),
+            'db_ms': round(query_stats['seconds'] * 1000, 1) if query_stats else None,
+        })
+        return response
@@ -2,7 +2,7 @@
 
 import json
 from django.db import migrations
-from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 import datetime
 
 def load_data(apps, schema_editor):
@@ -29,8 +29,8 @@ def load_data(apps, schema_editor):
         progress_tracking_data = json.load(f)
 
 
-  # Load data into User
-    User = get_user_model()
+  # Load data into User, through the historical model so later User columns don't break this migration
+    User = apps.get_model('api', 'User')
     for entry in user_data:
         fields = entry['fields']
         user, created = User.objects.get_or_create(
@@ -47,7 +47,7 @@ def load_data(apps, schema_editor):
         )
         # Set the password properly if the user was created
         if created:
-            user.set_password('Swinburne!')  # Hash the password
+            user.password = make_password('Swinburne!')  # Hash the password
             user.save()
 
     # Load data into Quiz
@@ -103,7 +103,6 @@ def load_data(apps, schema_editor):
                 "last_updated": fields['last_updated'],
             },
         )
-        print(game_session.status)
         if game_session.status ==  'completed':
             QuizResult.objects.get_or_create(
                 pk=entry['pk'],
@@ -123,7 +122,7 @@ def reverse_data(apps, schema_editor):
     Quiz = apps.get_model('api', 'Quiz')
     Question = apps.get_model('api', 'Question')
     ProgressTracking = apps.get_model('api', 'ProgressTracking')
-    User = get_user_model()
+    User = apps.get_model('api', 'User')
 
     # Delete all objects created during migration
     Question.objects.all().delete()
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameSessionHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('duration', models.DurationField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('in_progress', 'In Progress'), ('completed', 'Completed'), ('abandoned', 'Abandoned')], max_length=20)),
+                ('score', models.IntegerField()),
+                ('correct_answers_count', models.IntegerField(default=0)),
+                ('date_played', models.DateTimeField()),
+                ('last_updated', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status', 'last_updated'], name='api_gameses_status_dfa61f_idx'),
+        ),
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.quiz'),
+        ),
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='student',
+            field=models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='gamesessionhistory',
+            index=models.Index(fields=['student', 'date_played'], name='api_gameses_student_95b553_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_gamesessionhistory_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizResultHistory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('score', models.IntegerField()),
+                ('feedback', models.TextField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['updated_at'], name='api_quizres_updated_23d39c_idx'),
+        ),
+        migrations.AddField(
+            model_name='quizresulthistory',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.quiz'),
+        ),
+        migrations.AddField(
+            model_name='quizresulthistory',
+            name='student',
+            field=models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='quizresulthistory',
+            index=models.Index(fields=['student', 'completed_at'], name='api_quizres_student_ad53b8_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_quizresulthistory_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('content_type', models.CharField(max_length=100)),
+                ('size', models.BigIntegerField()),
+                ('original_name', models.CharField(blank=True, max_length=255)),
+                ('has_thumbnail', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assets', to='api.question')),
+            ],
+        ),
+    ]
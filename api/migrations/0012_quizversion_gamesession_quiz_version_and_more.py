@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_questionasset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('package', models.TextField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='api.quiz')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='quiz_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.quizversion'),
+        ),
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='quiz_version',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.quizversion'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizversion',
+            constraint=models.UniqueConstraint(fields=('quiz', 'version'), name='unique_quiz_version'),
+        ),
+    ]
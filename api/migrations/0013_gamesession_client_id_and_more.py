@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_quizversion_gamesession_quiz_version_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='gamesession',
+            constraint=models.UniqueConstraint(fields=('student', 'client_id'), name='unique_student_client_attempt'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_gamesession_client_id_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.BigIntegerField()),
+                ('is_correct', models.BooleanField()),
+                ('answered_at', models.DateTimeField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.question')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'question'], name='api_answera_student_7a513a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('session_id', 'question'), name='unique_session_question_attempt')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ReviewItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('box', models.PositiveSmallIntegerField(default=0)),
+                ('due_at', models.DateTimeField()),
+                ('lapses', models.PositiveIntegerField(default=0)),
+                ('last_answered_at', models.DateTimeField()),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.question')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'due_at'], name='api_reviewi_student_d1fdc6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'question'), name='unique_student_review_item')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_answerattempt_reviewitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameEventSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(max_length=64, unique=True)),
+                ('student_id', models.BigIntegerField(db_index=True)),
+                ('quiz_id', models.BigIntegerField()),
+                ('state', models.JSONField(default=dict)),
+                ('last_event_id', models.BigIntegerField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GameEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stream', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('session_started', 'Session Started'), ('answer', 'Answer'), ('session_updated', 'Session Updated'), ('session_completed', 'Session Completed'), ('session_abandoned', 'Session Abandoned'), ('result_recorded', 'Result Recorded'), ('result_override', 'Result Override')], max_length=30)),
+                ('student_id', models.BigIntegerField()),
+                ('quiz_id', models.BigIntegerField()),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stream', 'id'], name='api_gameeve_stream_817f5d_idx'), models.Index(fields=['student_id', 'id'], name='api_gameeve_student_9d5523_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_gameeventsnapshot_gameevent'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['date_played'], name='api_gameses_date_pl_85d9ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progresstracking',
+            index=models.Index(fields=['started_at'], name='api_progres_started_673984_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['title'], name='api_quiz_title_c30a22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['created_at'], name='api_quiz_created_58d5f7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['completed_at'], name='api_quizres_complet_cd1959_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['email'], name='api_user_email_a7eefd_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:45
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_gamesession_api_gameses_date_pl_85d9ce_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='seed',
+            field=models.PositiveIntegerField(default=api.models.new_session_seed, editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_gamesession_seed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='closes_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='max_attempts',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='opens_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='time_limit',
+            field=models.DurationField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['student', 'quiz'], name='api_gameses_student_91a397_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['class_year', 'opens_at', 'closes_at'], name='api_quiz_class_y_a52296_idx'),
+        ),
+    ]
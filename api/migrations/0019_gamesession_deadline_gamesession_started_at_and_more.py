@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_date_played(apps, schema_editor):
+    # Existing sessions started when they were first saved
+    GameSession = apps.get_model('api', 'GameSession')
+    GameSession.objects.update(started_at=models.F('date_played'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_quiz_closes_at_quiz_max_attempts_quiz_opens_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesession',
+            name='deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='started_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_date_played, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['status', 'deadline'], name='api_gameses_status_153cb1_idx'),
+        ),
+    ]
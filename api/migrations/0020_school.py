@@ -0,0 +1,76 @@
+# Generated by Django 5.1.1 on 2026-10-19 11:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TENANT_MODELS = ('classyear', 'quiz', 'question', 'gamesession', 'quizresult', 'progresstracking')
+
+
+def assign_default_school(apps, schema_editor):
+    # Everything created before schools existed belongs to one default school
+    School = apps.get_model('api', 'School')
+    school = School.objects.create(name='Default School', slug='default')
+    apps.get_model('api', 'User').objects.update(school=school)
+    for model_name in TENANT_MODELS:
+        apps.get_model('api', model_name).objects.update(school=school)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_gamesession_deadline_gamesession_started_at_and_more'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='School',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='classyear',
+            name='name',
+            field=models.CharField(max_length=50),
+        ),
+        migrations.AddField(
+            model_name='classyear',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='gamesession',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='progresstracking',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='quizresult',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='school',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.RunPython(assign_default_school, migrations.RunPython.noop),
+    ]
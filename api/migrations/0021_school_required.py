@@ -0,0 +1,71 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0020 so the data update and the column changes don't share a transaction
+
+    dependencies = [
+        ('api', '0020_school'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='classyear',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AlterField(
+            model_name='gamesession',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AlterField(
+            model_name='quizresult',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AlterField(
+            model_name='progresstracking',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesession',
+            index=models.Index(fields=['school', 'student'], name='api_gameses_school__827943_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='progresstracking',
+            index=models.Index(fields=['school', 'student'], name='api_progres_school__769729_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['school', 'quiz'], name='api_questio_school__ed0499_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['school', 'class_year'], name='api_quiz_school__d9d306_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresult',
+            index=models.Index(fields=['school', 'quiz'], name='api_quizres_school__34bf51_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['school', 'role'], name='api_user_school__0d2cc4_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='classyear',
+            constraint=models.UniqueConstraint(fields=('school', 'name'), name='unique_school_class_year'),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:00
+
+import json
+
+from django.db import migrations
+
+# Frozen copy of the canonical form of api/question_types.py as it was when this migration was
+# written: later changes to the live module must not change what this migration does.
+
+
+class Invalid(ValueError):
+    pass
+
+
+def text(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise Invalid()
+    value = ' '.join(str(value).split())
+    if not value:
+        raise Invalid()
+    return value
+
+
+def text_list(minimum):
+    def node(value):
+        if not isinstance(value, list) or len(value) < minimum:
+            raise Invalid()
+        items = [text(item) for item in value]
+        if len(set(items)) != len(items):
+            raise Invalid()
+        return items
+    return node
+
+
+def text_map(minimum):
+    def node(value):
+        if not isinstance(value, dict) or len(value) < minimum:
+            raise Invalid()
+        items = {text(key): text(item) for key, item in value.items()}
+        if len(items) != len(value):
+            raise Invalid()
+        return dict(sorted(items.items()))
+    return node
+
+
+def record(**fields):
+    def node(value):
+        if not isinstance(value, dict) or set(value) != set(fields):
+            raise Invalid()
+        return {name: fields[name](value[name]) for name in fields}
+    return node
+
+
+def nullable(inner):
+    def node(value):
+        return None if value is None else inner(value)
+    return node
+
+
+def choice_labels(value):
+    if isinstance(value, dict):
+        labels = {text(label): text(item) for label, item in value.items()}
+    else:
+        labels = {text(label): None for label in (value if isinstance(value, list) else [value])}
+    if not labels:
+        raise Invalid()
+    return labels
+
+
+def check_choices(options, correct_answer):
+    for label, item in correct_answer.items():
+        if label not in options or item not in (None, options[label]):
+            raise Invalid()
+    return options, {label: options[label] for label in sorted(correct_answer)}
+
+
+def blanks(value):
+    return text_map(1)(value if isinstance(value, dict) else {'blank': value})
+
+
+def check_blanks(options, correct_answer):
+    if options is not None and set(options) != set(correct_answer):
+        raise Invalid()
+    return options, correct_answer
+
+
+def check_order(options, correct_answer):
+    if sorted(correct_answer) != sorted(options):
+        raise Invalid()
+    return options, correct_answer
+
+
+def check_pairs(options, correct_answer):
+    if set(correct_answer) != set(options['left']) \
+            or not all(right in options['right'] for right in correct_answer.values()):
+        raise Invalid()
+    return options, {left: correct_answer[left] for left in options['left']}
+
+
+# question type -> (options node, correct_answer node, cross field check)
+SCHEMAS = {
+    'multiple_choice': (text_map(2), choice_labels, check_choices),
+    'fill_in_the_blank': (nullable(text_map(1)), blanks, check_blanks),
+    'drag_and_drop': (text_list(2), text_list(2), check_order),
+    'matching_pairs': (record(left=text_list(2), right=text_list(2)), text_map(2), check_pairs),
+}
+
+
+def canonical(question_type, options, correct_answer):
+    """
+    (options, correct_answer) in canonical form, None if they don't fit the question type.
+    """
+    schema = SCHEMAS.get(question_type)
+    if schema is None:
+        return None
+    options_node, answer_node, check = schema
+    try:
+        return check(options_node(options), answer_node(correct_answer))
+    except Invalid:
+        return None
+
+
+def canonicalize_questions(apps, schema_editor):
+    # Rewrite existing questions in canonical form. Questions that don't fit their type are left as
+    # they are and get checked the next time they are edited.
+    Question = apps.get_model('api', 'Question')
+    changed = []
+    for question in Question.objects.only('id', 'question_type', 'options', 'correct_answer').iterator():
+        cleaned = canonical(question.question_type, question.options, question.correct_answer)
+        # Compared as JSON text, key order is part of the canonical form
+        if cleaned is not None and json.dumps(list(cleaned)) != json.dumps([question.options, question.correct_answer]):
+            question.options, question.correct_answer = cleaned
+            changed.append(question)
+    Question.objects.bulk_update(changed, ['options', 'correct_answer'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_school_required'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_questions, migrations.RunPython.noop),
+    ]
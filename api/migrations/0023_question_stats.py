@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_canonical_question_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='api.question')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('p_value', models.FloatField(blank=True, null=True)),
+                ('point_biserial', models.FloatField(blank=True, null=True)),
+                ('choices', models.JSONField(blank=True, default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='answerattempt',
+            name='answer',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_student_school(apps, schema_editor):
+    # Archived rows belong to the school of their student
+    User = apps.get_model('api', 'User')
+    school = Subquery(User.objects.filter(pk=OuterRef('student_id')).values('school_id')[:1])
+    for model_name in ('gamesessionhistory', 'quizresulthistory'):
+        apps.get_model('api', model_name).objects.update(school=school)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_question_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddField(
+            model_name='quizresulthistory',
+            name='school',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.RunPython(copy_student_school, migrations.RunPython.noop),
+    ]
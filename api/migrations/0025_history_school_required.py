@@ -0,0 +1,31 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0024 so the data update and the column changes don't share a transaction
+
+    dependencies = [
+        ('api', '0024_history_school'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gamesessionhistory',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AlterField(
+            model_name='quizresulthistory',
+            name='school',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='api.school'),
+        ),
+        migrations.AddIndex(
+            model_name='gamesessionhistory',
+            index=models.Index(fields=['school', 'student', 'date_played'], name='api_gameses_school__c612f8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizresulthistory',
+            index=models.Index(fields=['school', 'student', 'completed_at'], name='api_quizres_school__425b5c_idx'),
+        ),
+    ]
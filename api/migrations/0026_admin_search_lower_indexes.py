@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:22
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_history_school_required'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='quiz',
+            name='api_quiz_title_c30a22_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='api_user_email_a7eefd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='api_quiz_title_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='api_user_username_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='api_user_email_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_admin_search_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='client_id',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='seed',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gamesessionhistory',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='gamesessionhistory',
+            constraint=models.UniqueConstraint(fields=('student', 'client_id'), name='unique_student_client_archived_attempt'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-19 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_gamesessionhistory_client_id_seed_timing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'updated_at'], name='api_job_status_976bf3_idx'),
+        ),
+    ]
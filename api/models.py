@@ -1,6 +1,28 @@
+import secrets
+
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.contrib.auth.hashers import check_password, make_password
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from . import question_types
+from .hashers import hasher_for_role
+
+'''
+School
+Tenant of the deployment. Users, class years, quizzes and gameplay rows belong to one school and
+are only visible inside it (api/tenancy.py).
+'''
+class School(models.Model):
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 
 '''
 User model class that defines
@@ -12,6 +34,8 @@ class User(AbstractUser):
         ('student', 'Student'),
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='student')
+    # Null only for platform staff, who see every school
+    school = models.ForeignKey(School, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
 
     # ForeignKey to ClassYear, for students only
     class_year = models.ForeignKey('ClassYear', on_delete=models.SET_NULL, 
@@ -21,17 +45,46 @@ class User(AbstractUser):
     groups = models.ManyToManyField(Group, related_name='api_user_groups', blank=True)
     user_permissions = models.ManyToManyField(Permission, related_name='api_user_permissions', blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Admin search by username and email prefix (PrefixSearchMixin in api/admin.py)
+            models.Index(Lower('username'), name='api_user_username_lower_idx'),
+            models.Index(Lower('email'), name='api_user_email_lower_idx'),
+            # Users of a school by role, e.g. the students a teacher can see
+            models.Index(fields=['school', 'role']),
+        ]
 
     def clean(self):
          # class_year is only set for students
         if self.role != 'student' and self.class_year:
             raise ValidationError({'class_year': "Only students can have a class year."})
+        # Scoping by school fails closed, a user without one would see nothing at all
+        if self.school_id is None and not self.is_superuser:
+            raise ValidationError({'school': "Only superusers can be without a school."})
         
     def save(self, *args, **kwargs):
         # Call clean to  validate before saving
         self.clean()
         super().save(*args, **kwargs)
 
+    def set_password(self, raw_password):
+        # Hash with the hasher configured for the user's role (api/hashers.py)
+        self.password = make_password(raw_password, hasher=hasher_for_role(self.role))
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Same as AbstractBaseUser.check_password, but a correct password stored with a different
+        hasher than the role's one is rehashed with the role's hasher.
+        """
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return check_password(raw_password, self.password, setter, preferred=hasher_for_role(self.role))
+
 
     def __str__(self):
         return self.username
@@ -40,9 +93,15 @@ class User(AbstractUser):
 Class Year for primary school student
 '''
 class ClassYear(models.Model):
-    name = models.CharField(max_length=50, unique=True)  # 'Year 1', 'Year 2', etc.
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
+    name = models.CharField(max_length=50)  # 'Year 1', 'Year 2', etc., unique within a school
     description = models.TextField(blank=True, null=True)  # Optional field for more information about the class year
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'name'], name='unique_school_class_year'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -51,17 +110,62 @@ class ClassYear(models.Model):
 Quiz model
 '''
 class Quiz(models.Model):
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'teacher'})
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     class_year = models.ForeignKey(ClassYear, on_delete=models.SET_NULL, null=True, blank=True) 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Availability window, attempts can only be started between opens_at and closes_at (open ended when null)
+    opens_at = models.DateTimeField(null=True, blank=True)
+    closes_at = models.DateTimeField(null=True, blank=True)
+    time_limit = models.DurationField(null=True, blank=True)
+    max_attempts = models.PositiveIntegerField(null=True, blank=True)  # per student, unlimited when null
+
+    class Meta:
+        indexes = [
+            # Admin search by title prefix (PrefixSearchMixin in api/admin.py) and date hierarchy
+            models.Index(Lower('title'), name='api_quiz_title_lower_idx'),
+            models.Index(fields=['created_at']),
+            # Quizzes currently open for a class year (api/scheduling.py)
+            models.Index(fields=['class_year', 'opens_at', 'closes_at']),
+            # Quizzes of a school, and of a class year for students
+            models.Index(fields=['school', 'class_year']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.teacher.school_id
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
 
+'''
+Quiz Version
+Immutable snapshot of a quiz and its questions taken when the teacher publishes it.
+`package` is the compact JSON built by api/packages.py, including the precomputed answer key,
+so gameplay and grading never read the live Question rows.
+'''
+class QuizVersion(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='versions')
+    version = models.PositiveIntegerField()
+    package = models.TextField()
+    checksum = models.CharField(max_length=64)  # sha256 of package
+    published_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'version'], name='unique_quiz_version'),
+        ]
+
+    def __str__(self):
+        return f'{self.quiz.title} v{self.version}'
+
+
 '''
     Model Quiestion    
 '''
@@ -72,6 +176,7 @@ class Question(models.Model):
         ('fill_in_the_blank', 'Fill in the Blank'),
         ('matching_pairs', 'Matching Pairs'),
      )
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'teacher'})
     question_text = models.TextField()
@@ -86,10 +191,49 @@ class Question(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['school', 'quiz']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.quiz.school_id
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        # Same check as the API, so questions edited in the admin are stored canonical too
+        options, correct_answer, errors = question_types.clean(self.question_type, self.options, self.correct_answer)
+        if errors:
+            raise ValidationError(errors)
+        self.options, self.correct_answer = options, correct_answer
+
     def __str__(self):
         return self.question_text
+
+
+'''
+Question asset
+Image or audio file attached to a question. The file itself lives in content addressed storage
+(api/assets.py) under its sha256, so identical uploads are stored once.
+'''
+class QuestionAsset(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='assets')
+    sha256 = models.CharField(max_length=64, db_index=True)
+    content_type = models.CharField(max_length=100)
+    size = models.BigIntegerField()
+    original_name = models.CharField(max_length=255, blank=True)
+    has_thumbnail = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.original_name or self.sha256} ({self.question_id})'
     
     
+def new_session_seed():
+    return secrets.randbits(31)
+
+
 '''
 Game Session
 '''
@@ -100,8 +244,11 @@ class GameSession(models.Model):
         ('abandoned', 'Abandoned')
     ]
         
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE) 
+    # Published version the session is played and graded against, null for quizzes never published
+    quiz_version = models.ForeignKey(QuizVersion, on_delete=models.SET_NULL, null=True, blank=True)
     # using user id and quiz id can tell user's no of attempt to that quiz
     duration = models.DurationField(null=True, blank=True)  
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
@@ -109,14 +256,81 @@ class GameSession(models.Model):
     correct_answers_count = models.IntegerField(default=0)
     date_played = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True) # Track when this game session was lat updated
+    # Id the game client gave an attempt played offline, makes re-uploading the same attempt harmless
+    client_id = models.CharField(max_length=64, null=True, blank=True)
+    # Question and option order of the session is derived from this (api/shuffle.py)
+    seed = models.PositiveIntegerField(default=new_session_seed, editable=False)
+    # Timing is kept by the server (api/timer.py), deadline is set when the quiz has a time limit
+    started_at = models.DateTimeField(default=timezone.now)
+    deadline = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Used by the session sweeper to find stale and finished sessions
+            models.Index(fields=['status', 'last_updated']),
+            # Admin date hierarchy and default ordering
+            models.Index(fields=['date_played']),
+            # Attempt count of a student on a quiz
+            models.Index(fields=['student', 'quiz']),
+            # Sessions past their deadline, found without scanning every in progress session
+            models.Index(fields=['status', 'deadline']),
+            models.Index(fields=['school', 'student']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'client_id'], name='unique_student_client_attempt'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.student.school_id
+        super().save(*args, **kwargs)
+
+
+'''
+Game Session History
+Compact copy of finished game sessions moved out of GameSession by the session sweeper,
+the primary key is the id the session had in GameSession.
+'''
+class GameSessionHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    quiz_version = models.ForeignKey(QuizVersion, on_delete=models.SET_NULL, null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=GameSession.STATUS_CHOICES)
+    score = models.IntegerField()
+    correct_answers_count = models.IntegerField(default=0)
+    date_played = models.DateTimeField()
+    last_updated = models.DateTimeField()
+    # Copied from GameSession, null on rows archived before they were kept
+    client_id = models.CharField(max_length=64, null=True, blank=True)
+    seed = models.PositiveIntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    deadline = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'date_played']),
+            models.Index(fields=['school', 'student', 'date_played']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'client_id'], name='unique_student_client_archived_attempt'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.student.school_id
+        super().save(*args, **kwargs)
 
-    
 
 '''
 QuizResult
 Once session starts and progresses at the end Quiz Result will only save results of completed quiz
 '''
 class QuizResult(models.Model):
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     score = models.IntegerField()
@@ -124,6 +338,48 @@ class QuizResult(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Used by archival to find old results
+            models.Index(fields=['updated_at']),
+            # Admin date hierarchy and default ordering
+            models.Index(fields=['completed_at']),
+            models.Index(fields=['school', 'quiz']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.student.school_id
+        super().save(*args, **kwargs)
+
+
+'''
+QuizResult History
+Quiz results moved out of QuizResult once they are older than the archive cutoff,
+the primary key is the id the result had in QuizResult.
+'''
+class QuizResultHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    score = models.IntegerField()
+    feedback = models.TextField(blank=True, null=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'completed_at']),
+            models.Index(fields=['school', 'student', 'completed_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.student.school_id
+        super().save(*args, **kwargs)
+
 
 '''
 Progress tracking
@@ -134,6 +390,7 @@ class ProgressTracking(models.Model):
         ('completed', 'Completed'),
     )
 
+    school = models.ForeignKey(School, on_delete=models.CASCADE, db_index=False)
     student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default='in_progress')
@@ -141,5 +398,161 @@ class ProgressTracking(models.Model):
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Admin date hierarchy and default ordering
+            models.Index(fields=['started_at']),
+            models.Index(fields=['school', 'student']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.school_id is None:
+            self.school_id = self.student.school_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f'{self.student.username} - {self.quiz.title} - {self.status}'
+
+
+'''
+Background job
+Deferred work (feedback, progress updates, rollups) is queued here by the viewsets
+and picked up by the `runjobs` management command.
+'''
+class Job(models.Model):
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    # Enqueuing twice with the same key returns the existing job instead of creating a new one
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls for queued jobs that are due
+            models.Index(fields=['status', 'run_after']),
+            # Old finished jobs are purged (api/jobs.py)
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+'''
+Answer attempt
+One row per question answered in a game session. Kept compact for item statistics and the review
+scheduler, session_id is a plain column so the rows survive the session being archived.
+'''
+class AnswerAttempt(models.Model):
+    session_id = models.BigIntegerField()
+    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    is_correct = models.BooleanField()
+    # As submitted, with option labels mapped back to the question's own (distractor counts)
+    answer = models.JSONField(null=True, blank=True)
+    answered_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'question']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['session_id', 'question'], name='unique_session_question_attempt'),
+        ]
+
+
+'''
+Review item
+A student's spaced repetition state for one question (Leitner boxes, see api/review.py).
+Updated incrementally on every answer, so the due questions of a student are one indexed range scan.
+'''
+class ReviewItem(models.Model):
+    student = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'student'})
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    box = models.PositiveSmallIntegerField(default=0)
+    due_at = models.DateTimeField()
+    lapses = models.PositiveIntegerField(default=0)  # times the question was answered wrong
+    last_answered_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'due_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'question'], name='unique_student_review_item'),
+        ]
+
+
+'''
+Question stats
+Item analysis of a question over its recorded answers (api/item_stats.py), recomputed by a job:
+- p_value: share of answers that are correct, low means hard
+- point_biserial: correlation between getting the question right and the score of the whole session,
+  close to 0 or negative means the question does not separate strong from weak students
+- choices: for multiple choice, how often each option was picked
+'''
+class QuestionStats(models.Model):
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.PositiveIntegerField(default=0)
+    p_value = models.FloatField(null=True, blank=True)
+    point_biserial = models.FloatField(null=True, blank=True)
+    choices = models.JSONField(default=dict, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+
+'''
+Game event
+Append-only log of gameplay (api/events.py). Events are never updated, old ones are folded into
+GameEventSnapshot by compaction. `stream` groups the events of one game session
+('session:<id>') or of one student's result for a quiz ('result:<student id>:<quiz id>').
+'''
+class GameEvent(models.Model):
+    KIND_CHOICES = (
+        ('session_started', 'Session Started'),
+        ('answer', 'Answer'),
+        ('session_updated', 'Session Updated'),
+        ('session_completed', 'Session Completed'),
+        ('session_abandoned', 'Session Abandoned'),
+        ('result_recorded', 'Result Recorded'),
+        ('result_override', 'Result Override'),
+    )
+
+    stream = models.CharField(max_length=64)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    student_id = models.BigIntegerField()
+    quiz_id = models.BigIntegerField()
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stream', 'id']),
+            models.Index(fields=['student_id', 'id']),
+        ]
+
+
+'''
+Game event snapshot
+State of a stream folded from all its events up to last_event_id.
+'''
+class GameEventSnapshot(models.Model):
+    stream = models.CharField(max_length=64, unique=True)
+    student_id = models.BigIntegerField(db_index=True)
+    quiz_id = models.BigIntegerField()
+    state = models.JSONField(default=dict)
+    last_event_id = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,200 @@
+'''
+Offline play: quiz bundles for the client and the sync of attempts played without a connection.
+
+The client downloads the bundle of a published quiz once, plays locally, and uploads each finished
+attempt in one request, where it is graded. Bundles hold no answer key, and carry a token signed by
+the server with the student, the version and the time the bundle was issued: an attempt can't have
+started before its bundle was downloaded. Attempts carry a client generated id, so uploading the same
+attempt again (e.g. after a timeout, or after it was archived) does not create a second game session.
+'''
+import json
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import events, packages, review, scheduling, timer
+from .jobs import enqueue
+from .models import GameSession, GameSessionHistory, QuizResult, QuizVersion
+
+BUNDLE_TOKEN_SALT = 'api.offline.bundle'
+
+
+def bundle_blob(quiz, user, now=None):
+    """
+    JSON bundle of the latest published version of a quiz for `user`, or None if it was never published.
+    Built by wrapping the cached package string without answer key, the package itself is not parsed again.
+    """
+    version_id = packages.latest_version_id(quiz.pk)
+    if version_id is None:
+        return None
+    issued_at = (now or timezone.now()).isoformat()
+    token = signing.dumps({'student': user.pk, 'quiz_version': version_id, 'issued_at': issued_at},
+                          salt=BUNDLE_TOKEN_SALT, compress=True)
+    return '{"quiz_version":%d,"issued_at":%s,"bundle_token":%s,"package":%s}' % (
+        version_id, json.dumps(issued_at), json.dumps(token), packages.get_student_package_blob(version_id))
+
+
+class AttemptError(Exception):
+    pass
+
+
+def _parse_time(value, field):
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise AttemptError(f"{field} must be an ISO 8601 timestamp.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    # Never trust a client clock that is ahead of ours
+    return min(parsed, timezone.now())
+
+
+def _resolve_version(student, attempt):
+    try:
+        version_id = int(attempt.get('quiz_version'))
+    except (TypeError, ValueError):
+        raise AttemptError("quiz_version is required.")
+    version = QuizVersion.objects.filter(pk=version_id).select_related('quiz').first()
+    if version is None:
+        raise AttemptError("Unknown quiz_version.")
+    return version
+
+
+def _bundle_issued_at(student, version, attempt):
+    """
+    When the bundle the attempt was played from was issued, read from its signed token.
+    """
+    try:
+        token = signing.loads(str(attempt.get('bundle_token') or ''), salt=BUNDLE_TOKEN_SALT,
+                              max_age=settings.OFFLINE_BUNDLE_MAX_AGE)
+    except signing.SignatureExpired:
+        raise AttemptError("The quiz bundle has expired, download it again.")
+    except signing.BadSignature:
+        raise AttemptError("bundle_token is missing or invalid.")
+    if token.get('student') != student.pk or token.get('quiz_version') != version.pk:
+        raise AttemptError("bundle_token was issued for another student or quiz version.")
+    return parse_datetime(token['issued_at'])
+
+
+def _record_result(student, session, completed_at):
+    """
+    Keep one QuizResult per student and quiz, like QuizResultViewSet.create, but only let an
+    attempt replace the stored result if it was completed later (attempts may arrive out of order).
+    """
+    result = QuizResult.objects.filter(student=student, quiz_id=session.quiz_id).first()
+    override = result is not None
+    if result is None:
+        result = QuizResult.objects.create(student=student, quiz_id=session.quiz_id,
+                                           score=session.score, completed_at=completed_at)
+    elif result.completed_at is None or result.completed_at < completed_at:
+        result.score = session.score
+        result.feedback = None
+        result.completed_at = completed_at
+        result.save()
+    else:
+        return
+    events.result_recorded(result, override=override)
+    enqueue('quiz_feedback', {'result_id': result.pk},
+            key=f'quiz_feedback:{result.pk}:{result.updated_at.timestamp()}')
+
+
+def sync_attempt(student, attempt):
+    """
+    Merge one offline attempt:
+    {"client_id", "quiz_version", "bundle_token", "started_at", "completed_at", "answers": {question id: answer}}
+    Returns (created, game session).
+    """
+    client_id = str(attempt.get('client_id') or '').strip()
+    if not client_id or len(client_id) > 64:
+        raise AttemptError("client_id is required (at most 64 characters).")
+
+    existing = GameSession.objects.filter(student=student, client_id=client_id).first() \
+        or GameSessionHistory.objects.filter(student=student, client_id=client_id).first()
+    if existing is not None:
+        return False, existing
+
+    version = _resolve_version(student, attempt)
+    answers = attempt.get('answers')
+    if not isinstance(answers, dict):
+        raise AttemptError("answers must be an object of question id to answer.")
+    started_at = _parse_time(attempt.get('started_at'), 'started_at')
+    completed_at = _parse_time(attempt.get('completed_at'), 'completed_at')
+    if completed_at < started_at:
+        raise AttemptError("completed_at is before started_at.")
+    # Client clocks are checked against what the server knows: when the bundle was issued and the quiz window
+    if started_at < _bundle_issued_at(student, version, attempt):
+        raise AttemptError("started_at is before the quiz bundle was downloaded.")
+    if version.quiz.closes_at is not None and completed_at > version.quiz.closes_at:
+        raise AttemptError("The attempt was completed after the quiz closed.")
+    timing = timer.start_fields(version.quiz, now=started_at)
+    if timing['deadline'] is not None and completed_at > timing['deadline']:
+        raise AttemptError("The attempt took longer than the quiz time limit.")
+
+    # Graded on the server against the version the client played
+    graded = packages.grade_answers(packages.get_answer_key(version.pk), answers)
+    score, correct_count = packages.totals(graded)
+
+    try:
+        with transaction.atomic():
+            # The quiz had to be open when the attempt was started offline, the attempt cap is
+            # counted in the transaction that adds the attempt
+            try:
+                scheduling.check_can_start(student, version.quiz, now=started_at)
+            except scheduling.QuizUnavailable as exc:
+                raise AttemptError(str(exc))
+            session = GameSession.objects.create(
+                student=student,
+                quiz_id=version.quiz_id,
+                quiz_version=version,
+                client_id=client_id,
+                status='completed',
+                score=score,
+                correct_answers_count=correct_count,
+                duration=completed_at - started_at,
+                **timing,
+            )
+            # date_played is auto_now_add, record when the attempt was actually played
+            GameSession.objects.filter(pk=session.pk).update(date_played=started_at)
+            session.date_played = started_at
+            events.session_started(session)
+            for question_id, correct, points in graded:
+                events.answered(session, question_id, correct, points)
+            events.session_changed(session, previous_status='in_progress')
+            review.record_answers(student, session.pk,
+                                  [(question_id, correct, answers.get(str(question_id), answers.get(question_id)))
+                                   for question_id, correct, _ in graded],
+                                  answered_at=completed_at)
+            _record_result(student, session, completed_at)
+    except IntegrityError:
+        # The same attempt was uploaded concurrently
+        return False, GameSession.objects.get(student=student, client_id=client_id)
+
+    enqueue('update_progress', {'session_id': session.pk}, key=f'update_progress:{session.pk}:completed')
+    return True, session
+
+
+def sync_attempts(student, attempts):
+    """
+    Merge a batch of attempts. Each attempt succeeds or fails on its own.
+    """
+    if not isinstance(attempts, list):
+        raise AttemptError("attempts must be a list.")
+    if len(attempts) > settings.OFFLINE_SYNC_MAX_ATTEMPTS:
+        raise AttemptError(f"At most {settings.OFFLINE_SYNC_MAX_ATTEMPTS} attempts can be synced at once.")
+
+    results = []
+    for attempt in attempts:
+        attempt = attempt if isinstance(attempt, dict) else {}
+        entry = {'client_id': attempt.get('client_id')}
+        try:
+            created, session = sync_attempt(student, attempt)
+        except AttemptError as exc:
+            entry.update(status='error', error=str(exc))
+        else:
+            entry.update(status='created' if created else 'duplicate', session=session.pk,
+                         score=session.score, correct_answers_count=session.correct_answers_count)
+        results.append(entry)
+    return results
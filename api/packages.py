@@ -0,0 +1,216 @@
+'''
+Compiled quiz packages.
+
+Publishing a quiz freezes it and its questions into a QuizVersion: a single compact JSON blob with
+everything a client needs to play it plus a precomputed answer key. Packages never change once
+written, so they are cached without expiry and sessions started on a version are always graded
+against the questions they were shown. Students are only ever sent the package without the answer
+key, the parsed answer key of a version is kept per process for grading.
+'''
+import hashlib
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from .models import Question, QuizVersion
+
+
+def _normalize_text(value):
+    return ' '.join(str(value).split()).lower()
+
+
+def compile_answer_key(question):
+    """
+    Precompute what grading needs for one question, so submitted answers are checked without
+    looking at the stored JSON again. correct_answer is stored canonical (api/question_types.py):
+    - multiple_choice: the correct option keys, already in order
+    - fill_in_the_blank: the accepted answer of every blank, whitespace and case normalised
+    - other types: the correct answer as stored, compared as is
+    """
+    correct = question.correct_answer
+    if question.question_type == 'multiple_choice' and isinstance(correct, dict):
+        return {'type': 'choice', 'accept': list(correct)}
+    if question.question_type == 'fill_in_the_blank':
+        blanks = correct if isinstance(correct, dict) else {'blank': correct}
+        return {'type': 'blanks', 'accept': {blank: [_normalize_text(value)] for blank, value in blanks.items()}}
+    return {'type': 'exact', 'accept': correct}
+
+
+def is_correct(key, answer):
+    """
+    Check a submitted answer against a compiled answer key entry.
+    Answers may be sent as the option key/text or in the same shape as correct_answer, a question
+    with a single blank also takes the answer on its own. Answers of any other shape are wrong.
+    """
+    if key['type'] == 'choice':
+        if isinstance(answer, (dict, list)):
+            chosen = sorted(str(label) for label in answer)
+        elif isinstance(answer, (str, int, float)):
+            chosen = [str(answer)]
+        else:
+            return False
+        return chosen == key['accept']
+    if key['type'] == 'blanks':
+        accept = key['accept']
+        if not isinstance(answer, dict):
+            if len(accept) != 1:
+                return False
+            answer = {next(iter(accept)): answer}
+        if set(answer) != set(accept):
+            return False
+        return all(_normalize_text(value) in accept[blank] for blank, value in answer.items())
+    if key['type'] == 'text':
+        # Packages published before answer keys were kept per blank, only the accepted values are known
+        values = list(answer.values()) if isinstance(answer, dict) else [answer]
+        return bool(values) and all(_normalize_text(value) in key['accept'] for value in values)
+    return answer == key['accept']
+
+
+def build_package(quiz):
+    """
+    Serialise a quiz and its questions into the package dict.
+    """
+    questions = list(quiz.question_set.order_by('id').prefetch_related('assets'))
+    return {
+        'quiz': {
+            'id': quiz.pk,
+            'title': quiz.title,
+            'description': quiz.description,
+            'class_year': quiz.class_year_id,
+        },
+        'questions': [
+            {
+                'id': question.pk,
+                'question_text': question.question_text,
+                'question_type': question.question_type,
+                'options': question.options,
+                'points': question.points,
+                'assets': [asset.sha256 for asset in question.assets.all()],
+            }
+            for question in questions
+        ],
+        'answer_key': {
+            str(question.pk): dict(compile_answer_key(question), points=question.points)
+            for question in questions
+        },
+        'total_points': sum(question.points for question in questions),
+    }
+
+
+def publish(quiz, user=None):
+    """
+    Freeze the current state of `quiz` into a new QuizVersion and return it.
+    """
+    package = build_package(quiz)
+    for _ in range(3):
+        try:
+            with transaction.atomic():
+                latest = quiz.versions.aggregate(latest=Max('version'))['latest'] or 0
+                package['version'] = latest + 1
+                blob = json.dumps(package, separators=(',', ':'))
+                return QuizVersion.objects.create(
+                    quiz=quiz,
+                    version=latest + 1,
+                    package=blob,
+                    checksum=hashlib.sha256(blob.encode()).hexdigest(),
+                    published_by=user,
+                )
+        except IntegrityError:
+            # Someone published the same quiz at the same time, take the next number
+            continue
+    raise IntegrityError("Could not allocate a version number for this quiz.")
+
+
+def latest_version_id(quiz_id):
+    """
+    Id of the newest published version of a quiz, or None.
+    """
+    return QuizVersion.objects.filter(quiz_id=quiz_id).order_by('-version').values_list('id', flat=True).first()
+
+
+def get_package_blob(version_id):
+    """
+    The package JSON string of a version. Versions are immutable so the cache entry never expires.
+    """
+    key = f'quiz_package:{version_id}'
+    blob = cache.get(key)
+    if blob is None:
+        blob = QuizVersion.objects.filter(pk=version_id).values_list('package', flat=True).first()
+        if blob is not None:
+            cache.set(key, blob, timeout=None)
+    return blob
+
+
+def get_package(version_id):
+    blob = get_package_blob(version_id)
+    return json.loads(blob) if blob is not None else None
+
+
+def get_student_package_blob(version_id):
+    """
+    The package JSON string of a version without its answer key, what students are sent.
+    """
+    key = f'quiz_package_student:{version_id}'
+    blob = cache.get(key)
+    if blob is None:
+        package = get_package(version_id)
+        if package is None:
+            return None
+        package.pop('answer_key', None)
+        blob = json.dumps(package, separators=(',', ':'))
+        cache.set(key, blob, timeout=None)
+    return blob
+
+
+@lru_cache(maxsize=settings.ANSWER_KEY_CACHE_SIZE)
+def get_answer_key(version_id):
+    """
+    The parsed answer key of a version, {question id: key entry}. Parsed once per process,
+    callers must not change it.
+    """
+    package = get_package(version_id)
+    return package['answer_key'] if package is not None else None
+
+
+def grade_answers(answer_key, answers):
+    """
+    Check {question id: answer} against the answer key of a package.
+    Returns a list of (question id, is_correct, points), unknown question ids are left out.
+    """
+    graded = []
+    for question_id, answer in answers.items():
+        key = answer_key.get(str(question_id))
+        if key is not None:
+            graded.append((int(question_id), is_correct(key, answer), key['points']))
+    return graded
+
+
+def totals(graded):
+    """
+    (score, correct answers count) of a grade_answers() result.
+    """
+    return sum(points for _, correct, points in graded if correct), sum(1 for _, correct, _ in graded if correct)
+
+
+def grade(answer_key, answers):
+    """
+    Grade {question id: answer} against the answer key of a package. Returns (score, correct answers count).
+    """
+    return totals(grade_answers(answer_key, answers))
+
+
+def session_answer_key(game_session, question_id):
+    """
+    Answer key entry for a question of a game session: from the session's quiz version when it has
+    one, otherwise compiled from the live question. None if the question is not part of the quiz.
+    """
+    if game_session.quiz_version_id:
+        return get_answer_key(game_session.quiz_version_id).get(str(question_id))
+    question = Question.objects.filter(pk=question_id, quiz_id=game_session.quiz_id).first()
+    if question is None:
+        return None
+    return dict(compile_answer_key(question), points=question.points)
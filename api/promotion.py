@@ -0,0 +1,72 @@
+'''
+Term end class promotion: moves every student of a class year to the next one.
+'''
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .cache import invalidate_class_years
+from .models import ClassYear, User
+
+
+def resolve_mapping(mapping, school):
+    """
+    Turn {'Year 1': 'Year 2', 'Year 6': None} (names or ids) into {source ClassYear: target ClassYear or None}
+    using the class years of `school`. A target of None removes the class year, e.g. for students leaving the school.
+    """
+    class_years = {}
+    for class_year in ClassYear.objects.filter(school=school):
+        class_years[class_year.name] = class_year
+        class_years[str(class_year.pk)] = class_year
+
+    resolved, unknown = {}, []
+    for source, target in mapping.items():
+        source_year = class_years.get(str(source))
+        target_year = class_years.get(str(target)) if target not in (None, '') else None
+        if source_year is None:
+            unknown.append(str(source))
+        if target not in (None, '') and target_year is None:
+            unknown.append(str(target))
+        resolved[source_year] = target_year
+    if unknown:
+        raise ValueError(f"Unknown class year(s): {', '.join(sorted(set(unknown)))}.")
+    return resolved
+
+
+def promote_students(mapping, school, dry_run=False):
+    """
+    Move students between class years according to `mapping` (see resolve_mapping).
+
+    All moves run as a single UPDATE with a CASE over the current class year, so chained moves
+    ('Year 1' -> 'Year 2' and 'Year 2' -> 'Year 3') see the class years from before the promotion.
+    Returns a report with the number of students per move. With dry_run nothing is changed.
+    """
+    resolved = resolve_mapping(mapping, school)
+    sources = [source.pk for source in resolved]
+
+    with transaction.atomic():
+        counts = dict(
+            User.objects.filter(role='student', class_year__in=sources)
+            .values_list('class_year').annotate(total=Count('id')).order_by()
+        )
+        report = [
+            {
+                'from': source.name,
+                'to': target.name if target else None,
+                'students': counts.get(source.pk, 0),
+            }
+            for source, target in resolved.items()
+        ]
+
+        if not dry_run and counts:
+            # .update() skips User.save()/clean(), which is fine because only students are touched
+            User.objects.filter(role='student', class_year__in=sources).update(
+                class_year=Case(
+                    *[When(class_year=source.pk, then=Value(target.pk if target else None))
+                      for source, target in resolved.items()],
+                    output_field=IntegerField(),
+                )
+            )
+            affected = set(sources) | {target.pk for target in resolved.values() if target}
+            transaction.on_commit(lambda: invalidate_class_years(school.pk, affected))
+
+    return {'dry_run': dry_run, 'moves': report, 'total': sum(counts.values())}
@@ -0,0 +1,145 @@
+'''
+Bulk question import.
+
+Rows are read one at a time from CSV or JSON Lines (a plain JSON array is read whole), checked against
+the schema of their question type (api/question_types.py) and the valid ones are written, in canonical form, with
+bulk_create in batches. Invalid rows are reported back with their row number and do not stop the import.
+'''
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.db import transaction
+
+from . import question_types
+from .models import Question, Quiz
+
+IMPORT_FORMATS = ('csv', 'json', 'jsonl')
+
+# CSV columns holding JSON text
+JSON_COLUMNS = ('options', 'correct_answer')
+
+
+def iter_rows(stream, file_format):
+    """
+    Yield the rows of a binary file as dicts. A row that can't be parsed is yielded as the ValueError.
+    CSV columns: quiz,question_text,question_type,options,correct_answer,points with options and
+    correct_answer as JSON.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if file_format == 'csv' else None)
+    try:
+        if file_format == 'csv':
+            for row in csv.DictReader(text):
+                yield _decode_csv_row(row)
+        elif file_format == 'jsonl':
+            for line in text:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as exc:
+                        yield ValueError(f"Invalid JSON: {exc}")
+        elif file_format == 'json':
+            rows = json.load(text)
+            if not isinstance(rows, list):
+                raise ValueError("JSON question file must be a list of objects.")
+            yield from rows
+        else:
+            raise ValueError(f"Unsupported question file format '{file_format}'.")
+    finally:
+        # Leave the underlying file open for the caller
+        text.detach()
+
+
+def _decode_csv_row(row):
+    # Only CSV cells hold JSON text, JSON rows already hold the values themselves
+    for column in JSON_COLUMNS:
+        value = row.get(column)
+        if value is None or not value.strip():
+            row[column] = None
+            continue
+        try:
+            row[column] = json.loads(value)
+        except ValueError as exc:
+            return ValueError(f"Invalid JSON in column '{column}': {exc}")
+    return row
+
+
+def clean_row(row, quizzes, default_quiz=None):
+    """
+    Validate one row. Returns (Question or None, {field: message}).
+    `quizzes` are the quizzes the rows may be added to, by id.
+    """
+    if isinstance(row, ValueError):
+        return None, {'row': str(row)}
+    if not isinstance(row, dict):
+        return None, {'row': "Must be an object."}
+
+    errors = {}
+    quiz = default_quiz
+    if row.get('quiz') not in (None, ''):
+        try:
+            quiz = quizzes.get(int(row['quiz']))
+        except (TypeError, ValueError):
+            quiz = None
+        if quiz is None:
+            errors['quiz'] = f"Unknown quiz '{row['quiz']}'."
+    elif quiz is None:
+        errors['quiz'] = "This field is required."
+
+    question_text = str(row.get('question_text') or '').strip()
+    if not question_text:
+        errors['question_text'] = "This field is required."
+
+    points = row.get('points')
+    try:
+        # Missing or empty defaults to 1, an explicit 0 stays 0
+        points = 1 if points in (None, '') else int(points)
+        if isinstance(row.get('points'), bool) or points < 0:
+            raise ValueError()
+    except (TypeError, ValueError):
+        errors['points'] = "Must be a whole number, 0 or more."
+
+    question_type = str(row.get('question_type') or '').strip()
+    options, correct_answer, type_errors = question_types.clean(
+        question_type, row.get('options'), row.get('correct_answer'))
+    errors.update(type_errors)
+
+    if errors:
+        return None, errors
+    return Question(
+        school_id=quiz.school_id,
+        quiz=quiz,
+        question_text=question_text,
+        question_type=question_type,
+        options=options,
+        correct_answer=correct_answer,
+        points=points,
+    ), {}
+
+
+def import_questions(rows, teacher, default_quiz=None, batch_size=None):
+    """
+    Validate and create questions of `teacher` from an iterable of rows, into the teacher's quizzes.
+    Returns {'created': number of questions created, 'errors': per row errors}.
+    """
+    batch_size = batch_size or settings.QUESTION_IMPORT_BATCH_SIZE
+    quizzes = {quiz.pk: quiz for quiz in Quiz.objects.filter(teacher=teacher)}
+    created, errors, batch = 0, [], []
+
+    with transaction.atomic():
+        for number, row in enumerate(rows, start=1):
+            question, row_errors = clean_row(row, quizzes, default_quiz)
+            if row_errors:
+                errors.append({'row': number, 'errors': row_errors})
+                continue
+            question.teacher = teacher
+            batch.append(question)
+            if len(batch) >= batch_size:
+                Question.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        if batch:
+            Question.objects.bulk_create(batch)
+            created += len(batch)
+    return {'created': created, 'errors': errors}
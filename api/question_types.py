@@ -0,0 +1,183 @@
+'''
+Shape of `options` and `correct_answer` for each question type.
+
+Each type is described by a schema, compiled once at import into a single validator that checks both
+fields and returns them in their canonical form. Questions are stored canonical, so grading and
+rendering can use the JSON as it is.
+
+- multiple_choice: options {label: text} with at least two entries, correct_answer {label: text}
+  of one or more of those options (a label or a list of labels is accepted on write)
+- fill_in_the_blank: correct_answer {blank: accepted answer} (a single answer is stored as
+  {"blank": answer}), options is null or repeats the blanks
+- drag_and_drop: options is the list of items, correct_answer the same items in the right order
+- matching_pairs: options {"left": [...], "right": [...]}, correct_answer {left item: right item}
+  for every left item
+
+Canonical form: texts have their whitespace collapsed, numbers become text, objects are ordered by key
+(matching pairs by the order of the left items).
+'''
+
+QUESTION_TYPES = ('multiple_choice', 'fill_in_the_blank', 'drag_and_drop', 'matching_pairs')
+
+
+class Invalid(ValueError):
+    """
+    Raised by schema nodes, args are (field, message) when raised by a cross field check.
+    """
+
+
+def text(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise Invalid()
+    value = ' '.join(str(value).split())
+    if not value:
+        raise Invalid()
+    return value
+
+
+def text_list(minimum):
+    def node(value):
+        if not isinstance(value, list) or len(value) < minimum:
+            raise Invalid()
+        items = [text(item) for item in value]
+        if len(set(items)) != len(items):
+            raise Invalid()
+        return items
+    return node
+
+
+def text_map(minimum):
+    def node(value):
+        if not isinstance(value, dict) or len(value) < minimum:
+            raise Invalid()
+        items = {text(key): text(item) for key, item in value.items()}
+        if len(items) != len(value):
+            raise Invalid()
+        return dict(sorted(items.items()))
+    return node
+
+
+def record(**fields):
+    def node(value):
+        if not isinstance(value, dict) or set(value) != set(fields):
+            raise Invalid()
+        return {name: fields[name](value[name]) for name in fields}
+    return node
+
+
+def nullable(inner):
+    def node(value):
+        return None if value is None else inner(value)
+    return node
+
+
+def _choice_labels(value):
+    # {label: text}, or only the labels with the texts filled in from options by the check
+    if isinstance(value, dict):
+        labels = {text(label): text(item) for label, item in value.items()}
+    else:
+        labels = {text(label): None for label in (value if isinstance(value, list) else [value])}
+    if not labels:
+        raise Invalid()
+    return labels
+
+
+def _check_choices(options, correct_answer):
+    for label, item in correct_answer.items():
+        if label not in options or item not in (None, options[label]):
+            raise Invalid('correct_answer', "Every correct answer must be one of the options.")
+    return options, {label: options[label] for label in sorted(correct_answer)}
+
+
+_blank_map = text_map(1)
+
+
+def _blanks(value):
+    return _blank_map(value if isinstance(value, dict) else {'blank': value})
+
+
+def _check_blanks(options, correct_answer):
+    if options is not None and set(options) != set(correct_answer):
+        raise Invalid('options', "Must be null or an object with the same blanks as correct_answer.")
+    return options, correct_answer
+
+
+def _check_order(options, correct_answer):
+    if sorted(correct_answer) != sorted(options):
+        raise Invalid('correct_answer', "Must contain every item of options exactly once.")
+    return options, correct_answer
+
+
+def _check_pairs(options, correct_answer):
+    if set(correct_answer) != set(options['left']) \
+            or not all(right in options['right'] for right in correct_answer.values()):
+        raise Invalid('correct_answer', "Must pair every left item with one of the right items.")
+    return options, {left: correct_answer[left] for left in options['left']}
+
+
+SCHEMAS = {
+    'multiple_choice': {
+        'options': (text_map(2), "Must be an object of at least two option labels to option texts."),
+        'correct_answer': (_choice_labels, "Must be an object of the correct option labels to their texts."),
+        'check': _check_choices,
+    },
+    'fill_in_the_blank': {
+        'options': (nullable(text_map(1)), "Must be null or an object with the same blanks as correct_answer."),
+        'correct_answer': (_blanks, "Must be an object of blank names to accepted answers."),
+        'check': _check_blanks,
+    },
+    'drag_and_drop': {
+        'options': (text_list(2), "Must be a list of at least two distinct items."),
+        'correct_answer': (text_list(2), "Must be the list of items in the correct order."),
+        'check': _check_order,
+    },
+    'matching_pairs': {
+        'options': (record(left=text_list(2), right=text_list(2)),
+                    'Must be {"left": [...], "right": [...]} with at least two distinct items each.'),
+        'correct_answer': (text_map(2), "Must be an object of left items to right items."),
+        'check': _check_pairs,
+    },
+}
+
+
+def compile_schema(schema):
+    """
+    Turn a schema into validator(options, correct_answer) -> (options, correct_answer, errors).
+    The cross field check only runs once both fields have the right shape.
+    """
+    options_node, options_message = schema['options']
+    answer_node, answer_message = schema['correct_answer']
+    check = schema['check']
+
+    def validator(options, correct_answer):
+        errors = {}
+        try:
+            options = options_node(options)
+        except Invalid:
+            errors['options'] = options_message
+        try:
+            correct_answer = answer_node(correct_answer)
+        except Invalid:
+            errors['correct_answer'] = answer_message
+        if not errors:
+            try:
+                options, correct_answer = check(options, correct_answer)
+            except Invalid as exc:
+                field, message = exc.args
+                errors[field] = message
+        return options, correct_answer, errors
+    return validator
+
+
+VALIDATORS = {question_type: compile_schema(schema) for question_type, schema in SCHEMAS.items()}
+
+
+def clean(question_type, options, correct_answer):
+    """
+    Check options and correct_answer against the question type.
+    Returns (options, correct_answer, errors): the canonical values and {field: message}, empty when valid.
+    """
+    validator = VALIDATORS.get(question_type)
+    if validator is None:
+        return options, correct_answer, {'question_type': f"Must be one of {', '.join(QUESTION_TYPES)}."}
+    return validator(options, correct_answer)
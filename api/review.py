@@ -0,0 +1,89 @@
+'''
+Spaced repetition review scheduler.
+
+Every answered question moves through Leitner boxes: a correct answer moves it up one box and
+schedules it after that box's interval (REVIEW_INTERVALS_DAYS), a wrong answer puts it back in
+box 0, due straight away. The ReviewItem rows are the precomputed queue, so building a practice
+quiz only reads the student's due items through the (student, due_at) index.
+'''
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import AnswerAttempt, Question, ReviewItem
+from .tenancy import scope
+
+
+def schedule(item, is_correct, answered_at):
+    """
+    Apply one answer to a review item.
+    """
+    intervals = settings.REVIEW_INTERVALS_DAYS
+    if is_correct:
+        item.box = min(item.box + 1, len(intervals) - 1)
+    else:
+        item.box = 0
+        item.lapses += 1
+    item.due_at = answered_at + timedelta(days=intervals[item.box])
+    item.last_answered_at = answered_at
+
+
+def record_answers(student, session_id, graded, answered_at=None):
+    """
+    Store the answers of a session and update the student's review queue.
+    `graded` is a list of (question id, is_correct, answer). Answers already recorded for the session are ignored:
+    every answer is its own insert guarded by the (session, question) unique constraint, so of two
+    requests sending the same answer at the same time only one records it. Questions deleted since the
+    quiz was published are still in its package but are not recorded, there is no row left to refer to.
+    Returns the number of answers recorded, only those count towards the review queue.
+    """
+    answered_at = answered_at or timezone.now()
+    recorded = []
+
+    with transaction.atomic():
+        # Foreign keys are only checked at commit, a deleted question would fail the whole request there
+        live = set(Question.objects.filter(pk__in=[int(q) for q, _, _ in graded]).values_list('pk', flat=True))
+        for question_id, is_correct, answer in graded:
+            if int(question_id) not in live:
+                continue
+            try:
+                # A savepoint per answer, a duplicate only rolls back its own insert
+                with transaction.atomic():
+                    AnswerAttempt.objects.create(session_id=session_id, student=student, question_id=int(question_id),
+                                                 is_correct=is_correct, answer=answer, answered_at=answered_at)
+            except IntegrityError:
+                continue
+            recorded.append((int(question_id), is_correct))
+        if not recorded:
+            return 0
+
+        items = {item.question_id: item for item in
+                 ReviewItem.objects.select_for_update().filter(student=student, question_id__in=[q for q, _ in recorded])}
+        existing = list(items.values())
+        new_items = []
+        for question_id, is_correct in recorded:
+            item = items.get(question_id)
+            if item is None:
+                item = items[question_id] = ReviewItem(student=student, question_id=question_id)
+                new_items.append(item)
+            schedule(item, is_correct, answered_at)
+
+        ReviewItem.objects.bulk_create(new_items)
+        ReviewItem.objects.bulk_update(existing, ['box', 'due_at', 'lapses', 'last_answered_at'])
+    return len(recorded)
+
+
+def due_questions(student, limit=None, now=None):
+    """
+    The student's questions that are due for review, most overdue first. ReviewItem has no school
+    column, it is scoped through the student and only questions of the student's school are returned.
+    """
+    limit = limit or settings.REVIEW_QUIZ_SIZE
+    question_ids = list(
+        ReviewItem.objects.filter(student=student, due_at__lte=now or timezone.now())
+        .order_by('due_at').values_list('question_id', flat=True)[:limit]
+    )
+    by_id = scope(Question.objects.all(), student).in_bulk(question_ids)
+    return [by_id[question_id] for question_id in question_ids if question_id in by_id]
@@ -0,0 +1,158 @@
+'''
+Bulk student roster import.
+
+Rows come from CSV or JSON and are validated together (one query for existing usernames, one for
+class years), passwords are hashed in a process pool and the valid users are written with
+bulk_create. Invalid rows are reported back with their row number and do not stop the import.
+'''
+import csv
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .hashers import hasher_for_role
+from .models import ClassYear, User
+
+ROSTER_FIELDS = ('username', 'password', 'role', 'email', 'first_name', 'last_name', 'class_year')
+ROLES = {role for role, _ in User.ROLE_CHOICES}
+# Fields whose model validators (username characters, max_length, email format) run on every row
+VALIDATED_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+def parse_roster(content, file_format):
+    """
+    Turn CSV text or a JSON list of objects into a list of row dicts.
+    """
+    if file_format == 'csv':
+        return list(csv.DictReader(io.StringIO(content)))
+    if file_format == 'json':
+        rows = json.loads(content) if isinstance(content, str) else content
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError("JSON roster must be a list of objects.")
+        return rows
+    raise ValueError(f"Unsupported roster format '{file_format}'.")
+
+
+def _clean(value):
+    return str(value).strip() if value is not None else ''
+
+
+def validate_rows(rows, school):
+    """
+    Validate every row against the class years of `school` and return (valid, errors).
+    valid is a list of (row number, cleaned row), errors a list of {'row', 'username', 'errors'}.
+    """
+    usernames = [_clean(row.get('username')) for row in rows]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    class_years = {}
+    for class_year in ClassYear.objects.filter(school=school):
+        class_years[class_year.name] = class_year
+        class_years[str(class_year.pk)] = class_year
+
+    valid, errors, seen = [], [], set()
+    for number, row in enumerate(rows, start=1):
+        data = {field: _clean(row.get(field)) for field in ROSTER_FIELDS}
+        data['role'] = data['role'] or 'student'
+        row_errors = {}
+
+        if not data['username']:
+            row_errors['username'] = "This field is required."
+        elif data['username'] in existing:
+            row_errors['username'] = "A user with that username already exists."
+        elif data['username'] in seen:
+            row_errors['username'] = "Duplicate username in this roster."
+
+        for field in VALIDATED_FIELDS:
+            if data[field] and field not in row_errors:
+                try:
+                    User._meta.get_field(field).run_validators(data[field])
+                except ValidationError as exc:
+                    row_errors[field] = ' '.join(exc.messages)
+
+        if data['role'] not in ROLES:
+            row_errors['role'] = f"'{data['role']}' is not a valid role."
+
+        # Same rule as User.clean(), bulk_create does not call it
+        if data['class_year']:
+            if data['role'] != 'student':
+                row_errors['class_year'] = "Only students can have a class year."
+            elif data['class_year'] not in class_years:
+                row_errors['class_year'] = f"Unknown class year '{data['class_year']}'."
+            else:
+                data['class_year'] = class_years[data['class_year']]
+
+        if row_errors:
+            errors.append({'row': number, 'username': data['username'], 'errors': row_errors})
+        else:
+            seen.add(data['username'])
+            valid.append((number, data))
+    return valid, errors
+
+
+def _init_worker():
+    # Workers started with the spawn method need Django configured before hashing
+    django.setup()
+
+
+def _hash(item):
+    password, hasher = item
+    # An empty password gives an unusable password, the admin can set one later
+    return make_password(password or None, hasher=hasher)
+
+
+def hash_passwords(items):
+    """
+    Hash (password, hasher) pairs, in a process pool when there are enough of them to pay for it.
+    """
+    if len(items) < settings.ROSTER_POOL_MIN_ROWS or settings.ROSTER_HASH_WORKERS <= 1:
+        return [_hash(item) for item in items]
+    with ProcessPoolExecutor(max_workers=settings.ROSTER_HASH_WORKERS, initializer=_init_worker) as pool:
+        return list(pool.map(_hash, items, chunksize=32))
+
+
+def import_roster(rows, school, batch_size=500):
+    """
+    Validate and create users of `school` from roster rows.
+    Returns {'created': number of users created, 'errors': per row errors}.
+    """
+    valid, errors = validate_rows(rows, school)
+    encoded = hash_passwords([(data['password'], hasher_for_role(data['role'])) for _, data in valid])
+
+    users = [
+        User(
+            username=data['username'],
+            password=password,
+            role=data['role'],
+            school=school,
+            email=data['email'],
+            first_name=data['first_name'],
+            last_name=data['last_name'],
+            class_year=data['class_year'] or None,
+        )
+        for (_, data), password in zip(valid, encoded)
+    ]
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=batch_size)
+        created = len(users)
+    except IntegrityError:
+        # A username was taken after validation, by another import or signup: find the rows one by one
+        created = 0
+        for (number, data), user in zip(valid, users):
+            user.pk, user._state.adding = None, True
+            try:
+                with transaction.atomic():
+                    User.objects.bulk_create([user])
+            except IntegrityError:
+                errors.append({'row': number, 'username': data['username'],
+                               'errors': {'username': "A user with that username already exists."}})
+            else:
+                created += 1
+        errors.sort(key=lambda error: error['row'])
+    return {'created': created, 'errors': errors}
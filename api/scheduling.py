@@ -0,0 +1,82 @@
+'''
+Quiz availability windows and attempt caps.
+
+A quiz can be given an opens_at/closes_at window and a maximum number of attempts per student.
+The list of quizzes currently open for a class year is cached until the next time a window in that
+class year opens or closes, so it is refreshed exactly when its content changes.
+'''
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from .cache import class_year_key
+from .models import GameSession, GameSessionHistory, Quiz, User
+
+
+class QuizUnavailable(Exception):
+    pass
+
+
+def open_at(now):
+    """
+    Filter for quizzes whose window contains `now`.
+    """
+    return (Q(opens_at__isnull=True) | Q(opens_at__lte=now)) & (Q(closes_at__isnull=True) | Q(closes_at__gt=now))
+
+
+def check_can_start(student, quiz, now=None):
+    """
+    Raise QuizUnavailable if `student` can't start an attempt of `quiz` at `now`.
+    The window is checked on the quiz already loaded, the attempt cap by counting the attempts in
+    GameSession and GameSessionHistory on their (student, quiz) rows. Call it inside the transaction
+    that creates the attempt: the student row is locked first, so two attempts started at once are
+    counted one after the other.
+    """
+    now = now or timezone.now()
+    # A student without a class year can't start any quiz, not even one without a class year
+    if student.class_year_id is None or quiz.class_year_id != student.class_year_id:
+        raise QuizUnavailable("This quiz is not available for your class year.")
+    if quiz.opens_at is not None and now < quiz.opens_at:
+        raise QuizUnavailable("This quiz is not open yet.")
+    if quiz.closes_at is not None and now >= quiz.closes_at:
+        raise QuizUnavailable("This quiz is closed.")
+    if quiz.max_attempts is not None:
+        User.objects.select_for_update().filter(pk=student.pk).exists()
+        attempts = GameSession.objects.filter(student=student, quiz=quiz).count() \
+            + GameSessionHistory.objects.filter(student=student, quiz=quiz).count()
+        if attempts >= quiz.max_attempts:
+            raise QuizUnavailable(f"You have used all {quiz.max_attempts} attempt(s) of this quiz.")
+
+
+def _next_boundary(class_year_id, now):
+    """
+    The next time a quiz of the class year opens or closes, None if no window changes any more.
+    """
+    boundaries = Quiz.objects.filter(class_year_id=class_year_id).aggregate(
+        next_open=Min('opens_at', filter=Q(opens_at__gt=now)),
+        next_close=Min('closes_at', filter=Q(closes_at__gt=now)),
+    )
+    upcoming = [value for value in boundaries.values() if value is not None]
+    return min(upcoming) if upcoming else None
+
+
+def available_quizzes(school_id, class_year_id, serialize, now=None):
+    """
+    Serialised quizzes open right now for a class year of a school, served from the cache.
+    `serialize` turns the queryset into the cached payload. The entry expires at the next window
+    boundary (or after AVAILABLE_QUIZZES_CACHE_SECONDS) and is dropped when a quiz of the class year changes.
+    """
+    now = now or timezone.now()
+    key = class_year_key(school_id, class_year_id, 'available_quizzes')
+    payload = cache.get(key)
+    if payload is None:
+        quizzes = Quiz.objects.filter(open_at(now), school_id=school_id, class_year_id=class_year_id) \
+            .select_related('teacher').order_by(F('closes_at').asc(nulls_last=True), 'id')
+        payload = serialize(quizzes)
+        timeout = settings.AVAILABLE_QUIZZES_CACHE_SECONDS
+        boundary = _next_boundary(class_year_id, now)
+        if boundary is not None:
+            timeout = max(1, min(timeout, int((boundary - now).total_seconds()) + 1))
+        cache.set(key, payload, timeout)
+    return payload
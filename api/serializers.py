@@ -3,10 +3,29 @@ This file contains serialisers code which converts Django models to JSON format
 and vice-versa.
 '''
 from rest_framework import serializers
-from .models import User, Quiz, Question, GameSession, QuizResult, ProgressTracking
+from rest_framework.reverse import reverse
+from .models import (
+    User, Quiz, Question, GameSession, QuizResult, ProgressTracking,
+    GameSessionHistory, QuizResultHistory, QuestionAsset, QuestionStats, ClassYear
+)
+from . import question_types
+from .tenancy import scope
+
+
+class SchoolRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that only accepts rows of the requesting user's school.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        return scope(queryset, request.user) if request is not None else queryset
+
 
 # User Serializer
 class UserSerializer(serializers.ModelSerializer):
+    class_year = SchoolRelatedField(queryset=ClassYear.objects.all(), required=False, allow_null=True)
+
     class Meta:
         model = User
         fields = ['id', 'username', 'role', 'email', 'first_name', 'last_name', 'class_year']
@@ -14,19 +33,41 @@ class UserSerializer(serializers.ModelSerializer):
 # Quiz Serializer
 class QuizSerializer(serializers.ModelSerializer):
     teacher = serializers.StringRelatedField()  # Display the teacher username
+    class_year = SchoolRelatedField(queryset=ClassYear.objects.all(), required=False, allow_null=True)
 
     class Meta:
         model = Quiz
-        fields = ['id', 'title', 'description', 'class_year', 'teacher', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'description', 'class_year', 'teacher', 'opens_at', 'closes_at',
+                  'time_limit', 'max_attempts', 'created_at', 'updated_at']
+
+    def validate(self, data):
+        opens_at = data.get('opens_at', getattr(self.instance, 'opens_at', None))
+        closes_at = data.get('closes_at', getattr(self.instance, 'closes_at', None))
+        if opens_at and closes_at and closes_at <= opens_at:
+            raise serializers.ValidationError({'closes_at': "closes_at must be after opens_at."})
+        return data
 
 # Question Serializer
 class QuestionSerializer(serializers.ModelSerializer):
     # setting quiz by ID so that it can be passed during question creation.
-    quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())  
+    quiz = SchoolRelatedField(queryset=Quiz.objects.all())
     class Meta:
         model = Question
         fields = ['id', 'quiz', 'question_text', 'question_type', 'options', 'correct_answer', 'points', 'created_at', 'updated_at']
 
+    def validate(self, attrs):
+        """
+        Check options and correct_answer against the question type and store them in canonical form.
+        On partial updates the missing values are taken from the question.
+        """
+        values = [attrs.get(field, getattr(self.instance, field, None))
+                  for field in ('question_type', 'options', 'correct_answer')]
+        options, correct_answer, errors = question_types.clean(*values)
+        if errors:
+            raise serializers.ValidationError(errors)
+        attrs['options'], attrs['correct_answer'] = options, correct_answer
+        return attrs
+
     # def to_representation(self, instance):
     #     """
     #     Custom representation to hide the 'correct_answer' field for students.
@@ -36,19 +77,60 @@ class QuestionSerializer(serializers.ModelSerializer):
         
     #     return representation
 
+# Question Stats Serializer
+class QuestionStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuestionStats
+        fields = ['question', 'attempts', 'p_value', 'point_biserial', 'choices', 'computed_at']
+        read_only_fields = fields
+
+# Question Asset Serializer
+class QuestionAssetSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = QuestionAsset
+        fields = ['id', 'question', 'sha256', 'content_type', 'size', 'original_name', 'url', 'thumbnail_url', 'created_at']
+        read_only_fields = fields
+
+    def get_url(self, obj):
+        return reverse('asset-file', args=[obj.sha256], request=self.context.get('request'))
+
+    def get_thumbnail_url(self, obj):
+        if not obj.has_thumbnail:
+            return None
+        return self.get_url(obj) + '?thumbnail=1'
+
 # Game Session Serializer
 class GameSessionSerializer(serializers.ModelSerializer):
     student = serializers.StringRelatedField()  # Display the user's username
+    quiz = SchoolRelatedField(queryset=Quiz.objects.all())
 
     class Meta:
         model = GameSession
-        fields = ['id', 'student', 'quiz', 'duration', 'status', 'score', 'correct_answers_count', 'date_played', 'last_updated']
+        fields = ['id', 'student', 'quiz', 'quiz_version', 'duration', 'status', 'score', 'correct_answers_count',
+                  'date_played', 'last_updated', 'started_at', 'deadline']
+        # Timing is kept by the server (api/timer.py)
+        read_only_fields = ['quiz_version', 'duration', 'started_at', 'deadline']
+
+
+# Archived Game Session Serializer (read only)
+class GameSessionHistorySerializer(serializers.ModelSerializer):
+    student = serializers.StringRelatedField()
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    class Meta:
+        model = GameSessionHistory
+        fields = ['id', 'student', 'quiz', 'quiz_version', 'duration', 'status', 'score', 'correct_answers_count',
+                  'date_played', 'last_updated', 'started_at', 'deadline', 'archived']
+        read_only_fields = fields
 
 
 # Quiz Result Serializer
 class QuizResultSerializer(serializers.ModelSerializer):
-    student = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())  
-    quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())  
+    student = SchoolRelatedField(queryset=User.objects.all())
+    quiz = SchoolRelatedField(queryset=Quiz.objects.all())
 
     class Meta:
         model = QuizResult
@@ -58,6 +140,16 @@ class QuizResultSerializer(serializers.ModelSerializer):
             'quiz': {'required': True},
         }
 
+
+# Archived Quiz Result Serializer (read only)
+class QuizResultHistorySerializer(serializers.ModelSerializer):
+    archived = serializers.BooleanField(default=True, read_only=True)
+
+    class Meta:
+        model = QuizResultHistory
+        fields = QuizResultSerializer.Meta.fields + ['archived']
+        read_only_fields = fields
+
 # Progress Tracking Serializer
 class ProgressTrackingSerializer(serializers.ModelSerializer):
     student = serializers.StringRelatedField()  # Display the student's username
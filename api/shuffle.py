@@ -0,0 +1,102 @@
+'''
+Per session question and option order.
+
+Every game session has a random seed. The order a student sees is derived from the seed and the
+published package, so it is never stored and can be rebuilt at any time. Multiple choice options are
+relabelled in their shuffled order, the layout keeps {shown label: original label} per question so
+answers are mapped back to the canonical correct_answer with a dict lookup. Drag and drop items and
+both columns of matching pairs are shown shuffled too, answers give the items themselves or their
+index as shown.
+'''
+import random
+from functools import lru_cache
+
+from django.conf import settings
+
+from . import packages
+
+
+@lru_cache(maxsize=settings.SHUFFLE_LAYOUT_CACHE_SIZE)
+def session_layout(version_id, seed):
+    """
+    The shuffled questions of a package version for one seed, without the answer key:
+    {'questions': [...], 'labels': {question id: {shown label: original label}},
+     'items': {question id: shown items, or {'left': [...], 'right': [...]} for matching pairs}}.
+    Packages never change, so layouts are cached per process.
+    """
+    package = packages.get_package(version_id)
+    rng = random.Random(seed)
+    questions = list(package['questions'])
+    rng.shuffle(questions)
+
+    shown, labels, items = [], {}, {}
+    for question in questions:
+        options = question['options']
+        if question['question_type'] == 'multiple_choice' and isinstance(options, dict):
+            original = list(options)
+            rng.shuffle(original)
+            # Shown labels are the original ones in their usual order, pointing at shuffled options
+            mapping = dict(zip(sorted(options), original))
+            question = dict(question, options={label: options[key] for label, key in mapping.items()})
+            labels[question['id']] = mapping
+        elif question['question_type'] == 'drag_and_drop' and isinstance(options, list):
+            # Stored in the correct order, shown in any other
+            order = list(options)
+            rng.shuffle(order)
+            question = dict(question, options=order)
+            items[question['id']] = order
+        elif question['question_type'] == 'matching_pairs' and isinstance(options, dict):
+            left, right = list(options['left']), list(options['right'])
+            rng.shuffle(left)
+            rng.shuffle(right)
+            question = dict(question, options={'left': left, 'right': right})
+            items[question['id']] = question['options']
+        shown.append(question)
+    return {'quiz': package['quiz'], 'questions': shown, 'labels': labels, 'items': items}
+
+
+def _item(shown, value):
+    # An item is given as itself or as its index in the shown order (a string for JSON object keys)
+    if isinstance(value, bool) or value in shown:
+        return value
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, int) and 0 <= value < len(shown):
+        return shown[value]
+    return value
+
+
+def canonical_answer(layout, question_id, answer):
+    """
+    Map an answer given against the shuffled options back to the original option labels.
+    Accepts a shown label, the index of the option as shown, or a list/dict of labels. Drag and
+    drop answers are a list of items, matching pairs answers an object of left item to right item,
+    items given by their index as shown are replaced by the item.
+    """
+    shown = layout['items'].get(question_id)
+    if isinstance(shown, list) and isinstance(answer, list):
+        return [_item(shown, item) for item in answer]
+    if isinstance(shown, dict) and isinstance(answer, dict):
+        return {_item(shown['left'], left): _item(shown['right'], right) for left, right in answer.items()}
+    mapping = layout['labels'].get(question_id)
+    if mapping is None:
+        return answer
+    if isinstance(answer, bool):
+        return answer
+    if isinstance(answer, int):
+        shown = list(mapping)
+        return mapping[shown[answer]] if 0 <= answer < len(shown) else answer
+    if isinstance(answer, dict):
+        return {mapping.get(label, label): value for label, value in answer.items()}
+    if isinstance(answer, list):
+        return [mapping.get(str(label), label) for label in answer]
+    return mapping.get(str(answer), answer)
+
+
+def session_layout_for(game_session):
+    """
+    Layout of a game session, None when it is not played against a published version.
+    """
+    if not game_session.quiz_version_id:
+        return None
+    return session_layout(game_session.quiz_version_id, game_session.seed)
@@ -0,0 +1,62 @@
+'''
+Deferred work run by the job queue (see api/jobs.py).
+Every handler looks its rows up again and is safe to run more than once.
+'''
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import item_stats
+from .jobs import enqueue, register
+from .models import GameSession, QuizResult, ProgressTracking
+
+# Same threshold the seed data uses for its feedback
+FEEDBACK_PASS_SCORE = 30
+
+
+@register('update_progress')
+def update_progress(session_id):
+    """
+    Bring the student's ProgressTracking row for the quiz in line with a game session.
+    """
+    session = GameSession.objects.filter(pk=session_id).first()
+    if session is None:
+        return
+
+    progress = ProgressTracking.objects.filter(student_id=session.student_id, quiz_id=session.quiz_id).first()
+    if progress is None:
+        progress = ProgressTracking(school_id=session.school_id, student_id=session.student_id, quiz_id=session.quiz_id)
+
+    if session.status == 'completed':
+        progress.status = 'completed'
+        # Keep the best score across attempts
+        progress.score = max(progress.score or 0, session.score)
+        progress.completed_at = progress.completed_at or session.last_updated
+    progress.save()
+
+    if session.status == 'completed':
+        # One recompute per quiz and interval, however many sessions complete in it
+        interval = timedelta(minutes=settings.ITEM_STATS_INTERVAL_MINUTES)
+        window = int(timezone.now().timestamp() // interval.total_seconds())
+        enqueue('item_stats', {'quiz_id': session.quiz_id}, key=f'item_stats:{session.quiz_id}:{window}', delay=interval)
+
+
+@register('quiz_feedback')
+def quiz_feedback(result_id):
+    """
+    Fill in feedback for a quiz result that was submitted without any.
+    """
+    result = QuizResult.objects.filter(pk=result_id).first()
+    if result is None or result.feedback:
+        return
+    result.feedback = "Good job!" if result.score >= FEEDBACK_PASS_SCORE else "Needs improvement"
+    result.save(update_fields=['feedback', 'updated_at'])
+
+
+@register('item_stats')
+def refresh_item_stats(quiz_id=None):
+    """
+    Recompute the item statistics of a quiz's questions (of every answered question without quiz_id).
+    """
+    item_stats.refresh(quiz_id=quiz_id)
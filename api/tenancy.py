@@ -0,0 +1,47 @@
+'''
+Multi school hosting.
+
+Every user, class year, quiz and gameplay row belongs to a School, and the viewsets only return rows
+of the requesting user's school. Only superusers (platform staff created with createsuperuser) can
+be without a school and are not scoped, any other user without one sees nothing. Querysets are
+filtered on the school column first so they use the school leading indexes and never touch another
+school's rows.
+
+Rows that only exist under a scoped parent have no school column of their own and are reached
+through it: answer attempts and review items through the student, assets and item statistics
+through the question, quiz versions through the quiz. Game events and jobs are internal and are
+never served as they are.
+'''
+from .models import School
+
+
+def school_id_of(user):
+    return getattr(user, 'school_id', None)
+
+
+def scope(queryset, user, field='school'):
+    """
+    Restrict `queryset` to the school of `user`. `field` is the path to the school,
+    e.g. 'student__school' for tables without their own school column.
+    """
+    school_id = school_id_of(user)
+    if school_id is None:
+        return queryset if getattr(user, 'is_superuser', False) else queryset.none()
+    return queryset.filter(**{f'{field}_id': school_id})
+
+
+def resolve_school(value):
+    """
+    School by slug or id, for management commands. Without a value the only school is used.
+    Raises ValueError when it can't be determined.
+    """
+    if value:
+        lookup = {'pk': value} if str(value).isdigit() else {'slug': value}
+        school = School.objects.filter(**lookup).first()
+        if school is None:
+            raise ValueError(f"Unknown school '{value}'.")
+        return school
+    schools = list(School.objects.all()[:2])
+    if len(schools) != 1:
+        raise ValueError("There is more than one school, pass --school.")
+    return schools[0]
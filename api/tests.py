@@ -1,3 +1,800 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.sites import site
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import (archive, assets, events, jobs, metrics, question_types, offline, packages, question_import, review, roster,
+               scheduling, shuffle)
+from .cache import class_year_key, invalidate_class_years
+from .logs import JsonFormatter, QueuedStreamHandler
+from .models import AnswerAttempt, GameEvent, GameSession, GameSessionHistory, Job, Question, QuestionAsset, Quiz, QuizResultHistory, ReviewItem, School, User
+from .tenancy import scope
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def publish(quiz_id):
+    """
+    Publish a quiz as its teacher. Version ids come back after a test rolls back, so the caches kept
+    per version are emptied first.
+    """
+    cache.clear()
+    packages.get_answer_key.cache_clear()
+    shuffle.session_layout.cache_clear()
+    response = client_for(Quiz.objects.get(pk=quiz_id).teacher).post(f'/api/quizzes/{quiz_id}/publish/')
+    assert response.status_code == 201, response.content
+    return response.data['id']
+
+
+def ids(response):
+    data = response.data['results'] if isinstance(response.data, dict) else response.data
+    return {row['id'] for row in data}
+
+
+class AnswerScoringTests(TestCase):
+    """
+    Answers to a game session are recorded and scored once, however often and however fast they are sent.
+    """
+
+    def setUp(self):
+        self.student = User.objects.get(username='suman_sharma')
+        self.client = client_for(self.student)
+        response = self.client.post('/api/gamesessions/', {'quiz': 4, 'status': 'in_progress', 'score': 0},
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.session_id = response.data['id']
+        self.question = Question.objects.filter(quiz_id=4, question_type='multiple_choice').order_by('id').first()
+
+    def answer(self):
+        return self.client.post(f'/api/gamesessions/{self.session_id}/answer/',
+                                {'question': self.question.pk, 'answer': list(self.question.correct_answer)[0]},
+                                format='json')
+
+    def test_same_answer_twice_is_scored_once(self):
+        self.assertEqual(self.answer().status_code, 200)
+        self.assertEqual(self.answer().status_code, 400)
+        session = GameSession.objects.get(pk=self.session_id)
+        self.assertEqual(session.score, self.question.points)
+        self.assertEqual(session.correct_answers_count, 1)
+
+    def test_answer_recorded_by_a_concurrent_request_is_not_scored(self):
+        # Another request stored the answer after this one looked up the question
+        AnswerAttempt.objects.create(session_id=self.session_id, student=self.student, question=self.question,
+                                     is_correct=True, answered_at=self.student.date_joined)
+        self.assertEqual(self.answer().status_code, 400)
+        session = GameSession.objects.get(pk=self.session_id)
+        self.assertEqual(session.score, 0)
+        self.assertFalse(ReviewItem.objects.filter(student=self.student, question=self.question).exists())
+
+    def test_record_answers_counts_only_inserted_rows(self):
+        graded = [(self.question.pk, True, 'A'), (self.question.pk, True, 'A')]
+        self.assertEqual(review.record_answers(self.student, self.session_id, graded), 1)
+        self.assertEqual(review.record_answers(self.student, self.session_id, graded), 0)
+        self.assertEqual(AnswerAttempt.objects.filter(session_id=self.session_id).count(), 1)
+        self.assertEqual(ReviewItem.objects.get(student=self.student, question=self.question).box, 1)
+
+
+class DeletedQuestionAnswerTests(TransactionTestCase):
+    """
+    A question deleted after its quiz was published stays in the package but its answers are not recorded.
+    Foreign keys are checked when the transaction commits, so these tests commit.
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        self.student = User.objects.get(username='suman_sharma')
+        self.client = client_for(self.student)
+        publish(4)
+        response = self.client.post('/api/gamesessions/', {'quiz': 4, 'status': 'in_progress', 'score': 0},
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.session_id = response.data['id']
+        self.question_id = Question.objects.filter(quiz_id=4, question_type='multiple_choice').order_by('id').first().pk
+        Question.objects.filter(pk=self.question_id).delete()
+
+    def test_answer_to_a_deleted_question_is_refused(self):
+        response = self.client.post(f'/api/gamesessions/{self.session_id}/answer/',
+                                    {'question': self.question_id, 'answer': 'A'}, format='json')
+        self.assertEqual(response.status_code, 400, response.data)
+        self.assertFalse(AnswerAttempt.objects.filter(session_id=self.session_id).exists())
+
+    def test_record_answers_skips_deleted_questions(self):
+        other = Question.objects.filter(quiz_id=4).order_by('id').first()
+        graded = [(self.question_id, True, 'A'), (other.pk, False, 'B')]
+        self.assertEqual(review.record_answers(self.student, self.session_id, graded), 1)
+        self.assertEqual(list(AnswerAttempt.objects.filter(session_id=self.session_id).values_list('question_id', flat=True)),
+                         [other.pk])
+
+
+class SchoolIsolationTests(TestCase):
+    """
+    Users only ever see rows of their own school, and a user without a school sees nothing.
+    """
+
+    def setUp(self):
+        self.student = User.objects.get(username='suman_sharma')
+        self.teacher = User.objects.get(username='alex_johnson')
+        self.other_school = School.objects.create(name='Other School', slug='other')
+        self.other_teacher = User.objects.create_user('other_teacher', password='x', role='teacher',
+                                                      school=self.other_school)
+
+    def test_teacher_does_not_see_quizzes_of_another_school(self):
+        own = ids(client_for(self.teacher).get('/api/quizzes/'))
+        other = ids(client_for(self.other_teacher).get('/api/quizzes/'))
+        self.assertTrue(own)
+        self.assertFalse(own & other)
+        self.assertEqual(other, set())
+
+    def test_user_without_a_school_sees_nothing(self):
+        # Bypasses User.clean, as a row written by hand or by an old migration would
+        User.objects.filter(pk=self.teacher.pk).update(school=None)
+        self.teacher.refresh_from_db()
+        self.assertEqual(ids(client_for(self.teacher).get('/api/quizzes/')), set())
+        self.assertFalse(scope(Question.objects.all(), self.teacher).exists())
+
+    def test_superuser_without_a_school_is_not_scoped(self):
+        admin = User.objects.create_superuser('platform', password='x', role='admin')
+        self.assertEqual(scope(Question.objects.all(), admin).count(), Question.objects.count())
+
+    def test_only_superusers_can_be_without_a_school(self):
+        with self.assertRaises(ValidationError):
+            User.objects.create_user('nobody', password='x', role='teacher')
+
+    def test_archived_results_are_scoped_by_their_school_column(self):
+        result = QuizResultHistory.objects.create(id=1000, student=self.student, quiz_id=4, score=3,
+                                                  updated_at=timezone.now())
+        self.assertEqual(result.school_id, self.student.school_id)
+        response = client_for(self.teacher).get('/api/quizresults/', {'include_archived': 'true'})
+        self.assertIn(1000, ids(response))
+        response = client_for(self.other_teacher).get('/api/quizresults/', {'include_archived': 'true'})
+        self.assertNotIn(1000, ids(response))
+
+    def test_review_queue_has_no_questions_of_another_school(self):
+        question = Question.objects.filter(quiz_id=4).order_by('id').first()
+        other_student = User.objects.create_user('other_student', password='x', role='student', school=self.other_school)
+        for student in (self.student, other_student):
+            # Written by hand, answers of another school's questions are never recorded
+            ReviewItem.objects.create(student=student, question=question, due_at=timezone.now(),
+                                      last_answered_at=timezone.now())
+        self.assertEqual(ids(client_for(self.student).get('/api/questions/review/')), {question.pk})
+        self.assertEqual(ids(client_for(other_student).get('/api/questions/review/')), set())
+
+    def test_assets_of_another_school_are_not_found(self):
+        question = Question.objects.filter(teacher=self.teacher).order_by('id').first()
+        asset = QuestionAsset.objects.create(question=question, sha256='0' * 64, content_type='image/png', size=1)
+        self.assertEqual(ids(client_for(self.teacher).get(f'/api/questions/{question.pk}/assets/')), {asset.pk})
+        other = client_for(self.other_teacher)
+        self.assertEqual(other.get(f'/api/questions/{question.pk}/assets/').status_code, 404)
+        self.assertEqual(other.delete(f'/api/questions/{question.pk}/assets/{asset.pk}/').status_code, 404)
+        self.assertEqual(other.get(f'/api/assets/{asset.sha256}/').status_code, 404)
+        self.assertTrue(QuestionAsset.objects.filter(pk=asset.pk).exists())
+
+
+class QuestionImportTests(TestCase):
+    """
+    CSV, JSON and JSON Lines files import the same questions.
+    """
+    ROWS = [
+        {'quiz': 4, 'question_text': 'Order the numbers', 'question_type': 'drag_and_drop',
+         'options': ['1', '2', '3'], 'correct_answer': ['1', '2', '3'], 'points': 0},
+        {'quiz': 4, 'question_text': 'Pick 2', 'question_type': 'multiple_choice',
+         'options': {'A': '2', 'B': '3'}, 'correct_answer': {'A': '2'}},
+    ]
+
+    def setUp(self):
+        self.teacher = User.objects.get(username='alex_johnson')
+
+    def run_import(self, content, file_format):
+        rows = question_import.iter_rows(io.BytesIO(content.encode()), file_format)
+        return question_import.import_questions(rows, self.teacher)
+
+    def assert_imported(self, result):
+        self.assertEqual(result, {'created': 2, 'errors': []})
+        ordering = Question.objects.get(quiz_id=4, question_text='Order the numbers')
+        self.assertEqual(ordering.points, 0)
+        self.assertEqual(ordering.options, ['1', '2', '3'])
+        self.assertEqual(Question.objects.get(quiz_id=4, question_text='Pick 2').points, 1)
+
+    def test_csv(self):
+        out = io.StringIO()
+        writer = csv.DictWriter(out, ['quiz', 'question_text', 'question_type', 'options', 'correct_answer', 'points'])
+        writer.writeheader()
+        for row in self.ROWS:
+            writer.writerow(dict(row, options=json.dumps(row['options']),
+                                 correct_answer=json.dumps(row['correct_answer'])))
+        self.assert_imported(self.run_import(out.getvalue(), 'csv'))
+
+    def test_json(self):
+        self.assert_imported(self.run_import(json.dumps(self.ROWS), 'json'))
+
+    def test_jsonl(self):
+        self.assert_imported(self.run_import('\n'.join(json.dumps(row) for row in self.ROWS), 'jsonl'))
+
+    def test_json_values_are_not_decoded_twice(self):
+        # A string holding JSON is a string in a JSON file, not an object
+        row = dict(self.ROWS[1], options=json.dumps(self.ROWS[1]['options']))
+        result = self.run_import(json.dumps([row]), 'json')
+        self.assertEqual(result['created'], 0)
+        self.assertIn('options', result['errors'][0]['errors'])
+
+    def test_invalid_json_cell_is_reported_for_its_row(self):
+        content = 'quiz,question_text,question_type,options,correct_answer\n4,Pick,multiple_choice,{oops,{}\n'
+        result = self.run_import(content, 'csv')
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['errors'][0]['row'], 1)
+
+
+class AdminSearchTests(TestCase):
+    """
+    '^' admin searches are case insensitive and served by the Lower() indexes.
+    """
+
+    def search(self, model, term):
+        request = RequestFactory().get('/admin/')
+        request.user = User.objects.get(username='alex_johnson')
+        return site._registry[model].get_search_results(request, model.objects.all(), term)[0]
+
+    def test_title_prefix_is_case_insensitive(self):
+        quiz = Quiz.objects.get(pk=4)
+        found = self.search(Quiz, quiz.title[:3].swapcase())
+        self.assertIn(quiz, found)
+        self.assertTrue(all(q.title.lower().startswith(quiz.title[:3].lower()) for q in found))
+
+    def test_title_search_uses_the_lower_index(self):
+        self.assertIn('api_quiz_title_lower_idx', self.search(Quiz, 'math').explain())
+
+    def test_user_search_matches_username_or_email(self):
+        self.assertEqual(list(self.search(User, 'SUMAN_S').values_list('username', flat=True)), ['suman_sharma'])
+
+
+class QueuedLogHandlerTests(TestCase):
+    """
+    The JSON log handler writes records of forked processes too and never blocks on a full queue.
+    """
+
+    def make_handler(self, stream, queue_size=100):
+        handler = QueuedStreamHandler(stream, queue_size=queue_size)
+        handler.setFormatter(JsonFormatter())
+        self.addCleanup(handler.close)
+        return handler
+
+    @staticmethod
+    def record(message):
+        return logging.LogRecord('api.test', logging.INFO, __file__, 1, message, None, None)
+
+    def test_forked_child_writes_its_records(self):
+        with tempfile.TemporaryFile('w+') as stream:
+            handler = self.make_handler(stream)
+            handler.handle(self.record('parent'))
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    handler.handle(self.record('child'))
+                    handler.close()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            handler.close()
+            stream.seek(0)
+            messages = [json.loads(line)['message'] for line in stream.read().splitlines()]
+        self.assertEqual(sorted(messages), ['child', 'parent'])
+
+    def test_records_are_dropped_and_counted_when_the_queue_is_full(self):
+        stream = io.StringIO()
+        handler = self.make_handler(stream, queue_size=1)
+        handler._ensure_listener()
+        # Holds the listener up, so the queue fills
+        with handler.target.lock:
+            for number in range(10):
+                handler.handle(self.record(str(number)))
+            dropped = handler.dropped
+        self.assertGreater(dropped, 0)
+        handler.queue.join()
+        handler.handle(self.record('after'))
+        handler.close()
+        last = json.loads(stream.getvalue().splitlines()[-1])
+        self.assertEqual(last['message'], 'after')
+        self.assertEqual(last['dropped_records'], dropped)
+
+
+class RosterImportTests(TestCase):
+    """
+    Roster rows are checked with the validators of the user model, and a username taken while the
+    roster is imported is reported for its row.
+    """
+
+    def setUp(self):
+        self.school = User.objects.get(username='alex_johnson').school
+
+    def test_model_validators_run_per_row(self):
+        rows = [
+            {'username': 'has space', 'password': 'x'},
+            {'username': 'u' * 151, 'password': 'x'},
+            {'username': 'new_student', 'email': 'not-an-email', 'password': 'x'},
+            {'username': 'good_student', 'email': 'good@example.com', 'password': 'x'},
+        ]
+        report = roster.import_roster(rows, self.school)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual([(error['row'], list(error['errors'])) for error in report['errors']],
+                         [(1, ['username']), (2, ['username']), (3, ['email'])])
+
+    def test_username_taken_after_validation_is_a_row_error(self):
+        validate_rows = roster.validate_rows
+
+        def validate_then_race(rows, school):
+            result = validate_rows(rows, school)
+            User.objects.create_user('taken', password='x', school=school)
+            return result
+
+        rows = [{'username': 'first', 'password': 'x'}, {'username': 'taken', 'password': 'x'}]
+        with mock.patch.object(roster, 'validate_rows', validate_then_race):
+            report = roster.import_roster(rows, self.school)
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(report['errors'], [{'row': 2, 'username': 'taken',
+                                             'errors': {'username': "A user with that username already exists."}}])
+        self.assertTrue(User.objects.filter(username='first', school=self.school).exists())
+
+
+class AttemptCapTests(TestCase):
+    """
+    The attempt cap counts archived sessions, and the open quiz lists are invalidated for every worker.
+    """
+
+    def setUp(self):
+        self.student = User.objects.get(username='suman_sharma')
+        self.client = client_for(self.student)
+        # One attempt left
+        played = GameSession.objects.filter(student=self.student, quiz_id=4).count()
+        Quiz.objects.filter(pk=4).update(max_attempts=played + 1)
+
+    def start(self):
+        return self.client.post('/api/gamesessions/', {'quiz': 4, 'status': 'in_progress', 'score': 0}, format='json')
+
+    def test_archived_sessions_count_towards_the_cap(self):
+        self.assertEqual(self.start().status_code, 201)
+        GameSession.objects.filter(student=self.student, quiz_id=4).update(status='completed')
+        archive.archive_sessions(timezone.now() + timezone.timedelta(days=1))
+        self.assertFalse(GameSession.objects.filter(student=self.student, quiz_id=4).exists())
+        self.assertEqual(self.start().status_code, 403)
+
+    def test_student_without_a_class_year_cannot_start(self):
+        quiz = Quiz.objects.get(pk=4)
+        quiz.class_year = None
+        self.student.class_year = None
+        with self.assertRaises(scheduling.QuizUnavailable):
+            scheduling.check_can_start(self.student, quiz)
+
+    def test_invalidation_is_kept_in_the_shared_cache(self):
+        school_id, class_year_id = self.student.school_id, self.student.class_year_id
+        before = class_year_key(school_id, class_year_id, 'available_quizzes')
+        invalidate_class_years(school_id, [class_year_id])
+        self.assertNotEqual(class_year_key(school_id, class_year_id, 'available_quizzes'), before)
+        # Read again by the backend every worker process uses
+        version = caches['shared'].get(f'school:{school_id}:class_year:{class_year_id}:version')
+        self.assertTrue(class_year_key(school_id, class_year_id, 'available_quizzes').endswith(
+            f':v{version}:available_quizzes'))
+
+
+class ArchiveTests(TestCase):
+    """
+    Archived sessions keep every column the live table had.
+    """
+
+    def test_session_round_trip(self):
+        student = User.objects.get(username='suman_sharma')
+        now = timezone.now()
+        session = GameSession.objects.create(student=student, quiz_id=4, status='completed', score=5,
+                                             correct_answers_count=2, client_id='device-1', started_at=now,
+                                             deadline=now + timezone.timedelta(minutes=10),
+                                             duration=timezone.timedelta(minutes=3))
+        expected = GameSession.objects.filter(pk=session.pk).values(*archive.SESSION_HISTORY_FIELDS).get()
+
+        archive.archive_sessions(now + timezone.timedelta(days=1))
+
+        self.assertFalse(GameSession.objects.filter(pk=session.pk).exists())
+        archived = GameSessionHistory.objects.filter(pk=session.pk).values(*archive.SESSION_HISTORY_FIELDS).get()
+        self.assertEqual(archived, expected)
+        self.assertEqual(archived['client_id'], 'device-1')
+        self.assertIsNotNone(archived['seed'])
+
+    def test_every_session_column_is_archived(self):
+        columns = {field.attname for field in GameSession._meta.concrete_fields}
+        self.assertEqual(columns - set(archive.SESSION_HISTORY_FIELDS), set())
+
+
+class PackageTests(TestCase):
+    """
+    Students never receive the answer key, and grading parses the answer key once per version.
+    """
+
+    def setUp(self):
+        self.teacher = User.objects.get(username='alex_johnson')
+        self.student = User.objects.get(username='suman_sharma')
+        self.version_id = publish(4)
+
+    def test_students_get_the_package_without_the_answer_key(self):
+        student_package = json.loads(client_for(self.student).get('/api/quizzes/4/package/').content)
+        self.assertNotIn('answer_key', student_package)
+        self.assertTrue(student_package['questions'])
+        teacher_package = json.loads(client_for(self.teacher).get('/api/quizzes/4/package/').content)
+        self.assertIn('answer_key', teacher_package)
+
+    def test_answer_key_is_parsed_once_per_version(self):
+        with mock.patch.object(packages, 'get_package', wraps=packages.get_package) as get_package:
+            first = packages.get_answer_key(self.version_id)
+            second = packages.get_answer_key(self.version_id)
+        self.assertIs(first, second)
+        self.assertLessEqual(get_package.call_count, 1)
+
+    def test_fill_in_the_blank_answer_must_match_every_blank(self):
+        question = Question(question_type='fill_in_the_blank', options=None,
+                            correct_answer={'city': 'Paris', 'river': 'Seine'})
+        key = packages.compile_answer_key(question)
+        self.assertTrue(packages.is_correct(key, {'city': ' paris ', 'river': 'SEINE'}))
+        for answer in ({}, {'city': 'Seine', 'river': 'Paris'}, {'city': 'Paris'},
+                       {'city': 'Paris', 'river': 'Seine', 'sea': 'x'}, 'Paris', None):
+            self.assertFalse(packages.is_correct(key, answer), answer)
+
+        single = packages.compile_answer_key(Question(question_type='fill_in_the_blank', correct_answer={'blank': 'Paris'}))
+        self.assertTrue(packages.is_correct(single, 'paris'))
+        self.assertTrue(packages.is_correct(single, {'blank': 'Paris'}))
+        self.assertFalse(packages.is_correct(single, {}))
+
+    def test_choice_answer_of_any_shape_is_graded(self):
+        question = Question.objects.filter(quiz_id=4, question_type='multiple_choice').order_by('id').first()
+        key = packages.compile_answer_key(question)
+        for answer in ([1, 'A'], {'1': 'x', 'A': 'y'}, None, True, 2.5):
+            self.assertFalse(packages.is_correct(key, answer), answer)
+
+        client = client_for(self.student)
+        session = client.post('/api/gamesessions/', {'quiz': 4, 'status': 'in_progress', 'score': 0}, format='json')
+        response = client.post(f"/api/gamesessions/{session.data['id']}/answer/",
+                               {'question': question.pk, 'answer': [1, 'A']}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(response.data['correct'])
+
+
+class OfflineSyncTests(TestCase):
+    """
+    Offline bundles hold no answer key, replayed attempts are recorded once and client times are checked.
+    """
+
+    def setUp(self):
+        self.teacher = User.objects.get(username='alex_johnson')
+        self.student = User.objects.get(username='suman_sharma')
+        publish(4)
+        self.issued_at = timezone.now() - timezone.timedelta(hours=1)
+        self.bundle = json.loads(offline.bundle_blob(Quiz.objects.get(pk=4), self.student, now=self.issued_at))
+        question = self.bundle['package']['questions'][0]
+        self.attempt = {
+            'client_id': 'device-1:1',
+            'quiz_version': self.bundle['quiz_version'],
+            'bundle_token': self.bundle['bundle_token'],
+            'started_at': (self.issued_at + timezone.timedelta(minutes=5)).isoformat(),
+            'completed_at': (self.issued_at + timezone.timedelta(minutes=9)).isoformat(),
+            'answers': {str(question['id']): 'A'},
+        }
+
+    def sync(self, *attempts):
+        response = client_for(self.student).post('/api/gamesessions/sync/', {'attempts': list(attempts)},
+                                                 format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def test_bundle_has_no_answer_key(self):
+        bundle = json.loads(client_for(self.student).get('/api/quizzes/4/bundle/').content)
+        self.assertNotIn('answer_key', bundle['package'])
+        self.assertIn('bundle_token', bundle)
+
+    def test_replayed_attempt_is_recorded_once(self):
+        first, again = self.sync(self.attempt, self.attempt)
+        self.assertEqual(first['status'], 'created')
+        self.assertEqual(again['status'], 'duplicate')
+        self.assertEqual(again['session'], first['session'])
+        self.assertEqual(GameSession.objects.filter(student=self.student, client_id='device-1:1').count(), 1)
+        self.assertEqual(AnswerAttempt.objects.filter(session_id=first['session']).count(), 1)
+
+    def test_replay_of_an_archived_attempt_is_a_duplicate(self):
+        created, = self.sync(self.attempt)
+        archive.archive_sessions(timezone.now() + timezone.timedelta(days=1))
+        replayed, = self.sync(self.attempt)
+        self.assertEqual((replayed['status'], replayed['session']), ('duplicate', created['session']))
+        self.assertFalse(GameSession.objects.filter(student=self.student, client_id='device-1:1').exists())
+
+    def test_attempt_started_before_the_bundle_was_issued_is_refused(self):
+        attempt = dict(self.attempt, started_at=(self.issued_at - timezone.timedelta(minutes=1)).isoformat())
+        result, = self.sync(attempt)
+        self.assertEqual(result['status'], 'error')
+
+    def test_attempt_needs_the_bundle_token_of_the_student(self):
+        other = offline.bundle_blob(Quiz.objects.get(pk=4), self.teacher, now=self.issued_at)
+        for token in (None, 'forged', json.loads(other)['bundle_token']):
+            result, = self.sync(dict(self.attempt, bundle_token=token))
+            self.assertEqual(result['status'], 'error', token)
+        self.assertFalse(GameSession.objects.filter(student=self.student, client_id='device-1:1').exists())
+
+    def test_answer_of_mixed_labels_is_graded_wrong(self):
+        question = self.bundle['package']['questions'][0]
+        result, = self.sync(dict(self.attempt, answers={str(question['id']): [1, 'A']}))
+        self.assertEqual(result['status'], 'created')
+        self.assertFalse(AnswerAttempt.objects.get(session_id=result['session']).is_correct)
+
+    def test_attempt_completed_after_the_quiz_closed_is_refused(self):
+        Quiz.objects.filter(pk=4).update(closes_at=self.issued_at + timezone.timedelta(minutes=7))
+        result, = self.sync(self.attempt)
+        self.assertEqual(result['status'], 'error')
+
+
+class ShuffleTests(TestCase):
+    """
+    Drag and drop and matching pairs items are shown shuffled and answers given as shown are graded.
+    """
+    ITEMS = ['one', 'two', 'three', 'four', 'five', 'six']
+
+    def setUp(self):
+        self.teacher = User.objects.get(username='alex_johnson')
+        self.student = User.objects.get(username='suman_sharma')
+        self.ordering = Question.objects.create(
+            teacher=self.teacher, quiz_id=4, question_text='Order', question_type='drag_and_drop',
+            options=self.ITEMS, correct_answer=self.ITEMS, points=1)
+        self.pairs = Question.objects.create(
+            teacher=self.teacher, quiz_id=4, question_text='Match', question_type='matching_pairs',
+            options={'left': self.ITEMS, 'right': [item.upper() for item in self.ITEMS]},
+            correct_answer={item: item.upper() for item in self.ITEMS}, points=1)
+        publish(4)
+        self.client = client_for(self.student)
+        response = self.client.post('/api/gamesessions/', {'quiz': 4, 'status': 'in_progress', 'score': 0},
+                                    format='json')
+        self.session_id = response.data['id']
+        questions = self.client.get(f'/api/gamesessions/{self.session_id}/questions/').data['questions']
+        self.shown = {question['id']: question['options'] for question in questions}
+
+    def answer(self, question, answer):
+        response = self.client.post(f'/api/gamesessions/{self.session_id}/answer/',
+                                    {'question': question.pk, 'answer': answer}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_items_are_shuffled_per_seed(self):
+        layouts = [shuffle.session_layout(packages.latest_version_id(4), seed) for seed in range(5)]
+        orders = {tuple(layout['items'][self.ordering.pk]) for layout in layouts}
+        self.assertGreater(len(orders), 1)
+        self.assertEqual(sorted(self.shown[self.ordering.pk]), sorted(self.ITEMS))
+
+    def test_drag_and_drop_answer_by_shown_index(self):
+        shown = self.shown[self.ordering.pk]
+        self.answer(self.ordering, [shown.index(item) for item in self.ITEMS])
+        self.assertTrue(AnswerAttempt.objects.get(session_id=self.session_id, question=self.ordering).is_correct)
+
+    def test_matching_pairs_answer_by_shown_index(self):
+        left, right = self.shown[self.pairs.pk]['left'], self.shown[self.pairs.pk]['right']
+        answer = {str(left.index(item)): right.index(item.upper()) for item in self.ITEMS}
+        self.answer(self.pairs, answer)
+        self.assertTrue(AnswerAttempt.objects.get(session_id=self.session_id, question=self.pairs).is_correct)
+
+    def test_answers_given_as_items_are_unchanged(self):
+        self.answer(self.pairs, {item: item.upper() for item in reversed(self.ITEMS)})
+        self.assertTrue(AnswerAttempt.objects.get(session_id=self.session_id, question=self.pairs).is_correct)
+
+
+@jobs.register('tests.partial_write')
+def partial_write(name):
+    School.objects.create(name=name, slug=name)
+    raise RuntimeError("Fails after writing")
+
+
+class JobTests(TestCase):
+    """
+    Failed handlers leave no writes behind, crashed runs count as attempts and old jobs are purged.
+    """
+
+    def test_failed_handler_is_rolled_back(self):
+        job = jobs.enqueue('tests.partial_write', {'name': 'half-written'})
+        jobs._run_now(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertFalse(School.objects.filter(slug='half-written').exists())
+
+    def test_stale_lock_counts_as_an_attempt(self):
+        stale = timezone.now() - timezone.timedelta(seconds=settings.JOBS_LOCK_TIMEOUT + 1)
+        retried = Job.objects.create(name='tests.partial_write', status='running', locked_at=stale,
+                                     attempts=0, max_attempts=3, run_after=timezone.now() + timezone.timedelta(days=1))
+        crashed = Job.objects.create(name='tests.partial_write', status='running', locked_at=stale,
+                                     attempts=2, max_attempts=3)
+        jobs.claim_due(limit=10)
+        retried.refresh_from_db()
+        crashed.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), ('queued', 1))
+        self.assertEqual((crashed.status, crashed.attempts), ('failed', 3))
+
+    def test_purge_deletes_only_old_finished_jobs(self):
+        old = timezone.now() - timezone.timedelta(days=settings.JOBS_RETENTION_DAYS + 1)
+        for status in ('done', 'failed', 'queued'):
+            Job.objects.create(name='tests.partial_write', status=status)
+        Job.objects.update(updated_at=old)
+        recent = Job.objects.create(name='tests.partial_write', status='done')
+        cutoff = timezone.now() - timezone.timedelta(days=settings.JOBS_RETENTION_DAYS)
+        self.assertEqual(jobs.purge_jobs(cutoff, batch_size=1), 2)
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'queued', 'done'})
+        self.assertTrue(Job.objects.filter(pk=recent.pk).exists())
+
+    def test_worker_purges_old_finished_jobs(self):
+        old = Job.objects.create(name='tests.partial_write', status='done')
+        Job.objects.filter(pk=old.pk).update(
+            updated_at=timezone.now() - timezone.timedelta(days=settings.JOBS_RETENTION_DAYS + 1))
+        call_command('runjobs', '--once', stdout=io.StringIO())
+        self.assertFalse(Job.objects.filter(pk=old.pk).exists())
+
+
+@skipIf(assets.Image is None, "Pillow is not installed")
+class AssetTests(TestCase):
+    """
+    Asset types are detected from the content, and what isn't on the allow-list is never shown inline.
+    """
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(ASSET_ROOT=root.name))
+        self.teacher = User.objects.get(username='alex_johnson')
+        self.question = Question.objects.filter(teacher=self.teacher).order_by('id').first()
+
+    @staticmethod
+    def png(size=(4, 4)):
+        from PIL import Image
+        out = io.BytesIO()
+        Image.new('RGB', size).save(out, format='PNG')
+        return out.getvalue()
+
+    def upload(self, content, content_type, name='file'):
+        return client_for(self.teacher).post(f'/api/questions/{self.question.pk}/assets/',
+                                             {'file': SimpleUploadedFile(name, content, content_type)})
+
+    def test_type_comes_from_the_content(self):
+        response = self.upload(self.png(), 'application/octet-stream', 'picture.bin')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(QuestionAsset.objects.get(pk=response.data['id']).content_type, 'image/png')
+
+    def test_content_not_on_the_allow_list_is_refused(self):
+        svg = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+        self.assertEqual(self.upload(svg, 'image/svg+xml', 'x.svg').status_code, 400)
+        self.assertEqual(self.upload(b'<html></html>', 'image/png', 'x.png').status_code, 400)
+
+    def test_decompression_bomb_is_refused(self):
+        content = self.png((200, 200))
+        with mock.patch('PIL.Image.MAX_IMAGE_PIXELS', 1000):
+            response = self.upload(content, 'image/png', 'bomb.png')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuestionAsset.objects.exists())
+
+    def test_served_with_nosniff_and_other_types_as_attachment(self):
+        response = self.upload(self.png(), 'image/png', 'picture.png')
+        sha256 = response.data['sha256']
+        served = client_for(self.teacher).get(f'/api/assets/{sha256}/')
+        self.assertEqual(served['X-Content-Type-Options'], 'nosniff')
+        self.assertFalse(served.get('Content-Disposition', '').startswith('attachment'))
+        QuestionAsset.objects.filter(sha256=sha256).update(content_type='image/svg+xml')
+        served = client_for(self.teacher).get(f'/api/assets/{sha256}/')
+        self.assertEqual(served['Content-Disposition'], 'attachment')
+        self.assertEqual(served['X-Content-Type-Options'], 'nosniff')
+
+
+class EventBufferTests(TestCase):
+    """
+    Buffered events survive a failed insert, and the buffer stays bounded.
+    """
+
+    def setUp(self):
+        events.flush()
+
+    @staticmethod
+    def make_events(count):
+        return [GameEvent(stream='session:1', kind='answer', student_id=3, quiz_id=4, data={'n': n},
+                          created_at=timezone.now()) for n in range(count)]
+
+    def test_failed_insert_keeps_the_events(self):
+        events._append(self.make_events(2))
+        with mock.patch.object(GameEvent.objects, 'bulk_create', side_effect=OperationalError('locked')), \
+                self.assertLogs('api.events', 'ERROR'):
+            self.assertEqual(events.flush(), 0)
+        events._append(self.make_events(1))
+        self.assertEqual(events.flush(), 3)
+        self.assertEqual(list(GameEvent.objects.order_by('id').values_list('data__n', flat=True)), [0, 1, 0])
+
+    @override_settings(EVENT_LOG_FLUSH_SIZE=3, EVENT_LOG_MAX_BUFFER=5)
+    def test_flushes_at_the_threshold_and_stays_bounded(self):
+        events._append(self.make_events(3))
+        self.assertEqual(GameEvent.objects.count(), 3)
+        with mock.patch.object(GameEvent.objects, 'bulk_create', side_effect=OperationalError('down')), \
+                self.assertLogs('api.events', 'ERROR') as logs:
+            events._append(self.make_events(4))
+            events._append(self.make_events(4))
+        self.assertTrue(any('oldest events dropped' in line for line in logs.output))
+        self.assertEqual(len(events._buffer), 5)
+        self.assertEqual(events.flush(), 5)
+
+
+class MetricsFileTests(TestCase):
+    """
+    Scrapes only add up the files of running processes, and a process removes its own file on exit.
+    """
+    DEAD_PID = 2 ** 22 + 1  # above the largest pid Linux hands out
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(METRICS_MULTIPROC_DIR=directory.name))
+        self.directory = directory.name
+
+    def write(self, pid, in_progress):
+        with open(os.path.join(self.directory, f'metrics_{pid}.json'), 'w') as f:
+            json.dump({metrics.REQUESTS_IN_PROGRESS.name: [[[], in_progress]]}, f)
+
+    def test_files_of_dead_processes_are_skipped_and_removed(self):
+        own = metrics.REQUESTS_IN_PROGRESS.collect().get((), 0)
+        self.write(os.getppid(), 2)
+        self.write(self.DEAD_PID, 5)
+        totals = metrics._collect_all()
+        self.assertEqual(totals[metrics.REQUESTS_IN_PROGRESS.name][()], own + 2)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f'metrics_{self.DEAD_PID}.json')))
+
+    def test_process_file_is_removed_on_exit(self):
+        metrics.write_process_file()
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.json')
+        self.assertTrue(os.path.exists(path))
+        metrics.remove_process_file()
+        self.assertFalse(os.path.exists(path))
+
+    def test_shards_of_exited_threads_are_folded_into_the_totals(self):
+        counter = metrics.Counter('test_thread_total', 'Test counter.')
+        self.addCleanup(metrics._registry.remove, counter)
+        for _ in range(5):
+            thread = threading.Thread(target=counter.inc, kwargs={'amount': 2})
+            thread.start()
+            thread.join()
+        counter.inc()
+        self.assertEqual(counter.collect(), {(): 11})
+        self.assertEqual(len(counter._shards), 1)
+
+
+class CanonicalAnswersMigrationTests(TestCase):
+    """
+    Migration 0022 carries its own copy of the canonical form, which matches api/question_types.py.
+    """
+
+    def test_frozen_copy_matches_question_types(self):
+        migration = importlib.import_module('api.migrations.0022_canonical_question_answers')
+        samples = [(question.question_type, question.options, question.correct_answer)
+                   for question in Question.objects.all()]
+        samples += [
+            ('multiple_choice', {'B': ' two ', 'A': 1}, 'A'),
+            ('multiple_choice', {'A': 'x'}, 'A'),
+            ('fill_in_the_blank', None, ' Paris  '),
+            ('drag_and_drop', ['a', 'b'], ['b', 'c']),
+            ('matching_pairs', {'left': ['x', 'y'], 'right': ['1', '2']}, {'y': '2', 'x': '1'}),
+            ('essay', None, 'anything'),
+        ]
+        for question_type, options, correct_answer in samples:
+            options_, correct_answer_, errors = question_types.clean(question_type, options, correct_answer)
+            expected = None if errors else (options_, correct_answer_)
+            self.assertEqual(migration.canonical(question_type, options, correct_answer), expected)
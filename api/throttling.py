@@ -0,0 +1,148 @@
+'''
+Throttling and admission control for the gameplay write endpoints.
+
+Token buckets refill continuously at `capacity / period`, so a class finishing a quiz together
+can spend its burst straight away and is then paced. Buckets live either in process memory
+(THROTTLE_BACKEND = 'memory') or in the shared 'throttle' cache (THROTTLE_BACKEND = 'cache',
+a file or database cache so that every worker process sees the same buckets).
+'''
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600}
+
+
+def parse_rate(rate):
+    """
+    '60/min' -> (60, 60). The first number is both the burst size and the amount refilled per period.
+    """
+    capacity, period = rate.split('/')
+    return int(capacity), PERIODS[period]
+
+
+class MemoryBucketStore:
+    """
+    Buckets kept in a dict for the current process.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens, wait = _refill_and_take(tokens, updated, capacity, period, now)
+            self.buckets[key] = (tokens, now)
+        return wait
+
+
+class CacheBucketStore:
+    """
+    Buckets kept in a Django cache shared by all worker processes.
+    The read-update-write is not atomic across processes, under contention a few extra requests may
+    get through, which is the same trade off DRF's own cache based throttles make.
+    """
+
+    def __init__(self, alias='throttle'):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, period, now):
+        tokens, updated = self.cache.get(key, (capacity, now))
+        tokens, wait = _refill_and_take(tokens, updated, capacity, period, now)
+        self.cache.set(key, (tokens, now), timeout=period * 2)
+        return wait
+
+
+def _refill_and_take(tokens, updated, capacity, period, now):
+    """
+    Returns the new token count and 0 if a token was taken, otherwise the seconds until one is available.
+    """
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) * period / capacity
+
+
+_stores = {}
+
+
+def get_store():
+    backend = settings.THROTTLE_BACKEND
+    if backend not in _stores:
+        _stores[backend] = MemoryBucketStore() if backend == 'memory' else CacheBucketStore()
+    return _stores[backend]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class, subclasses pick the rate table and the bucket key.
+    """
+    scope = None
+    rates_setting = None
+
+    def get_rate(self, request):
+        return getattr(settings, self.rates_setting).get(getattr(request.user, 'role', None))
+
+    def get_bucket(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        rate = self.get_rate(request)
+        if rate is None:
+            return True
+        capacity, period = parse_rate(rate)
+        self.retry_after = get_store().take(
+            f'{self.scope}:{self.get_bucket(request)}', capacity, period, time.time()
+        )
+        return self.retry_after == 0
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserWriteThrottle(TokenBucketThrottle):
+    """
+    One bucket per user, sized by the user's role (THROTTLE_USER_RATES).
+    """
+    scope = 'write-user'
+    rates_setting = 'THROTTLE_USER_RATES'
+
+    def get_bucket(self, request):
+        return request.user.pk
+
+
+class RoleWriteThrottle(TokenBucketThrottle):
+    """
+    One bucket shared by every user of a role (THROTTLE_ROLE_RATES), caps a whole class at once.
+    """
+    scope = 'write-role'
+    rates_setting = 'THROTTLE_ROLE_RATES'
+
+    def get_bucket(self, request):
+        return request.user.role
+
+
+# Limits how many write requests run at the same time in this process
+_write_slots = None
+_write_slots_lock = threading.Lock()
+
+
+def acquire_write_slot():
+    """
+    Try to take a write slot without waiting. Returns False when WRITE_CONCURRENCY_LIMIT are in use.
+    """
+    global _write_slots
+    if _write_slots is None:
+        with _write_slots_lock:
+            if _write_slots is None:
+                _write_slots = threading.BoundedSemaphore(settings.WRITE_CONCURRENCY_LIMIT)
+    return _write_slots.acquire(blocking=False)
+
+
+def release_write_slot():
+    _write_slots.release()
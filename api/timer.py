@@ -0,0 +1,85 @@
+'''
+Server side game session timing.
+
+Sessions get started_at when they are created and, for quizzes with a time limit, a deadline.
+Elapsed time is always computed on the server from those two, whatever the client reports, and the
+duration is written once when the session completes. Sessions past their deadline are completed
+when they are next touched, or by the session sweeper through the (status, deadline) index.
+'''
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import DurationField, ExpressionWrapper, F
+from django.utils import timezone
+
+from . import events
+from .jobs import enqueue
+from .models import GameSession
+
+
+def start_fields(quiz, now=None):
+    """
+    started_at and deadline of a new session of `quiz`.
+    """
+    now = now or timezone.now()
+    return {'started_at': now, 'deadline': now + quiz.time_limit if quiz.time_limit else None}
+
+
+def elapsed(game_session, now=None):
+    """
+    Time played so far: never negative and never counted past the deadline.
+    """
+    now = now or timezone.now()
+    end = min(now, game_session.deadline) if game_session.deadline else now
+    return max(end - game_session.started_at, timedelta(0))
+
+
+def is_expired(game_session, now=None):
+    now = now or timezone.now()
+    return game_session.status == 'in_progress' and game_session.deadline is not None and now >= game_session.deadline
+
+
+def _complete_expired(ids):
+    """
+    Complete in progress sessions among `ids` with the time limit as their duration.
+    Returns the number of sessions completed.
+    """
+    with transaction.atomic():
+        expired = GameSession.objects.filter(id__in=ids, status='in_progress')
+        rows = list(expired.values_list('id', 'student_id', 'quiz_id'))
+        # .update() skips auto_now, last_updated keeps the student's last activity
+        expired.update(status='completed',
+                       duration=ExpressionWrapper(F('deadline') - F('started_at'), output_field=DurationField()))
+        completed = GameSession.objects.filter(id__in=[row[0] for row in rows])
+        for game_session in completed:
+            events.session_changed(game_session, previous_status='in_progress')
+            enqueue('update_progress', {'session_id': game_session.pk},
+                    key=f'update_progress:{game_session.pk}:completed')
+    return len(rows)
+
+
+def expire(game_session):
+    """
+    Complete one session if it is past its deadline. Returns True if it was completed now.
+    """
+    if not is_expired(game_session):
+        return False
+    completed = _complete_expired([game_session.pk])
+    game_session.refresh_from_db(fields=['status', 'duration'])
+    return completed > 0
+
+
+def expire_due_sessions(now=None, batch_size=500):
+    """
+    Complete every in progress session past its deadline, in batches.
+    Returns the number of sessions completed.
+    """
+    now = now or timezone.now()
+    due = GameSession.objects.filter(status='in_progress', deadline__lte=now)
+    expired = 0
+    while True:
+        ids = list(due.order_by('deadline').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        expired += _complete_expired(ids)
+    return expired
@@ -3,7 +3,7 @@ from .views import LoginView, LogoutView
 from rest_framework.routers import DefaultRouter
 from .views import (
     UserViewSet, QuestionViewSet, GameSessionViewSet, QuizViewSet, 
-    QuizResultViewSet, ProgressTrackingViewSet, UserInfoView
+    QuizResultViewSet, ProgressTrackingViewSet, UserInfoView, AssetFileView, MetricsView
 )
 
 # Create a router and register our viewsets with it.
@@ -23,4 +23,6 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('user-info/', UserInfoView.as_view(), name='user-info'),
+    path('assets/<str:sha256>/', AssetFileView.as_view(), name='asset-file'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
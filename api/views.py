@@ -1,18 +1,101 @@
+import hmac
+import os
+
 from rest_framework import viewsets, permissions
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, Throttled, ValidationError
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth import authenticate, login, logout
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from .models import User, Question, GameSession, Quiz, QuizResult, ProgressTracking
+from .models import (
+    User, Question, GameSession, Quiz, QuizResult, ProgressTracking,
+    GameSessionHistory, QuizResultHistory, QuestionAsset, QuestionStats
+)
 from .permissions import IsAdminOrTeacher, IsStudent
+from .jobs import enqueue
+from . import login_cache
+from .roster import import_roster, parse_roster
+from .promotion import promote_students
+from . import assets
+from . import packages
+from . import offline
+from . import review
+from . import events
+from . import shuffle
+from . import scheduling
+from . import timer
+from . import metrics
+from .cache import invalidate_class_years
+from .tenancy import scope
+from .question_import import IMPORT_FORMATS, import_questions, iter_rows
+from .throttling import UserWriteThrottle, RoleWriteThrottle, acquire_write_slot, release_write_slot
 from .serializers import (
     UserSerializer, QuestionSerializer, GameSessionSerializer, 
-    QuizSerializer, QuizResultSerializer, ProgressTrackingSerializer
+    QuizSerializer, QuizResultSerializer, ProgressTrackingSerializer,
+    GameSessionHistorySerializer, QuizResultHistorySerializer, QuestionAssetSerializer, QuestionStatsSerializer
 )
 
+
+class WriteAdmissionMixin:
+    """
+    Write requests are throttled per user and per role (token buckets) and only
+    WRITE_CONCURRENCY_LIMIT of them run at once per process. Requests that can't be admitted
+    fail straight away with 429 and Retry-After, so reads never queue behind a burst of writes.
+    """
+    write_slot_acquired = False
+
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.request.method not in permissions.SAFE_METHODS:
+            throttles += [UserWriteThrottle(), RoleWriteThrottle()]
+        return throttles
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in permissions.SAFE_METHODS:
+            if not acquire_write_slot():
+                raise Throttled(wait=settings.WRITE_ADMISSION_RETRY_AFTER)
+            self.write_slot_acquired = True
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Called for successful and failed requests alike
+        if self.write_slot_acquired:
+            release_write_slot()
+            self.write_slot_acquired = False
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class IncludeArchivedMixin:
+    """
+    List endpoints only read the hot table by default.
+    With `?include_archived=true` rows from the history table are appended, marked with "archived": true.
+    """
+    history_serializer_class = None
+
+    def include_archived(self):
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+    def get_history_queryset(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        if not self.include_archived():
+            return super().list(request, *args, **kwargs)
+
+        hot = self.get_serializer(self.filter_queryset(self.get_queryset()), many=True).data
+        archived = self.history_serializer_class(
+            self.get_history_queryset(), many=True, context=self.get_serializer_context()
+        ).data
+        return Response(list(hot) + list(archived))
+
 # Login view
 class LoginView(APIView):
     permission_classes = [AllowAny]
@@ -20,7 +103,11 @@ class LoginView(APIView):
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
-        user = authenticate(request, username=username, password=password)
+        user = self.cached_user(username, password)
+        if user is None:
+            user = authenticate(request, username=username, password=password)
+            if user is not None:
+                login_cache.remember(username, password, user)
 
         if user is not None:
             login(request, user)
@@ -28,6 +115,20 @@ class LoginView(APIView):
         else:
             return Response({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
+    def cached_user(self, username, password):
+        """
+        Return the user of a recent successful login with the same credentials without hashing the password again.
+        The entry is ignored if the password was changed or the account deactivated since.
+        """
+        cached = login_cache.get(username, password)
+        if cached is None:
+            return None
+        user_id, encoded = cached
+        user = User.objects.filter(pk=user_id, password=encoded, is_active=True).first()
+        if user is not None:
+            user.backend = settings.AUTHENTICATION_BACKENDS[0]
+        return user
+
 # Logout view
 class LogoutView(APIView):
     permission_classes = [IsAuthenticated]
@@ -66,8 +167,9 @@ class UserViewSet(viewsets.ModelViewSet):
         - Admin can see all users.
         - Teacher can only see users with role 'student'.
         - Students should not be able to see any other users.
+        Only users of the requesting user's school are returned.
         """
-        queryset = super().get_queryset()
+        queryset = scope(super().get_queryset(), self.request.user)
 
         role = getattr(self.request.user, 'role', None)
 
@@ -83,8 +185,8 @@ class UserViewSet(viewsets.ModelViewSet):
         if getattr(self.request.user, 'role', None) != 'admin':
             raise PermissionDenied("Only admin can create users.")
         
-        # Save the new user with the data provided
-        serializer.save()
+        # Save the new user with the data provided, in the admin's school
+        serializer.save(school=self.request.user.school)
     
     def update(self, request, *args, **kwargs):
         """
@@ -106,6 +208,54 @@ class UserViewSet(viewsets.ModelViewSet):
         # Proceed with the delete if the user is an admin
         return super().destroy(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create many users at once (admin only).
+        Accepts a JSON list of users, or an uploaded `file` with a .csv or .json roster.
+        Rows that fail validation are reported and skipped, the other rows are still created.
+        """
+        if getattr(request.user, 'role', None) != 'admin':
+            raise PermissionDenied("Only admin can create users.")
+        if request.user.school_id is None:
+            return Response({"error": "Your account does not belong to a school."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            upload = request.FILES.get('file')
+            if upload is not None:
+                file_format = upload.name.rsplit('.', 1)[-1].lower()
+                rows = parse_roster(upload.read().decode('utf-8-sig'), file_format)
+            else:
+                rows = parse_roster(request.data, 'json')
+        except (ValueError, UnicodeDecodeError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_roster(rows, request.user.school)
+        response_status = status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
+
+    @action(detail=False, methods=['post'])
+    def promote(self, request):
+        """
+        Move students between class years at term end (admin only).
+        Body: {"mapping": {"Year 1": "Year 2", "Year 6": null}, "dry_run": true}
+        """
+        if getattr(request.user, 'role', None) != 'admin':
+            raise PermissionDenied("Only admin can promote students.")
+        if request.user.school_id is None:
+            return Response({"error": "Your account does not belong to a school."}, status=status.HTTP_400_BAD_REQUEST)
+
+        mapping = request.data.get('mapping')
+        if not isinstance(mapping, dict) or not mapping:
+            return Response({"error": "mapping must be an object of source to target class years."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = promote_students(mapping, request.user.school,
+                                      dry_run=request.data.get('dry_run') in (True, 1, '1', 'true'))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
 # View that gets logged in user
 class UserInfoView(APIView):
     permission_classes = [IsAuthenticated]
@@ -151,13 +301,14 @@ class QuestionViewSet(viewsets.ModelViewSet):
 
         user = self.request.user
         quiz_id = self.request.query_params.get('quiz_id', None)
+        queryset = scope(self.queryset, user)
 
         # If the user is a student, filter questions by their class_year via related quizzes
         if user.is_authenticated and user.role == 'student':
-            return self.queryset.filter(quiz__class_year=user.class_year, quiz_id=quiz_id)
+            return queryset.filter(quiz__class_year=user.class_year, quiz_id=quiz_id)
         
-        # If the user is a teacher or admin, return all questions
-        return self.queryset
+        # If the user is a teacher or admin, return all questions of their school
+        return queryset
     
     def perform_create(self, serializer):
         if self.request.user.role != 'teacher':
@@ -168,19 +319,194 @@ class QuestionViewSet(viewsets.ModelViewSet):
         """
         Only teachers can update questions.
         """
-        print("=========")
-        print(self.get_object())
-        question = self.get_object()  
+        question = self.get_object()
         if request.user.role != 'teacher' or question.teacher != request.user:
             raise PermissionDenied("Only the teacher who created this question can update it.")
         
         return super().update(request, *args, **kwargs)
 
+    @action(detail=True, methods=['get', 'post'])
+    def assets(self, request, pk=None):
+        """
+        List the question's images/audio, or upload one as `file` (teacher who created the question only).
+        """
+        question = self.get_object()
+        if request.method == 'GET':
+            serializer = QuestionAssetSerializer(question.assets.all(), many=True, context={'request': request})
+            return Response(serializer.data)
+
+        if request.user.role != 'teacher' or question.teacher != request.user:
+            raise PermissionDenied("Only the teacher who created this question can add assets.")
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "No file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+        # The type is read from the file itself, the one the client declares is ignored
+        content_type = assets.sniff_content_type(upload.read(assets.SNIFF_BYTES))
+        upload.seek(0)
+        if content_type is None:
+            return Response({"error": "Unsupported file type."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            sha256, size = assets.store(upload)
+        except assets.AssetTooLarge:
+            return Response({"error": "File is too large."}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            has_thumbnail = assets.make_thumbnail(sha256, content_type)
+        except assets.AssetRejected as exc:
+            if not QuestionAsset.objects.filter(sha256=sha256).exists():
+                assets.remove(sha256)
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        asset = QuestionAsset.objects.create(
+            question=question,
+            sha256=sha256,
+            content_type=content_type,
+            size=size,
+            original_name=upload.name[:255],
+            has_thumbnail=has_thumbnail,
+        )
+        return Response(QuestionAssetSerializer(asset, context={'request': request}).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_file(self, request):
+        """
+        Import a question bank from an uploaded `file` (.csv, .json or .jsonl) into the teacher's quizzes.
+        Rows name their quiz in a `quiz` column, or all go to the quiz given as `quiz`.
+        Invalid rows are reported with their row number and skipped, the other rows are still created.
+        """
+        if request.user.role != 'teacher':
+            raise PermissionDenied("Only teachers can import questions.")
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "No file uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            return Response({"error": f"Unsupported file type '{file_format}'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        default_quiz = None
+        if request.data.get('quiz'):
+            default_quiz = Quiz.objects.filter(pk=request.data['quiz'], teacher=request.user).first()
+            if default_quiz is None:
+                return Response({"error": "You can only import into your own quizzes."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = import_questions(iter_rows(upload.file, file_format), request.user, default_quiz)
+        except (ValueError, UnicodeDecodeError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=response_status)
+
+    @action(detail=False, methods=['get'], url_path='review')
+    def review(self, request):
+        """
+        Practice quiz of the student's questions due for review (weakest first), `?limit=<n>`.
+        """
+        if request.user.role != 'student':
+            raise PermissionDenied("Only students have a review queue.")
+        try:
+            limit = min(int(request.query_params.get('limit', settings.REVIEW_QUIZ_SIZE)), 100)
+        except ValueError:
+            limit = settings.REVIEW_QUIZ_SIZE
+        questions = review.due_questions(request.user, limit=limit)
+        return Response(self.get_serializer(questions, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        """
+        Item statistics of the school's answered questions, `?quiz_id=<id>` for one quiz.
+        Recomputed by the item_stats job, at most every ITEM_STATS_INTERVAL_MINUTES per quiz.
+        """
+        if request.user.role == 'student':
+            raise PermissionDenied("Only teachers and admins can view question statistics.")
+        questions = self.get_queryset()
+        quiz_id = request.query_params.get('quiz_id')
+        if quiz_id:
+            questions = questions.filter(quiz_id=quiz_id)
+        stats = QuestionStats.objects.filter(question__in=questions).order_by('question_id')
+        return Response(QuestionStatsSerializer(stats, many=True).data)
+
+    @action(detail=True, methods=['delete'], url_path=r'assets/(?P<asset_id>[0-9]+)')
+    def delete_asset(self, request, pk=None, asset_id=None):
+        """
+        Remove an asset from the question, the stored file goes once no other question uses it.
+        """
+        question = self.get_object()
+        if request.user.role != 'teacher' or question.teacher != request.user:
+            raise PermissionDenied("Only the teacher who created this question can remove assets.")
+        asset = question.assets.filter(pk=asset_id).first()
+        if asset is None:
+            raise Http404
+        asset.delete()
+        if not QuestionAsset.objects.filter(sha256=asset.sha256).exists():
+            assets.remove(asset.sha256)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Asset file view
+class AssetFileView(APIView):
+    """
+    Serve a stored asset by its sha256, or its thumbnail with `?thumbnail=1`.
+    Content never changes for a given hash, so responses are cacheable for a year and support
+    Range requests for audio seeking and resumed downloads.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, sha256):
+        asset_qs = scope(QuestionAsset.objects.filter(sha256=sha256), request.user, field='question__school')
+        if request.user.role == 'student':
+            # Students only get assets of questions in their class year
+            asset_qs = asset_qs.filter(question__quiz__class_year=request.user.class_year)
+        asset = asset_qs.first()
+        if asset is None:
+            raise Http404
+
+        thumbnail = bool(request.query_params.get('thumbnail')) and asset.has_thumbnail
+        path = assets.thumbnail_path(sha256) if thumbnail else assets.blob_path(sha256)
+        content_type = 'image/png' if thumbnail else asset.content_type
+        etag = f'"{sha256}-thumb"' if thumbnail else f'"{sha256}"'
+
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = self.file_response(request, path, content_type)
+        response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = f'private, max-age={settings.ASSET_CACHE_MAX_AGE}, immutable'
+        # Browsers must not guess another type, and types outside the allow-list (e.g. SVG stored
+        # before uploads were sniffed) are only ever downloaded
+        response['X-Content-Type-Options'] = 'nosniff'
+        if not assets.is_inline(content_type):
+            response['Content-Disposition'] = 'attachment'
+        return response
+
+    def file_response(self, request, path, content_type):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            raise Http404
+        try:
+            byte_range = assets.parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        if byte_range is None:
+            return FileResponse(open(path, 'rb'), content_type=content_type)
+        start, end = byte_range
+        response = StreamingHttpResponse(assets.read_range(path, start, end),
+                                         status=status.HTTP_206_PARTIAL_CONTENT, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        return response
+
 
 # Game Session ViewSet
-class GameSessionViewSet(viewsets.ModelViewSet):
+class GameSessionViewSet(WriteAdmissionMixin, IncludeArchivedMixin, viewsets.ModelViewSet):
     queryset = GameSession.objects.all()
     serializer_class = GameSessionSerializer
+    history_serializer_class = GameSessionHistorySerializer
 
     def get_permissions(self):
         """
@@ -199,14 +525,34 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         Restrict game session viewing to only the current student.
         """
         if self.request.user.role == 'student':
-            return GameSession.objects.filter(student=self.request.user)  # Return only the student's game sessions
+            # Return only the student's game sessions
+            return scope(GameSession.objects.all(), self.request.user).filter(student=self.request.user)
         return GameSession.objects.none()  
+
+    def get_history_queryset(self):
+        """
+        Archived game sessions of the current student.
+        """
+        return scope(GameSessionHistory.objects.all(), self.request.user).filter(student=self.request.user) \
+            .select_related('student')
     
     def perform_create(self, serializer):
         if self.request.user.role != 'student':
             raise PermissionDenied("Only students can create game sessions.")
-        # Assign the authenticated student as the user in the GameSession
-        serializer.save(student=self.request.user)
+        # Assign the authenticated student as the user in the GameSession, the session is played
+        # and graded against the quiz version that is current when it starts
+        quiz = serializer.validated_data['quiz']
+        # The attempt cap is counted and the attempt created in one transaction
+        with transaction.atomic():
+            try:
+                scheduling.check_can_start(self.request.user, quiz)
+            except scheduling.QuizUnavailable as exc:
+                raise PermissionDenied(str(exc))
+            game_session = serializer.save(student=self.request.user,
+                                           quiz_version_id=packages.latest_version_id(quiz.pk),
+                                           **timer.start_fields(quiz))
+        events.session_started(game_session)
+        self.queue_progress_update(game_session)
     
     def perform_update(self, serializer):
         """
@@ -218,8 +564,103 @@ class GameSessionViewSet(viewsets.ModelViewSet):
         if game_session.student != self.request.user:
             raise PermissionDenied("You do not have permission to update this game session.")
         
-        # Proceed with the update if permission checks are satisfied
-        serializer.save()
+        if timer.expire(game_session):
+            raise ValidationError({"error": "The time limit of this game session has passed."})
+
+        # Proceed with the update if permission checks are satisfied, the duration is measured
+        # by the server when the session completes
+        previous_status = game_session.status
+        extra = {}
+        if serializer.validated_data.get('status') == 'completed' and previous_status != 'completed':
+            extra['duration'] = timer.elapsed(game_session)
+        game_session = serializer.save(**extra)
+        events.session_changed(game_session, previous_status)
+        self.queue_progress_update(game_session)
+
+    @action(detail=True, methods=['post'])
+    def answer(self, request, pk=None):
+        """
+        Submit one answer: {"question": <id>, "answer": ...}.
+        The answer is graded on the server, recorded for the review queue and added to the session's score.
+        """
+        game_session = self.get_object()
+        if timer.expire(game_session):
+            return Response({"error": "The time limit of this game session has passed."}, status=status.HTTP_400_BAD_REQUEST)
+        if game_session.status != 'in_progress':
+            return Response({"error": "This game session is not in progress."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            question_id = int(request.data.get('question'))
+        except (TypeError, ValueError):
+            return Response({"error": "question is required."}, status=status.HTTP_400_BAD_REQUEST)
+        key = packages.session_answer_key(game_session, question_id)
+        if key is None:
+            return Response({"error": "This question is not part of the quiz."}, status=status.HTTP_400_BAD_REQUEST)
+        # A question deleted after the quiz was published is still in the package
+        if not Question.objects.filter(pk=question_id).exists():
+            return Response({"error": "This question no longer exists."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Answers refer to the options as shown in the session's shuffled layout
+        answer = request.data.get('answer')
+        layout = shuffle.session_layout_for(game_session)
+        if layout is not None:
+            answer = shuffle.canonical_answer(layout, question_id, answer)
+        correct = packages.is_correct(key, answer)
+        # The score only moves when this request is the one that recorded the answer
+        with transaction.atomic():
+            if not review.record_answers(request.user, game_session.pk, [(question_id, correct, answer)]):
+                return Response({"error": "This question was already answered."}, status=status.HTTP_400_BAD_REQUEST)
+            if correct:
+                GameSession.objects.filter(pk=game_session.pk).update(
+                    score=F('score') + key['points'],
+                    correct_answers_count=F('correct_answers_count') + 1,
+                    last_updated=timezone.now(),
+                )
+        if correct:
+            game_session.refresh_from_db(fields=['score', 'correct_answers_count'])
+        events.answered(game_session, question_id, correct, key['points'])
+        return Response({
+            'question': question_id,
+            'correct': correct,
+            'points': key['points'] if correct else 0,
+            'score': game_session.score,
+            'correct_answers_count': game_session.correct_answers_count,
+            'elapsed': timer.elapsed(game_session).total_seconds(),
+        })
+
+    @action(detail=True, methods=['get'])
+    def questions(self, request, pk=None):
+        """
+        The questions of the session in the session's own order, with multiple choice options shuffled.
+        Answers sent to answer/ use the labels (or option indexes) as shown here.
+        """
+        layout = shuffle.session_layout_for(self.get_object())
+        if layout is None:
+            raise Http404("This game session is not played on a published quiz version.")
+        return Response({'quiz': layout['quiz'], 'questions': layout['questions']})
+
+    @action(detail=False, methods=['post'])
+    def sync(self, request):
+        """
+        Upload attempts played offline from a quiz bundle:
+        {"attempts": [{"client_id", "quiz_version", "bundle_token", "started_at", "completed_at",
+                       "answers": {question id: answer}}]}
+        Attempts are graded on the server, already uploaded client_ids are reported as duplicates.
+        """
+        if request.user.role != 'student':
+            raise PermissionDenied("Only students can sync game sessions.")
+        try:
+            results = offline.sync_attempts(request.user, request.data.get('attempts'))
+        except offline.AttemptError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def queue_progress_update(self, game_session):
+        """
+        Progress tracking is updated by the job worker so the request can return straight away.
+        One job per session status, repeated PATCHes with the same status are not queued again.
+        """
+        enqueue('update_progress', {'session_id': game_session.pk},
+                key=f'update_progress:{game_session.pk}:{game_session.status}')
     
 
 # Quiz ViewSet
@@ -247,13 +688,14 @@ class QuizViewSet(viewsets.ModelViewSet):
         - Teachers and admins can view all quizzes.
         """
         user = self.request.user
+        queryset = scope(self.queryset, user)
 
         # If the user is a student, filter quizzes by their class_year
         if user.is_authenticated and user.role == 'student':
-            return self.queryset.filter(class_year=user.class_year)
+            return queryset.filter(class_year=user.class_year)
         
-        # If the user is a teacher or admin, return all quizzes
-        return self.queryset
+        # If the user is a teacher or admin, return all quizzes of their school
+        return queryset
 
     def perform_create(self, serializer):
         # Ensure that the user creating the quiz is a teacher
@@ -261,7 +703,8 @@ class QuizViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Only teachers can create quizzes.")
         
         # Automatically assign the currently authenticated user as the teacher
-        serializer.save(teacher=self.request.user)
+        quiz = serializer.save(teacher=self.request.user)
+        self.invalidate_available(quiz.school_id, quiz.class_year_id)
     def perform_update(self, serializer):
         """
         Only teachers can edit their own quizzes.
@@ -278,7 +721,9 @@ class QuizViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You can only edit your own quizzes or you need to be an admin.")
         
         # Proceed with the update if the permissions are satisfied
-        serializer.save()
+        previous_class_year = quiz.class_year_id
+        quiz = serializer.save()
+        self.invalidate_available(quiz.school_id, previous_class_year, quiz.class_year_id)
 
     def perform_destroy(self, instance):
         """
@@ -296,33 +741,121 @@ class QuizViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("You can only delete your own quizzes or you need to be an admin.")
         
         # Proceed with the delete if the permissions are satisfied
+        school_id, class_year_id = instance.school_id, instance.class_year_id
         instance.delete()
+        self.invalidate_available(school_id, class_year_id)
+
+    def invalidate_available(self, school_id, *class_year_ids):
+        """
+        Drop the cached available quizzes of the class years a quiz was or is in.
+        """
+        affected = {class_year_id for class_year_id in class_year_ids if class_year_id is not None}
+        transaction.on_commit(lambda: invalidate_class_years(school_id, affected))
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Quizzes of the student's class year that are open right now.
+        """
+        if request.user.role != 'student':
+            raise PermissionDenied("Only students have available quizzes.")
+        if request.user.class_year_id is None:
+            return Response([])
+        data = scheduling.available_quizzes(
+            request.user.school_id, request.user.class_year_id, self.serialize_available)
+        return Response(data)
+
+    @staticmethod
+    def serialize_available(quizzes):
+        # Also used to fill the cache when a worker starts (api/warmup.py)
+        return QuizSerializer(quizzes, many=True).data
+
+    @action(detail=True, methods=['post'])
+    def publish(self, request, pk=None):
+        """
+        Freeze the quiz and its questions into a new immutable version.
+        New game sessions use the latest version, sessions already in progress keep theirs.
+        """
+        quiz = self.get_object()
+        role = getattr(request.user, 'role', None)
+        if role != 'admin' and quiz.teacher != request.user:
+            raise PermissionDenied("You can only publish your own quizzes or you need to be an admin.")
+        version = packages.publish(quiz, request.user)
+        return Response({'id': version.pk, 'quiz': quiz.pk, 'version': version.version,
+                         'checksum': version.checksum, 'created_at': version.created_at},
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def package(self, request, pk=None):
+        """
+        The compiled package of the latest published version, or of `?version=<n>`.
+        The stored JSON is returned as is, without going through a serializer. Students get the
+        package without its answer key.
+        """
+        quiz = self.get_object()
+        versions = quiz.versions.all()
+        if request.query_params.get('version'):
+            versions = versions.filter(version=request.query_params['version'])
+        version_id = versions.order_by('-version').values_list('id', flat=True).first()
+        if version_id is None:
+            raise Http404("This quiz has not been published.")
+        if getattr(request.user, 'role', None) in ('admin', 'teacher'):
+            blob = packages.get_package_blob(version_id)
+        else:
+            blob = packages.get_student_package_blob(version_id)
+        return HttpResponse(blob, content_type='application/json')
+
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        """
+        Everything needed to play the latest published version offline, without the answer key, and
+        the signed bundle_token to send back with the attempts. Finished attempts are uploaded, and
+        graded, with POST /api/gamesessions/sync/.
+        """
+        blob = offline.bundle_blob(self.get_object(), request.user)
+        if blob is None:
+            raise Http404("This quiz has not been published.")
+        return HttpResponse(blob, content_type='application/json')
 
 # Quiz Result ViewSet
-class QuizResultViewSet(viewsets.ModelViewSet):
+class QuizResultViewSet(WriteAdmissionMixin, IncludeArchivedMixin, viewsets.ModelViewSet):
     queryset = QuizResult.objects.all()
     serializer_class = QuizResultSerializer
+    history_serializer_class = QuizResultHistorySerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         """
         Return quiz results based on user role:
-        - Admin and Teacher: Can view all quiz results.
+        - Admin and Teacher: Can view all quiz results of their school.
         - Student: Can view quiz results of students within the same class_year.
         """
         user = self.request.user
+        queryset = scope(QuizResult.objects.all(), user)
 
         # If the user is an admin or teacher, return all quiz results
         if user.role in ['admin', 'teacher']:
-            return QuizResult.objects.all()
+            return queryset
         
         # If the user is a student, return only quiz results of students in the same class_year
         elif user.role == 'student':
             class_year = user.class_year  # Assuming `class_year` is an attribute of the User model
-            return QuizResult.objects.filter(student__class_year=class_year)
+            return queryset.filter(student__class_year=class_year)
         
         # If the user has an unrecognized role, deny access
         raise PermissionDenied("You do not have permission to view this data.")
+
+    def get_history_queryset(self):
+        """
+        Archived quiz results, visible to the same users as get_queryset.
+        """
+        user = self.request.user
+        queryset = scope(QuizResultHistory.objects.all(), user)
+        if user.role in ['admin', 'teacher']:
+            return queryset
+        elif user.role == 'student':
+            return queryset.filter(student__class_year=user.class_year)
+        raise PermissionDenied("You do not have permission to view this data.")
     
     def create(self, request, *args, **kwargs):
         """
@@ -332,17 +865,35 @@ class QuizResultViewSet(viewsets.ModelViewSet):
         quiz = request.data.get("quiz")
 
         # Check if a QuizResult entry already exists
-        quiz_result = QuizResult.objects.filter(student=student, quiz=quiz).first()
+        quiz_result = scope(QuizResult.objects.all(), request.user).filter(student=student, quiz=quiz).first()
         
         if quiz_result:
             # If it exists, update the score and feedback instead of creating a new one
             serializer = self.get_serializer(quiz_result, data=request.data, partial=True)
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            self.perform_update(serializer)
             return Response(serializer.data, status=status.HTTP_200_OK)
         
         # Otherwise, proceed with creating a new entry
         return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        quiz_result = serializer.save()
+        events.result_recorded(quiz_result, override=False)
+        self.queue_feedback(quiz_result)
+
+    def perform_update(self, serializer):
+        quiz_result = serializer.save()
+        events.result_recorded(quiz_result, override=True)
+        self.queue_feedback(quiz_result)
+
+    def queue_feedback(self, quiz_result):
+        """
+        Results submitted without feedback get it filled in by the job worker.
+        """
+        if not quiz_result.feedback:
+            enqueue('quiz_feedback', {'result_id': quiz_result.pk},
+                    key=f'quiz_feedback:{quiz_result.pk}:{quiz_result.updated_at.timestamp()}')
     
 # Progress Tracking ViewSet
 class ProgressTrackingViewSet(viewsets.ModelViewSet):
@@ -351,14 +902,33 @@ class ProgressTrackingViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         # Get the current user
         user = self.request.user
+        queryset = scope(ProgressTracking.objects.all(), user)
 
         # If the user is a student return only their progress tracking
         if user.role == 'student':
-            return ProgressTracking.objects.filter(student=user)
+            return queryset.filter(student=user)
         
-        # If the user is a teacher or admin, return all progress tracking records
+        # If the user is a teacher or admin, return all progress tracking records of their school
         if user.role in ['teacher', 'admin']:
-            return ProgressTracking.objects.all()
+            return queryset
 
         # Otherwise, deny access
-        raise PermissionDenied("You do not have permission to view this data.")
\ No newline at end of file
+        raise PermissionDenied("You do not have permission to view this data.")
+
+class MetricsView(APIView):
+    """
+    Prometheus scrape endpoint. Needs `Authorization: Bearer <METRICS_TOKEN>`,
+    without a configured token it is only served when DEBUG is on.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        if token:
+            supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            if not hmac.compare_digest(supplied.encode(), token.encode()):
+                raise PermissionDenied("Invalid metrics token.")
+        elif not settings.DEBUG:
+            raise PermissionDenied("Set METRICS_TOKEN to enable the metrics endpoint.")
+        return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
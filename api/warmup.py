@@ -0,0 +1,91 @@
+'''
+Worker warm-up.
+
+quizora/wsgi.py and asgi.py call warm_up() once the application is loaded and before the worker
+serves anything. Warm-up loads what the first requests would otherwise pay for:
+- URL resolvers, and with them the views, serializers and everything they import
+- the field maps of every serializer and the model metadata behind them
+- the cached list of open quizzes of each class year (api/scheduling.py)
+- the published packages and parsed answer keys of the open quizzes (api/packages.py)
+A step that fails is logged and skipped, a worker always starts. Database connections opened
+here are closed again, so a server that forks workers after loading the app doesn't share them.
+'''
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from rest_framework import serializers as drf_serializers
+
+from . import packages, scheduling
+from . import serializers
+from .models import Quiz, QuizVersion
+from .views import QuizViewSet
+
+logger = logging.getLogger(__name__)
+
+
+def _urls():
+    resolver = get_resolver()
+    resolver.resolve('/api/quizzes/')
+    # Builds the reverse lookup tables of every pattern
+    reverse('metrics')
+
+
+def _serializers():
+    for serializer_class in vars(serializers).values():
+        if isinstance(serializer_class, type) and issubclass(serializer_class, drf_serializers.ModelSerializer) \
+                and serializer_class.__module__ == serializers.__name__:
+            serializer_class(context={}).fields
+
+
+def _open_quizzes():
+    return Quiz.objects.filter(scheduling.open_at(timezone.now())).order_by()
+
+
+def _quiz_lists():
+    class_years = _open_quizzes().filter(class_year__isnull=False) \
+        .values_list('school_id', 'class_year_id').distinct()[:settings.WARMUP_CLASS_YEARS]
+    for school_id, class_year_id in class_years:
+        scheduling.available_quizzes(school_id, class_year_id, QuizViewSet.serialize_available)
+
+
+def _packages():
+    latest = {}
+    versions = QuizVersion.objects.filter(quiz__in=_open_quizzes()).order_by('quiz_id', '-version')
+    for quiz_id, version_id in versions.values_list('quiz_id', 'id'):
+        latest.setdefault(quiz_id, version_id)
+    for version_id in list(latest.values())[:settings.WARMUP_PACKAGES]:
+        packages.get_student_package_blob(version_id)
+        packages.get_answer_key(version_id)
+
+
+STEPS = (
+    ('urls', _urls),
+    ('serializers', _serializers),
+    ('quiz_lists', _quiz_lists),
+    ('packages', _packages),
+)
+
+
+def warm_up():
+    """
+    Run every warm-up step. Returns {step: seconds taken}, empty when WARMUP_ON_STARTUP is off.
+    """
+    if not settings.WARMUP_ON_STARTUP:
+        return {}
+    timings = {}
+    try:
+        for name, step in STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.exception('warm-up step failed', extra={'step': name})
+            timings[name] = round(time.perf_counter() - start, 4)
+    finally:
+        connections.close_all()
+    logger.info('warm-up finished', extra={'timings': timings, 'seconds': round(sum(timings.values()), 4)})
+    return timings
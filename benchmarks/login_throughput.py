@@ -0,0 +1,83 @@
+'''
+Login throughput benchmark.
+
+Logs a class of students in through /api/login/ with Django's default hasher, with the student
+hasher from PASSWORD_HASHER_BY_ROLE, and with the login cache absorbing repeated clicks.
+
+    python benchmarks/login_throughput.py --students 30 --clicks 3
+'''
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # the seed data migration reads api/data relative to the project root
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizora.settings')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+import django
+
+django.setup()
+
+from django.contrib.auth.hashers import make_password
+from django.test import Client, override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment
+
+from api import login_cache
+from api.models import School, User
+
+PASSWORD = 'Swinburne!'
+
+
+def create_students(count, hasher):
+    User.objects.filter(username__startswith='bench_').delete()
+    # Users without a school are refused, the students get a school of their own
+    school, _ = School.objects.get_or_create(slug='bench', defaults={'name': 'Benchmark School'})
+    encoded = make_password(PASSWORD, hasher=hasher)
+    User.objects.bulk_create([
+        User(username=f'bench_{i}', role='student', school=school, password=encoded) for i in range(count)
+    ])
+
+
+def log_in_everyone(count, clicks):
+    client = Client()
+    started = time.perf_counter()
+    for i in range(count):
+        for _ in range(clicks):
+            response = client.post('/api/login/', {'username': f'bench_{i}', 'password': PASSWORD},
+                                   content_type='application/json')
+            assert response.status_code == 200, response.content
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=30)
+    parser.add_argument('--clicks', type=int, default=3, help="Login requests per student in the repeat scenario.")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        scenarios = [
+            ('default hasher', {'PASSWORD_HASHER_BY_ROLE': {}, 'LOGIN_CACHE_TTL': 0}, 'default', 1),
+            ('student hasher', {'LOGIN_CACHE_TTL': 0}, 'pbkdf2_sha256_student', 1),
+            (f'{args.clicks} clicks, cache', {}, 'pbkdf2_sha256_student', args.clicks),
+        ]
+        for label, overrides, hasher, clicks in scenarios:
+            with override_settings(**overrides):
+                login_cache.clear()
+                create_students(args.students, hasher)
+                elapsed = log_in_everyone(args.students, clicks)
+            requests = args.students * clicks
+            print(f"{label:18} {requests:5} logins in {elapsed:6.2f}s   {requests / elapsed:8.1f} logins/s")
+    finally:
+        runner.teardown_databases(old_config)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+Concurrent write benchmark for the SQLite profile in quizora/settings.py.
+
+Runs the same workload against Django's default SQLite setup and against the tuned profile
+(WAL, pragmas, BEGIN IMMEDIATE): writer threads do a read-modify-write like a GameSession PATCH
+while reader threads keep listing rows.
+
+    python benchmarks/sqlite_writes.py --writers 8 --readers 4 --seconds 5
+'''
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+import django
+from django.conf import settings
+
+from quizora import settings as project_settings
+
+
+def configure(directory):
+    baseline = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'baseline.sqlite3')}
+    tuned = dict(project_settings.DATABASES['default'], NAME=os.path.join(directory, 'tuned.sqlite3'))
+    if not project_settings.SQLITE_TUNED:
+        sys.exit("SQLITE_TUNED is off, nothing to compare.")
+    settings.configure(DATABASES={'default': baseline, 'tuned': tuned}, USE_TZ=True)
+    django.setup()
+
+
+def prepare(alias, rows):
+    from django.db import connections
+    with connections[alias].cursor() as cursor:
+        cursor.execute("CREATE TABLE session (id INTEGER PRIMARY KEY, score INTEGER NOT NULL)")
+        cursor.executemany("INSERT INTO session (id, score) VALUES (%s, 0)", [(i,) for i in range(rows)])
+
+
+def run(alias, writers, readers, seconds, rows):
+    from django.db import OperationalError, connections, transaction
+
+    stop = time.monotonic() + seconds
+    counts = {'writes': 0, 'reads': 0, 'locked': 0}
+    lock = threading.Lock()
+
+    def writer(worker):
+        done = locked = 0
+        row = worker
+        while time.monotonic() < stop:
+            row = (row + writers) % rows
+            try:
+                with transaction.atomic(using=alias):
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute("SELECT score FROM session WHERE id = %s", [row])
+                        score = cursor.fetchone()[0]
+                        cursor.execute("UPDATE session SET score = %s WHERE id = %s", [score + 1, row])
+                done += 1
+            except OperationalError:
+                locked += 1
+        connections[alias].close()
+        with lock:
+            counts['writes'] += done
+            counts['locked'] += locked
+
+    def reader():
+        done = 0
+        while time.monotonic() < stop:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT id, score FROM session ORDER BY score DESC LIMIT 50")
+                cursor.fetchall()
+            done += 1
+        connections[alias].close()
+        with lock:
+            counts['reads'] += done
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure(directory)
+        for label, alias in (('django default', 'default'), ('tuned profile', 'tuned')):
+            prepare(alias, args.rows)
+            counts = run(alias, args.writers, args.readers, args.seconds, args.rows)
+            print(f"{label:15} writes/s {counts['writes'] / args.seconds:9.1f}   "
+                  f"reads/s {counts['reads'] / args.seconds:9.1f}   "
+                  f"'database is locked' errors {counts['locked']}")
+
+
+if __name__ == '__main__':
+    main()
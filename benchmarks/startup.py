@@ -0,0 +1,100 @@
+'''
+Worker startup benchmark.
+
+Starts fresh processes the way a WSGI server does (importing quizora/wsgi.py) and times the import
+and the first request, with and without the warm-up of api/warmup.py. The first request runs through
+the full middleware stack as a logged in student. Uses the project database, so run
+`python manage.py migrate` first.
+
+    python benchmarks/startup.py --runs 5 --path /api/quizzes/available/ --username suman_sharma
+    python benchmarks/startup.py --importtime   # slowest imports of quizora.wsgi
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process, prints one JSON line
+CHILD = '''
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+started = time.perf_counter()
+import quizora.wsgi
+imported = time.perf_counter()
+
+from django.conf import settings
+from django.test import Client
+from api.models import User
+hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '')]
+client = Client(HTTP_HOST=hosts[0].lstrip('.') if hosts else 'localhost')
+client.force_login(User.objects.get(username=sys.argv[2]))
+
+first = time.perf_counter()
+response = client.get(sys.argv[1])
+second = time.perf_counter()
+client.get(sys.argv[1])
+done = time.perf_counter()
+print(json.dumps({"import": imported - started, "first_request": second - first,
+                  "second_request": done - second, "status": response.status_code}))
+'''
+
+
+def run_child(path, username, warm_up):
+    env = dict(os.environ, WARMUP_ON_STARTUP=str(warm_up), REQUEST_LOG_SAMPLE_RATE='0')
+    env.setdefault('SECRET_KEY', 'benchmark')
+    result = subprocess.run([sys.executable, '-c', CHILD, path, username], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_times(limit):
+    """
+    The slowest modules imported by quizora.wsgi, by cumulative import time (python -X importtime).
+    """
+    env = dict(os.environ, WARMUP_ON_STARTUP='False')
+    env.setdefault('SECRET_KEY', 'benchmark')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import quizora.wsgi'], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), module.rstrip()))
+    total = sum(cumulative for cumulative, module in rows if not module.startswith('  '))
+    print(f"total {total / 1000:8.1f} ms")
+    for cumulative, module in sorted(rows, reverse=True)[:limit]:
+        print(f"{cumulative / 1000:8.1f} ms  {module.strip()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="Processes started per scenario.")
+    parser.add_argument('--path', default='/api/quizzes/available/')
+    parser.add_argument('--username', default='suman_sharma')
+    parser.add_argument('--importtime', action='store_true', help="Show the slowest imports instead.")
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.importtime:
+        import_times(args.top)
+        return
+    if not os.path.exists(os.path.join(ROOT, 'db.sqlite3')):
+        sys.exit("No database, run `python manage.py migrate` first.")
+
+    print(f"{'':10} {'import':>10} {'1st request':>12} {'2nd request':>12}   (median of {args.runs}, ms)")
+    for label, warm_up in (('cold', False), ('warmed up', True)):
+        runs = [run_child(args.path, args.username, warm_up) for _ in range(args.runs)]
+        statuses = {run['status'] for run in runs}
+        median = {key: statistics.median(run[key] for run in runs) * 1000
+                  for key in ('import', 'first_request', 'second_request')}
+        print(f"{label:10} {median['import']:10.1f} {median['first_request']:12.1f} {median['second_request']:12.1f}"
+              f"   status {', '.join(map(str, sorted(statuses)))}")
+
+
+if __name__ == '__main__':
+    main()
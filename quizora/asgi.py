@@ -8,9 +8,18 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
+import threading
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizora.settings')
 
 application = get_asgi_application()
+
+# Load URLs, serializers and the open quiz lists before the worker takes requests. In a thread,
+# the server may import this module with its event loop already running.
+from api.warmup import warm_up  # noqa: E402
+
+warmup = threading.Thread(target=warm_up, name='warmup')
+warmup.start()
+warmup.join()
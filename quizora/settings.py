@@ -10,8 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,7 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',  # First, so the whole request is timed
+    'api.middleware.RequestLogMiddleware',  # Reports the query totals of MetricsMiddleware
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',  # Before sessions/auth so their reads are routed too
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,6 +81,18 @@ WSGI_APPLICATION = 'quizora.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite performance profile, applied to every new connection. Disable with SQLITE_TUNED=False
+# to get Django's defaults back. `python benchmarks/sqlite_writes.py` compares the two.
+SQLITE_TUNED = config('SQLITE_TUNED', default=True, cast=bool)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',       # readers no longer block the writer
+    'synchronous': 'NORMAL',     # safe with WAL, fsync only at checkpoints
+    'cache_size': -20000,        # ~20MB page cache per connection
+    'mmap_size': 134217728,      # 128MB memory mapped reads
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,        # ms to wait for the write lock instead of "database is locked"
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -84,6 +100,57 @@ DATABASES = {
     }
 }
 
+if SQLITE_TUNED:
+    DATABASES['default'].update({
+        'OPTIONS': {
+            'init_command': '; '.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock when the transaction starts, so concurrent writers queue on
+            # busy_timeout instead of failing when a read lock can't be upgraded
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Keep connections open between requests, checking they still work before reuse
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
+    })
+
+# Read replicas, e.g. DATABASE_REPLICAS=/var/lib/quizora/replica1.sqlite3,/var/lib/quizora/replica2.sqlite3
+# Safe-method API requests read from a random replica, writes and migrations always use default.
+# Tests mirror the replicas onto the default test database.
+for index, replica_path in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': replica_path,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db_routers.ReplicaRouter']
+
+# Only requests under this path are routed to replicas
+REPLICA_ROUTED_PATH = '/api/'
+# How long a client keeps reading from default after a write (read-your-writes)
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
+
+
+# Caches
+# 'throttle' is only used when THROTTLE_BACKEND = 'cache', it has to be shared by all worker processes.
+# 'shared' holds the class year versions of api/cache.py, it has to be shared by all worker processes too.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('THROTTLE_CACHE_LOCATION', default=str(BASE_DIR / 'cache' / 'throttle')),
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('SHARED_CACHE_LOCATION', default=str(BASE_DIR / 'cache' / 'shared')),
+    },
+}
+
+# Seconds the admin keeps the row count of a changelist, counting large tables on every page is slow
+ADMIN_COUNT_CACHE_SECONDS = config('ADMIN_COUNT_CACHE_SECONDS', default=60, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -103,6 +170,30 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# Students use a cheaper PBKDF2 work factor since a whole class logs in within seconds,
+# other roles use Django's default. Hashes follow the role's hasher on the next login.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'api.hashers.StudentPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASHER_BY_ROLE = {
+    'student': 'pbkdf2_sha256_student',
+}
+STUDENT_PASSWORD_ITERATIONS = config('STUDENT_PASSWORD_ITERATIONS', default=100000, cast=int)
+
+AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+
+# Successful logins are remembered for a few seconds so repeated clicks skip the password hash,
+# set LOGIN_CACHE_TTL=0 to turn this off
+LOGIN_CACHE_TTL = config('LOGIN_CACHE_TTL', default=30, cast=int)  # seconds
+LOGIN_CACHE_SIZE = 1024
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -136,4 +227,125 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  # Set default permissions for all API views
     ],
-}
\ No newline at end of file
+}
+
+# Background jobs (api/jobs.py), processed by `python manage.py runjobs`
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=3, cast=int)
+JOBS_RETRY_DELAY = config('JOBS_RETRY_DELAY', default=30, cast=int)  # seconds, multiplied by the attempt number
+JOBS_LOCK_TIMEOUT = config('JOBS_LOCK_TIMEOUT', default=600, cast=int)  # seconds before a running job is requeued
+# Done and failed jobs older than this are deleted by the runjobs worker (every JOBS_PURGE_INTERVAL
+# seconds) and by `python manage.py archivehistory`
+JOBS_RETENTION_DAYS = config('JOBS_RETENTION_DAYS', default=14, cast=int)
+JOBS_PURGE_INTERVAL = config('JOBS_PURGE_INTERVAL', default=3600, cast=int)
+# Run jobs inline after commit instead of waiting for a worker (handy in development)
+JOBS_RUN_EAGERLY = config('JOBS_RUN_EAGERLY', default=False, cast=bool)
+
+# Game session sweeper (`python manage.py sweepsessions --loop`)
+SESSION_ABANDON_AFTER_MINUTES = config('SESSION_ABANDON_AFTER_MINUTES', default=120, cast=int)
+SESSION_SWEEP_BATCH_SIZE = config('SESSION_SWEEP_BATCH_SIZE', default=500, cast=int)
+SESSION_SWEEP_INTERVAL = config('SESSION_SWEEP_INTERVAL', default=300, cast=int)  # seconds
+
+# Game sessions and quiz results last updated longer ago than this move to the history tables
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=180, cast=int)
+
+# Write throttling for the game session and quiz result endpoints (api/throttling.py)
+THROTTLE_BACKEND = config('THROTTLE_BACKEND', default='memory')  # 'memory' or 'cache'
+# 'requests/period' per user, by role. The number is also the burst size.
+THROTTLE_USER_RATES = {
+    'student': '60/min',
+    'teacher': '120/min',
+    'admin': '120/min',
+}
+# Shared by all users of the role
+THROTTLE_ROLE_RATES = {
+    'student': '100/s',
+}
+# Concurrent write requests per process, the rest get 429 with Retry-After
+WRITE_CONCURRENCY_LIMIT = config('WRITE_CONCURRENCY_LIMIT', default=8, cast=int)
+WRITE_ADMISSION_RETRY_AFTER = 1  # seconds
+
+# Bulk roster import: password hashing runs in a process pool for rosters of at least ROSTER_POOL_MIN_ROWS
+ROSTER_HASH_WORKERS = config('ROSTER_HASH_WORKERS', default=os.cpu_count() or 1, cast=int)
+ROSTER_POOL_MIN_ROWS = 50
+
+# Question bank import: questions written per bulk insert
+QUESTION_IMPORT_BATCH_SIZE = config('QUESTION_IMPORT_BATCH_SIZE', default=500, cast=int)
+
+# Question assets (images/audio), stored by content hash under ASSET_ROOT.
+# Thumbnails are generated for images when Pillow is installed.
+ASSET_ROOT = config('ASSET_ROOT', default=str(BASE_DIR / 'media' / 'assets'))
+ASSET_MAX_UPLOAD_SIZE = config('ASSET_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)  # bytes
+# Types accepted for upload and served inline, detected from the file content (api/assets.py)
+ASSET_CONTENT_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp',
+                       'audio/mpeg', 'audio/ogg', 'audio/wav', 'audio/flac', 'audio/mp4')
+ASSET_CACHE_MAX_AGE = 60 * 60 * 24 * 365  # seconds, content never changes for a hash
+
+# Offline play: maximum attempts accepted by one POST /api/gamesessions/sync/, and how long a
+# downloaded bundle can be played from before attempts played with it are refused
+OFFLINE_SYNC_MAX_ATTEMPTS = 50
+OFFLINE_BUNDLE_MAX_AGE = config('OFFLINE_BUNDLE_MAX_AGE', default=60 * 60 * 24 * 14, cast=int)  # seconds
+
+# Spaced repetition: days until a question is due again in each Leitner box (box 0 = answered wrong)
+REVIEW_INTERVALS_DAYS = [0, 1, 3, 7, 14, 30]
+REVIEW_QUIZ_SIZE = 10  # questions in a practice quiz
+
+# Longest time the list of currently open quizzes of a class year is cached, it also expires
+# whenever a quiz window of the class year opens or closes
+AVAILABLE_QUIZZES_CACHE_SECONDS = config('AVAILABLE_QUIZZES_CACHE_SECONDS', default=300, cast=int)
+
+# Shuffled question/option layouts kept per process, keyed by (quiz version, session seed)
+SHUFFLE_LAYOUT_CACHE_SIZE = config('SHUFFLE_LAYOUT_CACHE_SIZE', default=1024, cast=int)
+# Parsed answer keys kept per process, keyed by quiz version
+ANSWER_KEY_CACHE_SIZE = config('ANSWER_KEY_CACHE_SIZE', default=256, cast=int)
+
+# Gameplay event log: events are written in bulk once this many are buffered (and after every request),
+# at most EVENT_LOG_MAX_BUFFER are kept while writes fail,
+# `compactevents` folds events older than EVENT_COMPACT_AFTER_DAYS into snapshots
+EVENT_LOG_FLUSH_SIZE = config('EVENT_LOG_FLUSH_SIZE', default=100, cast=int)
+EVENT_LOG_MAX_BUFFER = config('EVENT_LOG_MAX_BUFFER', default=10000, cast=int)
+EVENT_COMPACT_AFTER_DAYS = config('EVENT_COMPACT_AFTER_DAYS', default=30, cast=int)
+
+# Item statistics: questions analysed per batch, and how often a quiz's statistics are recomputed
+# after its sessions complete
+ITEM_STATS_BATCH_SIZE = config('ITEM_STATS_BATCH_SIZE', default=500, cast=int)
+ITEM_STATS_INTERVAL_MINUTES = config('ITEM_STATS_INTERVAL_MINUTES', default=60, cast=int)
+
+# Metrics endpoint (/api/metrics/): scrapers send `Authorization: Bearer <METRICS_TOKEN>`, without a
+# token the endpoint is only open when DEBUG is on. With several worker processes, point
+# METRICS_MULTIPROC_DIR at a directory shared by them, each writes its totals there every
+# METRICS_WRITE_INTERVAL seconds at most.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_MULTIPROC_DIR = config('METRICS_MULTIPROC_DIR', default='')
+METRICS_WRITE_INTERVAL = config('METRICS_WRITE_INTERVAL', default=5, cast=float)  # seconds
+
+# Structured logging (api/logs.py): JSON lines on stderr, written by a background thread.
+# One line per request for a REQUEST_LOG_SAMPLE_RATE share of requests (0 to 1), server errors and
+# requests slower than REQUEST_LOG_SLOW_MS are always logged. Queries slower than SLOW_QUERY_MS are
+# logged with their SQL and the calling stack. At most LOG_QUEUE_SIZE records wait for the writer
+# thread, records logged while the queue is full are dropped and counted.
+LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+REQUEST_LOG_SAMPLE_RATE = config('REQUEST_LOG_SAMPLE_RATE', default=1.0, cast=float)
+REQUEST_LOG_SLOW_MS = config('REQUEST_LOG_SLOW_MS', default=1000, cast=float)
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=200, cast=float)
+SLOW_QUERY_STACK_DEPTH = config('SLOW_QUERY_STACK_DEPTH', default=15, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'api.logs.JsonFormatter'},
+    },
+    'handlers': {
+        'json': {'class': 'api.logs.QueuedStreamHandler', 'formatter': 'json', 'queue_size': LOG_QUEUE_SIZE},
+    },
+    'loggers': {
+        'api': {'handlers': ['json'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
+# Worker warm-up (api/warmup.py), run by quizora/wsgi.py and asgi.py before serving requests:
+# open quiz lists of at most WARMUP_CLASS_YEARS class years and WARMUP_PACKAGES published packages are loaded
+WARMUP_ON_STARTUP = config('WARMUP_ON_STARTUP', default=True, cast=bool)
+WARMUP_CLASS_YEARS = config('WARMUP_CLASS_YEARS', default=200, cast=int)
+WARMUP_PACKAGES = config('WARMUP_PACKAGES', default=500, cast=int)
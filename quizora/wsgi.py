@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizora.settings')
 
 application = get_wsgi_application()
+
+# Load URLs, serializers and the open quiz lists before the worker takes requests
+from api.warmup import warm_up  # noqa: E402
+
+warm_up()